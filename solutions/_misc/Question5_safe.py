@@ -1,97 +1,51 @@
 import asyncio
 import pandas as pd
-from sqlalchemy import Column, Integer, String, Float, Date
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
-from datetime import datetime
+from sqlalchemy.ext.asyncio import async_sessionmaker
 import logging
-from functools import wraps
-from typing import Tuple
+from datetime import date
+from typing import Optional, Sequence
+
+from async_pipeline import IngestPipeline
+from bulk_insert import async_bulk_insert, ensure_metals, refresh_written_rollups, DEFAULT_CHUNK_SIZE
+from engine_factory import create_sqlite_engines
+from incremental_load import load_new_bars, WARMUP_BARS, REVISION_BARS
+from instrumentation import log_sql, instrument_engine, configure_jsonl
+from migrate_schema import upgrade_schema
+from models import MetalPrice
+from rollups import get_rollups
 
 # Configure logging
 logging.basicConfig(filename='sql_inserts_Q5.log', level=logging.INFO,
                     format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
-# Define SQLAlchemy engine, specifying additional aiosqlite driver 
-engine = create_async_engine('sqlite+aiosqlite:///metal_commodity_Q5.db')  # Use future=True for asyncio compatibility
-
-# Define Base class for declarative ORM
-class Base(DeclarativeBase):
-    pass
-
-# Define MetalPrice ORM class
-class MetalPrice(Base):
-    __tablename__ = 'metal_prices'
-
-    id = Column(Integer, primary_key=True)
-    date = Column(Date)
-    metal = Column(String)
-    price = Column(Float)
-    macd = Column(Float)
-    macd_signal = Column(Float)
-    rsi = Column(Float)
-
-# Define decorator to log SQL operations
-def log_sql(func):
-    @wraps(func)    # Preserve metadata of original function, helps debugging
-    def wrapper(*args, **kwargs):
-        start_time = datetime.now()
-        result = func(*args, **kwargs)
-        end_time = datetime.now()
-        execution_time = end_time - start_time
-        logging.info(f"SQL operation {func.__name__} executed in {execution_time.total_seconds()} seconds (asynchronous)")
-        return result
-    return wrapper
-
-# Function to calculate MACD for a series of prices
-def calculate_macd(prices: pd.Series, slow_period: int = 26, fast_period: int = 12, signal_period: int = 9) -> Tuple[pd.Series, pd.Series]:
-    slow_ema = prices.ewm(span=slow_period).mean()
-    fast_ema = prices.ewm(span=fast_period).mean()
-    macd_line = fast_ema - slow_ema
-    signal_line = macd_line.ewm(span=signal_period).mean()
-    return macd_line, signal_line
-
-# Function to calculate RSI for a series of prices
-def calculate_rsi(prices: pd.Series, window: int = 14) -> pd.Series:
-    delta = prices.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi
-
-def calculate_macd_rsi(csv_file: str) -> Tuple[pd.DataFrame, pd.Index]:
-    # Read CSV file into DataFrame
-    df = pd.read_csv(csv_file)
-
-    # Convert 'Dates' column to datetime
-    df['Dates'] = pd.to_datetime(df['Dates'])
-
-    # Extract metal column names
-    metals = df.columns[1:]
-
-    # Iterate over metal columns and calculate MACD, RSI
-    for metal in metals:
-        prices = df[metal]
-        macd_line, macd_signal = calculate_macd(prices)
-        rsi = calculate_rsi(prices)
-        df[f'{metal}_macd'] = macd_line
-        df[f'{metal}_macd_signal'] = macd_signal
-        df[f'{metal}_rsi'] = rsi
-
-    return (df, metals)
+# Define SQLAlchemy engines (aiosqlite driver): WAL + pragmas, one write connection and a pool of read-only ones
+engines = create_sqlite_engines('metal_commodity_Q5.db')
+engine = engines.writer
+
+# Time every statement on these engines and write structured records next to the text log
+instrument_engine(engines.writer)
+instrument_engine(engines.reader)
+configure_jsonl('sql_metrics_Q5.jsonl')
 
 # Define MetalPriceService class
 class MetalPriceService:
     def __init__(self):
         self.async_session  = async_sessionmaker(bind=engine, expire_on_commit=False)
+        self.read_session = async_sessionmaker(bind=engines.reader, expire_on_commit=False)
 
     # Define function to populate SQL database
     @log_sql
-    async def populate_sql_table(self, df: pd.DataFrame, metals: pd.Index) -> None:
+    async def populate_sql_table(self, df: pd.DataFrame, metals: pd.Index, bulk: bool = False, chunk_size: int = DEFAULT_CHUNK_SIZE) -> None:
+        # Bulk mode: melt the frame and write batches with Core insert() instead of one ORM object per cell
+        if bulk:
+            await async_bulk_insert(engine, df, metals, chunk_size=chunk_size)
+            return
+
         # Create session
         async_session = self.async_session
         async with async_session() as session:
+            # Look up (or add) the metals dimension rows once
+            metal_ids = await session.run_sync(lambda sync_session: ensure_metals(sync_session.connection(), metals))
 
             # Iterate over DataFrame rows and insert into SQL table
             for index, row in df.iterrows():
@@ -102,13 +56,49 @@ class MetalPriceService:
                     macd_signal = row[f'{metal}_macd_signal']
                     rsi = row[f'{metal}_rsi']
 
-                    metal_price = MetalPrice(date=date, metal=metal, price=price,
+                    metal_price = MetalPrice(date=date, metal_id=metal_ids[metal], price=price,
                                             macd=macd, macd_signal=macd_signal, rsi=rsi)
                     session.add(metal_price)
 
+            # Refresh the rollups of the periods written, in the same transaction as the daily rows
+            await session.flush()
+            await session.run_sync(lambda sync_session: refresh_written_rollups(sync_session.connection(), metal_ids.values(),
+                                                                                df['Dates'].tolist()))
+
             # Commit changes
             await session.commit()
     
+    # Define function to create the tables, or upgrade a database written by the earlier questions
+    @log_sql
+    async def upgrade_sql_schema(self) -> None:
+        async with engine.begin() as conn:
+            await conn.run_sync(upgrade_schema)
+
+    # Define function to populate SQL database with the overlapped pipeline:
+    # CSV producer -> indicators in a process pool -> `writers` async writers behind a bounded queue
+    @log_sql
+    async def populate_from_csv(self, csv_file: str, writers: int = 2, queue_size: int = 8, chunksize: int = 10000) -> int:
+        pipeline = IngestPipeline(engine, writers=writers, queue_size=queue_size, chunksize=chunksize)
+        return await pipeline.run(csv_file)
+
+    # Define function to load only the bars the database does not have yet (plus a short revision window),
+    # upserting on (metal_id, date) so a daily refresh writes a handful of rows instead of the full history
+    @log_sql
+    async def refresh_sql_table(self, csv_file: str, warmup: int = WARMUP_BARS, revision_bars: int = REVISION_BARS) -> int:
+        prices = pd.read_csv(csv_file)
+        prices['Dates'] = pd.to_datetime(prices['Dates'])
+        async with engine.begin() as conn:
+            return await conn.run_sync(load_new_bars, prices, warmup, revision_bars)
+
+    # Define function to read precomputed weekly ('W'), monthly ('M') or yearly ('Y') aggregates per metal,
+    # a few hundred rollup rows instead of a regroup of the daily history
+    @log_sql
+    async def read_rollups(self, metals: Sequence[str], period: str = 'M', start: Optional[date] = None,
+                           end: Optional[date] = None, fields: Sequence[str] = ('mean',)) -> pd.DataFrame:
+        async with self.read_session() as session:
+            return await session.run_sync(lambda sync_session: get_rollups(sync_session.connection(), metals, period,
+                                                                           start, end, fields))
+
     # Example: Define function to read data in SQL table
     @log_sql
     async def read_sql_table(self) -> None:
@@ -129,10 +119,12 @@ async def main():
     # Read CSV file and calculate MACD, RSI
     csv_file = 'MarketData_filtered.csv'
     service = MetalPriceService()
+
+    # Create or upgrade the schema (metals dimension, unique (metal_id, date) index)
+    await service.upgrade_sql_schema()
     
-    # Populate SQL table
-    df, metals =  calculate_macd_rsi(csv_file)        
-    await service.populate_sql_table(df, metals)
+    # Populate SQL table: first run loads the full history, later runs only the new or revised bars
+    await service.refresh_sql_table(csv_file)
     
     # Update SQL table
     await service.update_sql_table()
@@ -143,5 +135,8 @@ async def main():
     # Delete rows from SQL table
     await service.delete_sql_table()
 
+    # Close the pools so the WAL is checkpointed back into the database file
+    await engines.dispose()
+
 # Execute the asyncio event loop
 asyncio.run(main())
\ No newline at end of file
@@ -1,108 +1,97 @@
 import asyncio
+import numpy as np
 import pandas as pd
-from sqlalchemy import select, update, Column, Integer, String, Float, Date
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from sqlalchemy.orm import DeclarativeBase
-from datetime import datetime
 import logging
-from functools import wraps
+from typing import Dict
+
+from aiosqlite_writer import AiosqliteBulkWriter, DEFAULT_BATCH_SIZE, DEFAULT_ROWS_PER_TRANSACTION
+from bulk_insert import ensure_metals, refresh_written_rollups, upsert_statement
+from indicator_update import recompute_indicators
+from instrumentation import log_sql, instrument_engine, configure_jsonl
+from migrate_schema import upgrade_schema
+from models import MetalPrice
 
 # Configure logging
 logging.basicConfig(filename='sql_inserts_Q5.log', level=logging.INFO,
                     format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
 
-# Define SQLAlchemy engine, specifying additional aiosqlite driver 
-engine = create_async_engine('sqlite+aiosqlite:///metal_commodity_Q5.db')  # Use future=True for asyncio compatibility
-
-# Define Base class for declarative ORM
-class Base(DeclarativeBase):
-    pass
-
-# Define MetalPrice ORM class
-class MetalPrice(Base):
-    __tablename__ = 'metal_prices'
-
-    id = Column(Integer, primary_key=True)
-    date = Column(Date)
-    metal = Column(String)
-    price = Column(Float)
-    macd = Column(Float)
-    macd_signal = Column(Float)
-    rsi = Column(Float)
-
-# Define decorator to log SQL operations
-def log_sql(func):
-    @wraps(func)    # Preserve metadata of original function, helps debugging
-    def wrapper(*args, **kwargs):
-        start_time = datetime.now()
-        result = func(*args, **kwargs)
-        end_time = datetime.now()
-        execution_time = end_time - start_time
-        logging.info(f"SQL operation {func.__name__} executed in {execution_time.total_seconds()} seconds (asynchronous)")
-        return result
-    return wrapper
+# Define SQLAlchemy engine, specifying additional aiosqlite driver.
+# Its own file: Question5_safe.py loads the same CSV into metal_commodity_Q5.db
+engine = create_async_engine('sqlite+aiosqlite:///metal_commodity_Q5_v4.db')
 
-# Function to calculate MACD for a series of prices
-def calculate_macd(prices, slow_period=26, fast_period=12, signal_period=9):
-    slow_ema = prices.ewm(span=slow_period).mean()
-    fast_ema = prices.ewm(span=fast_period).mean()
-    macd_line = fast_ema - slow_ema
-    signal_line = macd_line.ewm(span=signal_period).mean()
-    return macd_line, signal_line
-
-# Function to calculate RSI for a series of prices
-def calculate_rsi(prices, window=14):
-    delta = prices.diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi
+# Time every statement on this engine and write structured records next to the text log
+instrument_engine(engine)
+configure_jsonl('sql_metrics_Q5_v4.jsonl')
 
 # Define MetalPriceService class
 class MetalPriceService:
     def __init__(self):
         self.async_session  = async_sessionmaker(bind=engine, expire_on_commit=False)
 
-    async def populate_from_csv(self, filename: str):
-        async_session = self.async_session()
+    async def populate_from_csv(self, filename: str, bulk: bool = False, batch_size: int = DEFAULT_BATCH_SIZE,
+                                rows_per_transaction: int = DEFAULT_ROWS_PER_TRANSACTION):
         df = pd.read_csv(filename)
+        # The Date column only accepts date objects
+        df['Dates'] = pd.to_datetime(df['Dates']).dt.date
 
+        # Create (or migrate to) the shared schema and resolve each metal column to its metals.id
+        async with engine.begin() as conn:
+            await conn.run_sync(upgrade_schema)
+        async with self.async_session() as session:
+            metal_ids = await session.run_sync(lambda sync_session: ensure_metals(sync_session.connection(), df.columns[1:]))
+            await session.commit()
+
+        # Bulk mode: (date, metal_id, price) batches through aiosqlite executemany, committed every rows_per_transaction rows.
+        # Both modes upsert on (metal_id, date), so re-running with the same file overwrites the stored prices
+        if bulk:
+            await self.bulk_write_prices(df, metal_ids, batch_size, rows_per_transaction)
+            return
+
+        async_session = self.async_session()
         async with async_session as session:
             for index, row in df.iterrows():
                 date = row['Dates']
                 for metal, price in row.items():
                     if metal != 'Dates':  # Skip the 'Dates' column
-                        await session.execute(MetalPrice.__table__.insert().values(
-                            date=date, metal=metal, price=price))
+                        await session.execute(upsert_statement().values(
+                            date=date, metal_id=metal_ids[metal], price=price))
+                await session.run_sync(lambda sync_session: refresh_written_rollups(
+                    sync_session.connection(), metal_ids.values(), [date]))
                 await session.commit()
-            
-    async def calculate_macd_rsi(self):
-        async_session = self.async_session()
-        
-        async with self.async_session() as session:
-            metal_prices = await session.execute(select(MetalPrice))
-            for metal_price in metal_prices:
-                metal = metal_price.metal
-                # price = metal_price.price
-
-                prices = [row.price for row in metal_prices if row.metal == metal]
-                prices = pd.Series(prices)
-                macd_line, macd_signal = calculate_macd(prices)
-                rsi = calculate_rsi(prices)
 
-                await session.execute(update(MetalPrice).where(
-                    MetalPrice.metal == metal).values(macd=macd_line, macd_signal=macd_signal, rsi=rsi))
+    async def bulk_write_prices(self, df: pd.DataFrame, metal_ids: Dict[str, int], batch_size: int = DEFAULT_BATCH_SIZE,
+                                rows_per_transaction: int = DEFAULT_ROWS_PER_TRANSACTION) -> int:
+        metals = list(df.columns[1:])
+        # Same row order as the per-statement path: date-major, then metals in column order
+        dates = np.repeat([date.isoformat() for date in df['Dates']], len(metals)).tolist()
+        ids = [metal_ids[metal] for metal in metals] * len(df)
+        prices = df[metals].to_numpy(dtype=np.float64).ravel().tolist()
+
+        async with AiosqliteBulkWriter(engine.url.database, MetalPrice.__tablename__, ['date', 'metal_id', 'price'],
+                                       batch_size=batch_size, rows_per_transaction=rows_per_transaction,
+                                       conflict_columns=['metal_id', 'date']) as writer:
+            written = await writer.write(zip(dates, ids, prices))
+        # The writer commits outside SQLAlchemy, so the rollups of the written periods are refreshed afterwards
+        async with engine.begin() as conn:
+            await conn.run_sync(refresh_written_rollups, metal_ids.values(), list(df['Dates']))
+        return written
+
+    # Recompute MACD/RSI for every stored row: each metal's prices are loaded once in date order, computed
+    # vectorized, and written back in one executemany into a temp table joined by a single UPDATE on (metal_id, date)
+    async def calculate_macd_rsi(self) -> int:
+        async with self.async_session() as session:
+            updated = await session.run_sync(lambda sync_session: recompute_indicators(
+                sync_session.connection(), MetalPrice.__table__, 'metal_id'))
             await session.commit()
-
-            
+        return updated
 
 
 # Define main function to run async tasks
 @log_sql
 async def main(filename: str):
     service = MetalPriceService()
-    await service.populate_from_csv(filename)
+    await service.populate_from_csv(filename, bulk=True)
     await service.calculate_macd_rsi()
 
 # Execute the asyncio event loop
@@ -0,0 +1,93 @@
+from itertools import islice
+from typing import Iterable, Optional, Sequence
+
+import aiosqlite
+
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_ROWS_PER_TRANSACTION = 50000
+
+# Define AiosqliteBulkWriter class: parameter batches sent straight to aiosqlite's executemany, one round trip
+# to its worker thread per batch, committed every rows_per_transaction rows.
+# It writes through its own connection, outside SQLAlchemy: engine events (instrumentation, QueryCache.watch)
+# do not see these rows.
+#
+# With conflict_columns (a unique key, e.g. ['metal_id', 'date']) the INSERT becomes an upsert: a row whose key is
+# already stored overwrites that row's other written columns instead of failing.
+#
+#   async with AiosqliteBulkWriter('metal_commodity_Q5.db', 'metal_prices', ['date', 'metal', 'price']) as writer:
+#       await writer.write(rows)
+class AiosqliteBulkWriter:
+    def __init__(self, db_file: str, table: str, columns: Sequence[str], batch_size: int = DEFAULT_BATCH_SIZE,
+                 rows_per_transaction: int = DEFAULT_ROWS_PER_TRANSACTION, cached_statements: int = 128,
+                 synchronous: Optional[str] = None, conflict_columns: Optional[Sequence[str]] = None):
+        if batch_size < 1 or rows_per_transaction < 1:
+            raise ValueError(f"batch_size and rows_per_transaction must be positive, got {batch_size} and {rows_per_transaction}")
+        self.db_file = db_file
+        self.sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        if conflict_columns:
+            updated = [column for column in columns if column not in conflict_columns]
+            action = f"UPDATE SET {', '.join(f'{column} = excluded.{column}' for column in updated)}" if updated else 'NOTHING'
+            self.sql += f" ON CONFLICT ({', '.join(conflict_columns)}) DO {action}"
+        # A batch never straddles a commit, so transactions hold exactly rows_per_transaction rows
+        self.batch_size = min(batch_size, rows_per_transaction)
+        self.rows_per_transaction = rows_per_transaction
+        # sqlite3's prepared statement cache: the INSERT is compiled once and reused by every executemany
+        self.cached_statements = cached_statements
+        self.synchronous = synchronous
+        self.rows_written = 0
+        self.transactions = 0
+        self._db: Optional[aiosqlite.Connection] = None
+        self._pending = 0
+
+    async def open(self) -> 'AiosqliteBulkWriter':
+        # Autocommit mode: transactions are opened and committed explicitly below, not by the sqlite3 module
+        self._db = await aiosqlite.connect(self.db_file, isolation_level=None, cached_statements=self.cached_statements)
+        if self.synchronous is not None:
+            await self._db.execute(f'PRAGMA synchronous = {self.synchronous}')
+        return self
+
+    async def write(self, rows: Iterable[Sequence]) -> int:
+        rows = iter(rows)
+        written = 0
+        while True:
+            batch = list(islice(rows, min(self.batch_size, self.rows_per_transaction - self._pending)))
+            if not batch:
+                return written
+            if self._pending == 0:
+                await self._db.execute('BEGIN')
+            await self._db.executemany(self.sql, batch)
+            self._pending += len(batch)
+            written += len(batch)
+            self.rows_written += len(batch)
+            if self._pending >= self.rows_per_transaction:
+                await self.commit()
+
+    async def commit(self) -> None:
+        if self._pending:
+            await self._db.execute('COMMIT')
+            self.transactions += 1
+            self._pending = 0
+
+    async def rollback(self) -> None:
+        if self._pending:
+            await self._db.execute('ROLLBACK')
+            self.rows_written -= self._pending
+            self._pending = 0
+
+    async def close(self) -> None:
+        if self._db is not None:
+            await self._db.close()
+            self._db = None
+
+    async def __aenter__(self) -> 'AiosqliteBulkWriter':
+        return await self.open()
+
+    # Commit the tail on success; roll back the open transaction if the block raised
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        try:
+            if exc_type is None:
+                await self.commit()
+            else:
+                await self.rollback()
+        finally:
+            await self.close()
@@ -0,0 +1,203 @@
+from datetime import date
+from typing import Dict, Iterable, Mapping, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from indicator_registry import IndicatorEvaluator
+
+INDICATOR_FIELDS = ('macd', 'macd_signal', 'rsi')
+DateLike = Union[date, str, np.datetime64, pd.Timestamp]
+
+# Function to convert a date-like value to its day ordinal (days since 1970-01-01)
+def day_ordinal(value: DateLike) -> int:
+    return int(np.datetime64(pd.Timestamp(value).date(), 'D').astype(np.int64))
+
+# Define MetalView class: one metal's column of a PriceStore. Fields are read as attributes (view.price,
+# view.macd, ...) and come back as 1-D views into the store's matrices, no copies.
+class MetalView:
+    __slots__ = ('store', 'column')
+
+    def __init__(self, store: 'PriceStore', column: int):
+        self.store = store
+        self.column = column
+
+    def __getattr__(self, field: str) -> np.ndarray:
+        try:
+            return self.store.fields[field][:, self.column]
+        except KeyError:
+            raise AttributeError(f"no field {field!r}, expected one of {list(self.store.fields)}") from None
+
+    @property
+    def name(self) -> str:
+        return self.store.metals[self.column]
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self.store.dates
+
+    def __repr__(self) -> str:
+        return f"MetalView({self.name!r}, {len(self.store)} bars, fields={list(self.store.fields)})"
+
+# Define PriceStore class: a (dates x metals) universe held as flat arrays instead of a wide DataFrame.
+#   days    int32 day ordinals, strictly increasing (dates as datetime64[D] via .dates)
+#   metals  metal names, one per matrix column
+#   fields  {'price': matrix, 'macd': matrix, ...}, each (n_dates, n_metals) float32 or float64
+# Matrices built here are column-major, so one metal's series is contiguous; row-major matrices (a memory-mapped
+# PriceArchive, which appends whole dates) are kept as they are. Date-range slices are found by binary
+# search and share memory with the store. float32 halves the footprint for analytics and charts; keep the
+# default float64 when the values are written back to the database.
+# store['Dates'], store[metal] and store[f'{metal}_{field}'] return the columns of the wide frame layout
+# (calculate_macd_rsi's), so code written against that frame, e.g. plot_macd_rsi_price, takes a store as is.
+# validated=True skips the O(n) check that days are strictly increasing, for days taken from a store that
+# was already checked (slices, selections) or read from a PriceArchive, which only ever appends newer dates.
+class PriceStore:
+    __slots__ = ('days', 'metals', 'fields', '_columns')
+
+    def __init__(self, days: np.ndarray, metals: Sequence[str], fields: Mapping[str, np.ndarray],
+                 validated: bool = False):
+        days = np.ascontiguousarray(days, dtype=np.int32)
+        if not validated and len(days) > 1 and not (np.diff(days) > 0).all():
+            raise ValueError("days must be strictly increasing")
+        self.days = days
+        self.metals = tuple(metals)
+        self._columns: Dict[str, int] = {metal: index for index, metal in enumerate(self.metals)}
+        self.fields: Dict[str, np.ndarray] = {}
+        for field, matrix in fields.items():
+            if matrix.shape != (len(days), len(self.metals)):
+                raise ValueError(f"{field} is {matrix.shape}, expected {(len(days), len(self.metals))}")
+            # Row slices keep unit-stride columns (column-major) or rows (row-major, e.g. a memory-mapped
+            # archive), and are used as they are; any other layout is copied to column-major
+            unit_stride = matrix.itemsize in matrix.strides or min(matrix.shape) <= 1
+            self.fields[field] = matrix if unit_stride else np.asfortranarray(matrix)
+
+    # Function to build a store from a 'Dates' + one-column-per-metal frame (MarketData_filtered.csv). Columns
+    # named f'{metal}_{field}' (calculate_macd_rsi's output) become field matrices.
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dtype=np.float64) -> 'PriceStore':
+        names = set(df.columns[1:])
+        suffixed = {f'{metal}_{field}' for metal in names for field in INDICATOR_FIELDS}
+        metals = [column for column in df.columns[1:] if column not in suffixed]
+        days = pd.DatetimeIndex(df['Dates']).values.astype('datetime64[D]').astype(np.int32)
+        fields = {'price': df[metals].to_numpy(dtype=dtype)}
+        for field in INDICATOR_FIELDS:
+            columns = [f'{metal}_{field}' for metal in metals]
+            if all(column in names for column in columns):
+                fields[field] = df[columns].to_numpy(dtype=dtype)
+        return cls._sorted(days, metals, fields)
+
+    # Function to build a store from an indicator block with (field, metal) columns and a DatetimeIndex,
+    # as returned by get_series, or from calculate_indicator_block together with its dates
+    @classmethod
+    def from_block(cls, block: pd.DataFrame, dates: Optional[Iterable] = None, dtype=np.float64) -> 'PriceStore':
+        dates = block.index if dates is None else dates
+        days = pd.DatetimeIndex(dates).values.astype('datetime64[D]').astype(np.int32)
+        fields_in_block = list(dict.fromkeys(block.columns.get_level_values(0)))
+        metals = list(block[fields_in_block[0]].columns)
+        fields = {field: block[field][metals].to_numpy(dtype=dtype) for field in fields_in_block}
+        return cls._sorted(days, metals, fields)
+
+    # Function to build a store straight from read_series_arrays' output, no DataFrame in between
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray], dtype=np.float64) -> 'PriceStore':
+        fields = {field: np.asarray(matrix, dtype=dtype) for field, matrix in arrays.items() if field not in ('date', 'metals')}
+        return cls(arrays['date'].astype('datetime64[D]').astype(np.int32), list(arrays['metals']), fields)
+
+    @classmethod
+    def _sorted(cls, days: np.ndarray, metals: Sequence[str], fields: Dict[str, np.ndarray]) -> 'PriceStore':
+        if len(days) > 1 and not (np.diff(days) > 0).all():
+            order = np.argsort(days, kind='stable')
+            days = days[order]
+            fields = {field: matrix[order] for field, matrix in fields.items()}
+            # Sorted, but a repeated date still fails the check
+            return cls(days, metals, fields)
+        return cls(days, metals, fields, validated=True)
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self.days.astype('datetime64[D]')
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self.fields['price'].dtype
+
+    @property
+    def nbytes(self) -> int:
+        return self.days.nbytes + sum(matrix.nbytes for matrix in self.fields.values())
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    def __repr__(self) -> str:
+        return (f"PriceStore({len(self.days)} dates x {len(self.metals)} metals, fields={list(self.fields)}, "
+                f"{self.dtype}, {self.nbytes / 1024 ** 2:.1f} MiB)")
+
+    def metal(self, name: str) -> MetalView:
+        return MetalView(self, self._columns[name])
+
+    def column(self, name: str) -> int:
+        return self._columns[name]
+
+    # Wide-frame column access: 'Dates', a metal's price, or f'{metal}_{field}'
+    def __getitem__(self, key: str) -> np.ndarray:
+        if key == 'Dates':
+            return self.dates
+        if key in self._columns:
+            return self.fields['price'][:, self._columns[key]]
+        for field, matrix in self.fields.items():
+            metal = key[:-len(field) - 1]
+            if key.endswith(f'_{field}') and metal in self._columns:
+                return matrix[:, self._columns[metal]]
+        raise KeyError(key)
+
+    # Function to return the rows with start <= date <= end (either bound optional) as a store sharing this
+    # store's memory; the bounds are found by binary search over the day ordinals
+    def slice(self, start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> 'PriceStore':
+        lo = 0 if start is None else int(np.searchsorted(self.days, day_ordinal(start), side='left'))
+        hi = len(self.days) if end is None else int(np.searchsorted(self.days, day_ordinal(end), side='right'))
+        return PriceStore(self.days[lo:hi], self.metals, {field: matrix[lo:hi] for field, matrix in self.fields.items()},
+                          validated=True)
+
+    # Function to return a store limited to some metals (their columns copied)
+    def select(self, metals: Sequence[str]) -> 'PriceStore':
+        columns = [self._columns[metal] for metal in metals]
+        return PriceStore(self.days, metals, {field: matrix[:, columns] for field, matrix in self.fields.items()},
+                          validated=True)
+
+    # Function to compute indicators over the price matrix with the indicator registry, returning a store with
+    # the extra fields. `indicators` maps field names to registry names or node keys; the default adds the
+    # MACD/RSI columns calculate_macd_rsi produces. Every kernel is column-wise, so metals are evaluated
+    # chunk_metals at a time straight into the output matrices: the intermediates (EMAs, gains, losses) only
+    # ever exist for one chunk.
+    def with_indicators(self, indicators: Optional[Mapping[str, Union[str, tuple]]] = None,
+                        chunk_metals: int = 64) -> 'PriceStore':
+        indicators = indicators or {'macd': 'macd', 'macd_signal': 'macd_signal', 'rsi': 'rsi'}
+        if chunk_metals < 1:
+            raise ValueError(f"chunk_metals must be positive, got {chunk_metals}")
+        prices = self.fields['price']
+        fields = dict(self.fields)
+        outputs = {field: np.empty(prices.shape, dtype=self.dtype, order='F') for field in indicators}
+        for lo in range(0, prices.shape[1], chunk_metals):
+            # float64 columns are wrapped without a copy; the kernels run in float64 either way
+            evaluator = IndicatorEvaluator(pd.DataFrame(prices[:, lo:lo + chunk_metals], copy=False))
+            for field, name in indicators.items():
+                outputs[field][:, lo:lo + chunk_metals] = evaluator.get(name).to_numpy()
+        fields.update(outputs)
+        return PriceStore(self.days, self.metals, fields, validated=True)
+
+    # Function to return the fields as a (field, metal) block with a DatetimeIndex named 'Dates', like get_series
+    def to_block(self) -> pd.DataFrame:
+        index = pd.DatetimeIndex(self.dates, name='Dates')
+        return pd.concat({field: pd.DataFrame(matrix, index=index, columns=list(self.metals))
+                          for field, matrix in self.fields.items()}, axis=1)
+
+    # Function to melt the store into long rows (date, metal_id, field...) in populate_sql_table's order:
+    # date-major, then metals in store order. NaN values become None (NULL).
+    def melt(self, metal_ids: Mapping[str, int], fields: Sequence[str] = ('price',) + INDICATOR_FIELDS) -> pd.DataFrame:
+        n_dates, n_metals = len(self.days), len(self.metals)
+        long_df = pd.DataFrame({'date': np.repeat(self.dates.astype(object), n_metals),
+                                'metal_id': np.tile(np.array([metal_ids[metal] for metal in self.metals], dtype=np.int64), n_dates)})
+        for field in fields:
+            # C-order ravel of (dates x metals) is date-major; float32 values are widened for the database
+            long_df[field] = self.fields[field].astype(np.float64).ravel(order='C')
+        return long_df.astype(object).where(long_df.notna(), None)
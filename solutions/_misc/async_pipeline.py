@@ -0,0 +1,141 @@
+import asyncio
+import contextlib
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from bulk_insert import ensure_metals, melt_indicator_frame, iter_param_chunks, refresh_written_rollups, DEFAULT_CHUNK_SIZE
+from incremental import MetalIndicator
+from models import MetalPrice
+from streaming import iter_price_chunks
+
+_STOP = object()
+
+# Function run in a worker process: advance one metal's indicator state over one chunk.
+# The state travels with the task, so chunks of the same metal stay sequential while metals run in parallel.
+def advance_indicator(indicator: MetalIndicator, dates: np.ndarray, prices: np.ndarray) -> Tuple[MetalIndicator, np.ndarray]:
+    return indicator, indicator.update_many(dates, prices)
+
+# Define IngestPipeline class: CSV producer -> process-pool indicator stage -> N async writers.
+# The bounded asyncio.Queue between compute and writers provides backpressure: the producer stops
+# reading ahead once queue_size insert batches are waiting.
+# On SQLite the writers take turns behind one lock, as SQLite admits a single writer even in WAL mode: more
+# writers do not raise write throughput there (benchmark_async_pipeline measures no gain from 2 or 4 writers),
+# they only have the next batch dequeued while another commits. writers > 1 pays off on a database server
+# that accepts concurrent writes.
+class IngestPipeline:
+    def __init__(self, engine: AsyncEngine, writers: int = 2, queue_size: int = 8, chunksize: int = 10000,
+                 batch_size: int = DEFAULT_CHUNK_SIZE, executor: Optional[Executor] = None, max_workers: Optional[int] = None):
+        if writers < 1:
+            raise ValueError(f"writers must be at least 1, got {writers}")
+        self.engine = engine
+        self.writers = writers
+        self.queue_size = queue_size
+        self.chunksize = chunksize
+        self.batch_size = batch_size
+        self.executor = executor
+        self.max_workers = max_workers
+        self.indicators: Dict[str, MetalIndicator] = {}
+        self.metal_ids: Dict[str, int] = {}
+        self._write_lock: Optional[asyncio.Lock] = None
+
+    # SQLite takes one writer at a time: its transactions are serialized on the loop rather than left to busy-timeout
+    # retries, which is also why the writer count does not scale writes on SQLite
+    @contextlib.asynccontextmanager
+    async def _serialized(self):
+        if self._write_lock is None:
+            yield
+        else:
+            async with self._write_lock:
+                yield
+
+    # Stage 2: compute one chunk for all metals in the process pool and assemble the wide frame
+    async def _compute(self, executor: Executor, chunk: pd.DataFrame) -> pd.DataFrame:
+        loop = asyncio.get_running_loop()
+        metals = list(chunk.columns[1:])
+        dates = chunk['Dates'].to_numpy()
+        futures = [loop.run_in_executor(executor, advance_indicator,
+                                        self.indicators.get(metal) or MetalIndicator(metal),
+                                        dates, chunk[metal].to_numpy(dtype=np.float64))
+                   for metal in metals]
+        columns = {'Dates': chunk['Dates'], **{metal: chunk[metal] for metal in metals}}
+        for metal, (indicator, out) in zip(metals, await asyncio.gather(*futures)):
+            self.indicators[metal] = indicator
+            columns[f'{metal}_macd'] = out[:, 0]
+            columns[f'{metal}_macd_signal'] = out[:, 1]
+            columns[f'{metal}_rsi'] = out[:, 2]
+        return pd.DataFrame(columns)
+
+    # Stage 1 + 2: read chunks off the event loop, compute them, and queue insert batches
+    async def _produce(self, executor: Executor, csv_file: str, batches: asyncio.Queue) -> None:
+        loop = asyncio.get_running_loop()
+        chunks = iter_price_chunks(csv_file, self.chunksize)
+        next_chunk = loop.run_in_executor(None, next, chunks, None)
+        while True:
+            chunk = await next_chunk
+            if chunk is None:
+                return
+            # Start reading the following chunk while this one is being computed
+            next_chunk = loop.run_in_executor(None, next, chunks, None)
+            metals = list(chunk.columns[1:])
+            missing = [metal for metal in metals if metal not in self.metal_ids]
+            if missing:
+                async with self._serialized(), self.engine.begin() as conn:
+                    self.metal_ids.update(await conn.run_sync(ensure_metals, missing))
+            wide = await self._compute(executor, chunk)
+            long_df = melt_indicator_frame(wide, metals, self.metal_ids)
+            for params in iter_param_chunks(long_df, self.batch_size):
+                await batches.put(params)
+
+    # Stage 3: drain the queue into the database, one transaction per batch, with the rollups of the
+    # periods the batch falls in refreshed in the same transaction
+    async def _write(self, batches: asyncio.Queue) -> int:
+        statement = insert(MetalPrice.__table__)
+        rows = 0
+        while True:
+            params = await batches.get()
+            try:
+                if params is _STOP:
+                    return rows
+                async with self._serialized(), self.engine.begin() as conn:
+                    await conn.execute(statement, params)
+                    await conn.run_sync(refresh_written_rollups, [row['metal_id'] for row in params],
+                                        [row['date'] for row in params])
+                rows += len(params)
+            finally:
+                batches.task_done()
+
+    async def run(self, csv_file: str) -> int:
+        batches: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        executor = self.executor or ProcessPoolExecutor(max_workers=self.max_workers)
+        self._write_lock = asyncio.Lock() if self.engine.dialect.name == 'sqlite' else None
+        writer_tasks: List[asyncio.Task] = [asyncio.create_task(self._write(batches)) for _ in range(self.writers)]
+        producer_task = asyncio.create_task(self._produce(executor, csv_file, batches))
+        stop_task = None
+        try:
+            # Fail fast: a writer error cancels the producer instead of leaving it blocked on a full queue
+            pending = {producer_task, *writer_tasks}
+            while not producer_task.done():
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        raise task.exception()
+
+            # Clean shutdown: one sentinel per writer once everything queued so far is written
+            async def stop_writers():
+                for _ in writer_tasks:
+                    await batches.put(_STOP)
+            stop_task = asyncio.create_task(stop_writers())
+            return sum(await asyncio.gather(*writer_tasks))
+        finally:
+            tasks = [task for task in (producer_task, stop_task, *writer_tasks) if task is not None]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if self.executor is None:
+                # Joining the worker processes blocks, so it waits in a thread instead of on the event loop
+                await asyncio.get_running_loop().run_in_executor(None, executor.shutdown, True)
@@ -0,0 +1,104 @@
+from typing import Callable, Dict
+
+import numpy as np
+import pandas as pd
+
+PERIODS_PER_YEAR = 252
+
+# Signal and backtest functions work on arrays shaped (dates, metals, ...): any trailing axes (e.g. the
+# parameter axis of parameter_sweep's outputs) are backtested side by side. Positions are target exposures
+# decided on each bar's close, -1 (short) to +1 (long), and are held from the next bar on.
+
+# Function to turn MACD crossovers into positions: long while the MACD line is above its signal line and
+# short while below (flat instead of short with long_only). Bars where either is missing (warm-up) are flat.
+def macd_crossover_signals(macd: np.ndarray, macd_signal: np.ndarray, long_only: bool = False) -> np.ndarray:
+    positions = np.nan_to_num(np.sign(np.asarray(macd, dtype=np.float64) - macd_signal), nan=0.0)
+    return np.clip(positions, 0, 1, out=positions) if long_only else positions
+
+# Function to turn RSI thresholds into positions: go long when RSI falls below `lower` (oversold) and short
+# when it rises above `upper` (overbought), holding the position in between (flat instead of short with
+# long_only). Bars before the first threshold crossing are flat.
+def rsi_threshold_signals(rsi: np.ndarray, lower: float = 30, upper: float = 70, long_only: bool = False) -> np.ndarray:
+    if not lower < upper:
+        raise ValueError(f"lower must be below upper, got {lower} and {upper}")
+    rsi = np.asarray(rsi, dtype=np.float64)
+    events = np.where(rsi < lower, 1.0, np.where(rsi > upper, 0.0 if long_only else -1.0, np.nan))
+    return np.nan_to_num(forward_fill(events), nan=0.0)
+
+# Function to carry the last non-NaN value forward along the date axis, without a per-bar loop:
+# each cell takes the value at the latest index up to it where one was set
+def forward_fill(values: np.ndarray) -> np.ndarray:
+    shape = (-1,) + (1,) * (values.ndim - 1)
+    index = np.where(np.isnan(values), 0, np.arange(len(values)).reshape(shape))
+    np.maximum.accumulate(index, axis=0, out=index)
+    return np.take_along_axis(values, index, axis=0)
+
+# Named strategies for backtest_block: each takes the indicator block and returns positions (dates x metals)
+STRATEGIES: Dict[str, Callable[..., np.ndarray]] = {
+    'macd_crossover': lambda block, long_only=False: macd_crossover_signals(block['macd'].to_numpy(),
+                                                                            block['macd_signal'].to_numpy(), long_only),
+    'rsi_threshold': lambda block, lower=30, upper=70, long_only=False: rsi_threshold_signals(block['rsi'].to_numpy(),
+                                                                                             lower, upper, long_only),
+}
+
+# Function to backtest target positions against prices (dates x metals); positions may carry trailing axes.
+# Each bar earns the previous bar's position times the price return, less cost_bps per unit of position
+# traded. Returns per-backtest statistics shaped positions.shape[1:]:
+#   total_return, annual_return, annual_volatility, sharpe, max_drawdown, turnover (position traded per year)
+#   and trades (bars with a position change); with curves=True also the per-bar 'position' (held), 'pnl',
+#   'equity' and 'drawdown' arrays.
+# A missing price repeats the last one: the position is held through the gap and earns the whole move across
+# it on the next priced bar. Raises ValueError on an empty date axis, which has no statistics.
+def backtest(prices: np.ndarray, positions: np.ndarray, cost_bps: float = 0.0, periods_per_year: int = PERIODS_PER_YEAR,
+             curves: bool = False) -> Dict[str, np.ndarray]:
+    prices = np.asarray(prices, dtype=np.float64)
+    positions = np.asarray(positions, dtype=np.float64)
+    if positions.shape[:2] != prices.shape:
+        raise ValueError(f"positions {positions.shape} do not start with the prices' shape {prices.shape}")
+    n_dates = len(prices)
+    if n_dates == 0:
+        raise ValueError("prices have no dates to backtest")
+
+    # Returns on forward-filled prices, so a move across missing prices is not dropped with them
+    filled = forward_fill(prices)
+    returns = np.zeros_like(prices)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        returns[1:] = filled[1:] / filled[:-1] - 1
+    np.nan_to_num(returns, copy=False, nan=0.0, posinf=0.0, neginf=0.0)
+    returns = returns.reshape(prices.shape + (1,) * (positions.ndim - 2))
+
+    held = np.zeros_like(positions)
+    held[1:] = positions[:-1]
+    traded = np.abs(np.diff(held, axis=0, prepend=0.0))
+    pnl = held * returns
+    if cost_bps:
+        pnl -= traded * (cost_bps / 1e4)
+    equity = np.cumprod(1 + pnl, axis=0)
+    drawdown = equity / np.maximum.accumulate(equity, axis=0) - 1
+
+    years = n_dates / periods_per_year
+    mean = pnl.mean(axis=0)
+    volatility = pnl.std(axis=0, ddof=1) if n_dates > 1 else np.full(pnl.shape[1:], np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe = np.where(volatility > 0, mean / volatility * np.sqrt(periods_per_year), np.nan)
+        # A wiped-out account (equity at or below zero) stays at -100%
+        annual_return = np.where(equity[-1] > 0, np.abs(equity[-1]) ** (1 / years) - 1, -1.0)
+    stats = {'total_return': equity[-1] - 1, 'annual_return': annual_return,
+             'annual_volatility': volatility * np.sqrt(periods_per_year), 'sharpe': sharpe,
+             'max_drawdown': drawdown.min(axis=0), 'turnover': traded.sum(axis=0) / years,
+             'trades': np.count_nonzero(traded, axis=0)}
+    if curves:
+        stats.update({'position': held, 'pnl': pnl, 'equity': equity, 'drawdown': drawdown})
+    return stats
+
+# Function to backtest a named strategy on an indicator block with (field, metal) columns, as returned by
+# calculate_indicator_block or get_series(conn, metals, fields=('price', 'macd', 'macd_signal', 'rsi')).
+# Returns one row of statistics per metal.
+#   backtest_block(block, 'rsi_threshold', lower=25, upper=75, cost_bps=5)
+def backtest_block(block: pd.DataFrame, strategy: str = 'macd_crossover', cost_bps: float = 0.0,
+                   periods_per_year: int = PERIODS_PER_YEAR, **params) -> pd.DataFrame:
+    if strategy not in STRATEGIES:
+        raise KeyError(f"unknown strategy {strategy!r}, expected one of {sorted(STRATEGIES)}")
+    positions = STRATEGIES[strategy](block, **params)
+    stats = backtest(block['price'].to_numpy(), positions, cost_bps, periods_per_year)
+    return pd.DataFrame(stats, index=pd.Index(block['price'].columns, name='metal'))
@@ -0,0 +1,129 @@
+import argparse
+import asyncio
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import Column, Date, Float, Integer, String
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+from sqlalchemy.orm import DeclarativeBase
+
+from aiosqlite_writer import AiosqliteBulkWriter
+from benchmark_streaming import write_synthetic_csv
+
+# The table Question5_v4 first wrote, with the metal name on every row (it now writes models' metal_id
+# schema). Both paths below write the same layout, so the comparison is of the write paths only
+class Base(DeclarativeBase):
+    pass
+
+class MetalPrice(Base):
+    __tablename__ = 'metal_prices'
+
+    id = Column(Integer, primary_key=True)
+    date = Column(Date)
+    metal = Column(String)
+    price = Column(Float)
+    macd = Column(Float)
+    macd_signal = Column(Float)
+    rsi = Column(Float)
+
+def create_table(db_file: str) -> None:
+    with sqlite3.connect(db_file) as conn:
+        conn.execute('CREATE TABLE metal_prices (id INTEGER PRIMARY KEY, date DATE, metal VARCHAR, '
+                     'price FLOAT, macd FLOAT, macd_signal FLOAT, rsi FLOAT)')
+
+def read_prices(csv_file: str) -> pd.DataFrame:
+    df = pd.read_csv(csv_file)
+    df['Dates'] = pd.to_datetime(df['Dates']).dt.date
+    return df
+
+# Current path: Question5_v4.populate_from_csv, one insert().values() per cell and a commit per date row
+async def per_statement(db_file: str, df: pd.DataFrame) -> int:
+    engine = create_async_engine(f'sqlite+aiosqlite:///{db_file}')
+    async with async_sessionmaker(bind=engine, expire_on_commit=False)() as session:
+        for index, row in df.iterrows():
+            date = row['Dates']
+            for metal, price in row.items():
+                if metal != 'Dates':
+                    await session.execute(MetalPrice.__table__.insert().values(date=date, metal=metal, price=price))
+            await session.commit()
+    await engine.dispose()
+    return (len(df.columns) - 1) * len(df)
+
+# Bulk path: the same rows as Question5_v4.MetalPriceService.bulk_write_prices
+async def bulk(db_file: str, df: pd.DataFrame, rows_per_transaction: int, cached_statements: int, batch_size: int = 5000) -> int:
+    metals = list(df.columns[1:])
+    dates = np.repeat([date.isoformat() for date in df['Dates']], len(metals)).tolist()
+    prices = df[metals].to_numpy(dtype=np.float64).ravel().tolist()
+    async with AiosqliteBulkWriter(db_file, 'metal_prices', ['date', 'metal', 'price'], batch_size=batch_size,
+                                   rows_per_transaction=rows_per_transaction, cached_statements=cached_statements) as writer:
+        return await writer.write(zip(dates, metals * len(df), prices))
+
+def stored(db_file: str) -> list:
+    with sqlite3.connect(db_file) as conn:
+        return conn.execute('SELECT date, metal, price FROM metal_prices ORDER BY id').fetchall()
+
+# The Question scripts write metal_prices with its unique (metal_id, date) index: run each twice on the sample
+# CSV, the second run overwriting the stored bars instead of failing or adding rows
+def check_reruns(tmp_dir: str) -> None:
+    here = os.path.dirname(os.path.abspath(__file__))
+    for script, db_name in (('Question5_v4.py', 'metal_commodity_Q5_v4.db'),
+                            ('Question4_original.py', 'metal_commodity_Q4_TEST.db')):
+        work_dir = os.path.join(tmp_dir, os.path.splitext(script)[0])
+        os.mkdir(work_dir)
+        shutil.copy(os.path.join(here, '..', 'MarketData_filtered.csv'), work_dir)
+        counts = []
+        for _ in range(2):
+            result = subprocess.run([sys.executable, os.path.join(here, script)], cwd=work_dir, capture_output=True,
+                                    text=True, env={**os.environ, 'PYTHONPATH': here})
+            assert result.returncode == 0, (script, result.stderr[-2000:])
+            with sqlite3.connect(os.path.join(work_dir, db_name)) as conn:
+                counts.append(conn.execute('SELECT COUNT(*), COUNT(rsi) FROM metal_prices').fetchone())
+        assert counts[0] == counts[1] and counts[0][0] > 0, (script, counts)
+
+async def main(n_rows: int, n_bulk_rows: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        check_reruns(tmp_dir)
+        csv_file = os.path.join(tmp_dir, 'prices.csv')
+        write_synthetic_csv(csv_file, max(n_rows, n_bulk_rows))
+        df = read_prices(csv_file)
+
+        # The per-statement path is too slow for the full file; it writes the first n_rows dates only
+        runs = [('per-statement (Question5_v4)', lambda db: per_statement(db, df.iloc[:n_rows]))]
+        for rows_per_transaction in (1000, 10000, 100000, 10000000):
+            runs.append((f'executemany, {rows_per_transaction} rows/txn',
+                         lambda db, n=rows_per_transaction: bulk(db, df.iloc[:n_bulk_rows], n, 128)))
+        runs.append(('executemany, no statement cache', lambda db: bulk(db, df.iloc[:n_bulk_rows], 10000000, 0)))
+
+        reference = None
+        print(f"{'path':<38} {'rows':>9} {'time':>9} {'rows/s':>12}")
+        for index, (label, run) in enumerate(runs):
+            db_file = os.path.join(tmp_dir, f'run{index}.db')
+            create_table(db_file)
+            start = time.perf_counter()
+            rows = await run(db_file)
+            elapsed = time.perf_counter() - start
+            print(f"{label:<38} {rows:9d} {elapsed:8.3f}s {rows / elapsed:12,.0f}")
+
+            # Every path stores the same rows in the same order
+            rows = stored(db_file)
+            if index == 0:
+                per_statement_rows = rows
+            elif reference is None:
+                reference = rows
+                assert reference[:len(per_statement_rows)] == per_statement_rows, label
+            else:
+                assert rows == reference, label
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Question5_v4's per-statement inserts vs the aiosqlite executemany writer")
+    parser.add_argument('--rows', type=int, default=1000, help='CSV rows (dates) for the per-statement path; each has 5 metals')
+    parser.add_argument('--bulk-rows', type=int, default=200000, help='CSV rows (dates) for the executemany writer')
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.bulk_rows))
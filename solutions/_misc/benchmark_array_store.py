@@ -0,0 +1,112 @@
+import argparse
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from array_store import PriceStore
+from benchmark_indicator_block import synthetic_prices
+from bulk_insert import melt_indicator_frame
+from indicators import calculate_indicator_block, calculate_macd, calculate_rsi, to_wide_frame
+
+# Function to run func under tracemalloc, returning (result, peak MiB while it ran, MiB still held by the result)
+def traced(func):
+    tracemalloc.start()
+    result = func()
+    held, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak / 1024 ** 2, held / 1024 ** 2
+
+# Current path: calculate_macd_rsi's layout, a 'Dates' column plus three float64 columns inserted per metal
+def wide_frame(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    with warnings.catch_warnings():
+        # Column-by-column inserts fragment the frame; pandas warns about exactly this
+        warnings.simplefilter('ignore', pd.errors.PerformanceWarning)
+        for metal in df.columns[1:]:
+            macd_line, macd_signal = calculate_macd(df[metal])
+            df[f'{metal}_macd'] = macd_line
+            df[f'{metal}_macd_signal'] = macd_signal
+            df[f'{metal}_rsi'] = calculate_rsi(df[metal])
+    return df
+
+def best_of(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Wide pandas frame vs PriceStore for a daily metals universe')
+    parser.add_argument('--metals', type=int, default=500)
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--iterrows', type=int, default=200, help='rows timed for the iterrows hot path')
+    args = parser.parse_args()
+
+    dates = pd.bdate_range('2000-01-03', periods=args.years * 261)
+    prices = synthetic_prices(args.metals, len(dates))
+    raw = pd.concat([pd.Series(dates, name='Dates'), prices], axis=1)
+
+    wide, wide_peak, _ = traced(lambda: wide_frame(raw))
+    wide_bytes = wide.memory_usage(deep=True).sum() / 1024 ** 2
+    block_wide, block_peak, _ = traced(lambda: to_wide_frame(raw['Dates'], calculate_indicator_block(prices)))
+    block_bytes = block_wide.memory_usage(deep=True).sum() / 1024 ** 2
+    del block_wide
+
+    stores = {}
+    rows = [('wide frame (calculate_macd_rsi loop)', wide_peak, wide_bytes),
+            ('wide frame (indicator block)', block_peak, block_bytes)]
+    for dtype in (np.float64, np.float32):
+        store, peak, _ = traced(lambda: PriceStore.from_frame(raw, dtype=dtype).with_indicators())
+        stores[np.dtype(dtype).name] = store
+        rows.append((f'PriceStore {np.dtype(dtype).name}', peak, store.nbytes / 1024 ** 2))
+
+    # Same values as the wide frame; float32 within its rounding (the kernels see float32-rounded prices,
+    # which moves RSI by under 1e-3 points)
+    store64, store32 = stores['float64'], stores['float32']
+    metals = list(prices.columns)
+    for field, suffix in (('price', ''), ('macd', '_macd'), ('macd_signal', '_macd_signal'), ('rsi', '_rsi')):
+        expected = wide[[f'{metal}{suffix}' for metal in metals]].to_numpy()
+        assert np.array_equal(store64.fields[field], expected, equal_nan=True), field
+        assert np.allclose(store32.fields[field], expected, rtol=1e-5, atol=1e-3, equal_nan=True), field
+
+    print(f"{args.metals} metals x {len(dates)} business days ({args.years} years)")
+    print(f"{'layout':<38} {'held':>9} {'build peak':>11}")
+    for label, peak, held in rows:
+        print(f"{label:<38} {held:7.1f}MB {peak:9.1f}MB")
+
+    # Date-range slicing: boolean mask over the Dates column vs binary search (a view, nothing copied)
+    start, end = dates[len(dates) // 2], dates[len(dates) // 2 + 20]
+    mask_time = best_of(lambda: wide[(wide['Dates'] >= start) & (wide['Dates'] <= end)])
+    slice_time = best_of(lambda: store64.slice(start, end))
+    assert np.array_equal(store64.slice(start, end).fields['rsi'],
+                          wide.loc[(wide['Dates'] >= start) & (wide['Dates'] <= end), [f'{m}_rsi' for m in metals]].to_numpy(),
+                          equal_nan=True)
+    # Slices reuse the checked days without rescanning them; the constructor still rejects unordered days
+    try:
+        PriceStore(store64.days[::-1], store64.metals, {})
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('a store was built on decreasing days')
+    print(f"{'21-day slice: boolean mask on frame':<38} {mask_time * 1e3:9.3f}ms")
+    print(f"{'21-day slice: PriceStore.slice':<38} {slice_time * 1e3:9.3f}ms")
+
+    # Hot path: populate_sql_table's iterrows over the wide frame vs the store's vectorized melt
+    n_rows = min(args.iterrows, len(wide))
+    start_time = time.perf_counter()
+    for index, row in wide.iloc[:n_rows].iterrows():
+        for metal in metals:
+            values = (row[metal], row[f'{metal}_macd'], row[f'{metal}_macd_signal'], row[f'{metal}_rsi'])
+    iterrows_time = (time.perf_counter() - start_time) / n_rows * len(wide)
+    metal_ids = {metal: index + 1 for index, metal in enumerate(metals)}
+    small = store64.slice(end=dates[99])
+    expected = melt_indicator_frame(wide.iloc[:100], pd.Index(metals), metal_ids)
+    assert small.melt(metal_ids).equals(expected)
+    melt_time = best_of(lambda: store64.melt(metal_ids), 1)
+    print(f"{'writer rows: iterrows (extrapolated)':<38} {iterrows_time:8.2f}s")
+    print(f"{'writer rows: PriceStore.melt':<38} {melt_time:8.2f}s")
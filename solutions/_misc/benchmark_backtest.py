@@ -0,0 +1,129 @@
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from backtest import backtest, backtest_block, macd_crossover_signals, rsi_threshold_signals
+from benchmark_indicator_block import synthetic_prices
+from bulk_insert import bulk_insert
+from indicators import calculate_indicator_block, to_wide_frame
+from migrate_schema import upgrade_schema
+from benchmark_parameter_sweep import GRIDS
+from parameter_sweep import iter_macd_sweep, macd_grid, sweep_rsi
+from series_reader import get_series
+
+# Reference: one metal, one strategy, walked bar by bar in Python
+def per_bar(prices: np.ndarray, indicator: np.ndarray, indicator_signal: np.ndarray, strategy: str,
+            cost_bps: float, lower: float = 30, upper: float = 70) -> dict:
+    position, target, equity, peak, max_drawdown, traded = 0.0, 0.0, 1.0, 1.0, 0.0, 0.0
+    for index in range(len(prices)):
+        # The position decided on the previous close is held over this bar
+        change = abs(target - position)
+        position = target
+        bar_return = prices[index] / prices[index - 1] - 1 if index else 0.0
+        equity *= 1 + position * bar_return - change * cost_bps / 1e4
+        traded += change
+        peak = max(peak, equity)
+        max_drawdown = min(max_drawdown, equity / peak - 1)
+        if strategy == 'macd_crossover':
+            difference = indicator[index] - indicator_signal[index]
+            target = 0.0 if np.isnan(difference) else float(np.sign(difference))
+        elif indicator[index] < lower:
+            target = 1.0
+        elif indicator[index] > upper:
+            target = -1.0
+    return {'total_return': equity - 1, 'max_drawdown': max_drawdown, 'turnover': traded * 252 / len(prices)}
+
+def check_against_per_bar(block: pd.DataFrame) -> None:
+    for strategy in ('macd_crossover', 'rsi_threshold'):
+        stats = backtest_block(block, strategy, cost_bps=5)
+        for metal in block['price'].columns:
+            indicator = block['macd' if strategy == 'macd_crossover' else 'rsi'][metal].to_numpy()
+            expected = per_bar(block['price'][metal].to_numpy(), indicator, block['macd_signal'][metal].to_numpy(),
+                               strategy, cost_bps=5)
+            for field, value in expected.items():
+                assert np.isclose(stats.loc[metal, field], value, rtol=1e-9), (strategy, metal, field)
+
+# Gaps and empty input: held through missing prices, a position earns the move across them
+def check_edge_cases() -> None:
+    prices = np.array([[100.0, 100.0], [np.nan, 110.0], [np.nan, np.nan], [121.0, 121.0], [133.1, np.nan]])
+    stats = backtest(prices, np.ones_like(prices))
+    assert np.allclose(stats['total_return'], [0.331, 0.21]), stats['total_return']
+    try:
+        backtest(np.empty((0, 2)), np.empty((0, 2)))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError('an empty backtest returned statistics')
+
+def per_bar_time(block: pd.DataFrame) -> float:
+    metal = block['price'].columns[0]
+    start = time.perf_counter()
+    per_bar(block['price'][metal].to_numpy(), block['macd'][metal].to_numpy(), block['macd_signal'][metal].to_numpy(),
+            'macd_crossover', cost_bps=5)
+    return time.perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Vectorized signal generation and backtests over metals x parameter grids')
+    parser.add_argument('--metals', type=int, default=20)
+    parser.add_argument('--bars', type=int, default=2500)
+    parser.add_argument('--cost-bps', type=float, default=5)
+    args = parser.parse_args()
+
+    # Synthetic walk shifted well above zero, so returns are meaningful
+    prices = synthetic_prices(args.metals, args.bars) + 1000
+    block = calculate_indicator_block(prices)
+
+    # Stored path: the same block written to metal_prices and read back gives the same backtests
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'backtest.db')}")
+        with engine.begin() as conn:
+            upgrade_schema(conn, covering_indexes=False)
+        dates = pd.Series(pd.bdate_range('2010-01-01', periods=args.bars), name='Dates')
+        bulk_insert(engine, to_wide_frame(dates, block), prices.columns, chunk_size=20000)
+        with engine.connect() as conn:
+            stored = get_series(conn, list(prices.columns), fields=('price', 'macd', 'macd_signal', 'rsi'))
+        engine.dispose()
+    for strategy in ('macd_crossover', 'rsi_threshold'):
+        computed = backtest_block(block, strategy, cost_bps=args.cost_bps)
+        assert np.allclose(backtest_block(stored, strategy, cost_bps=args.cost_bps).to_numpy(), computed.to_numpy(),
+                           equal_nan=True), strategy
+    check_against_per_bar(block)
+    check_edge_cases()
+    loop_time = per_bar_time(block)
+
+    print(f"{args.metals} metals x {args.bars} bars, {args.cost_bps:g} bps per unit traded")
+    print(f"{'run':<42} {'backtests':>9} {'time':>9} {'backtests/min':>14}")
+    print(f"{'per-bar Python loop (one metal)':<42} {1:9d} {loop_time:8.4f}s {60 / loop_time:14,.0f}")
+
+    # MACD crossover over the 1000-combination grid, chunk by chunk: sweep -> signals -> backtest statistics
+    params = macd_grid(*GRIDS[1000])
+    price_block = prices.to_numpy()
+    sharpe = np.empty((args.metals, len(params)))
+    backtest_time = 0.0
+    start = time.perf_counter()
+    for lo, hi, macd, signal in iter_macd_sweep(prices, params, 64 * 1024 ** 2):
+        chunk_start = time.perf_counter()
+        stats = backtest(price_block, macd_crossover_signals(macd, signal), args.cost_bps)
+        sharpe[:, lo:hi] = stats['sharpe']
+        backtest_time += time.perf_counter() - chunk_start
+    total_time = time.perf_counter() - start
+    n_backtests = sharpe.size
+    print(f"{'MACD crossover: signals + backtest':<42} {n_backtests:9d} {backtest_time:8.3f}s {n_backtests / backtest_time * 60:14,.0f}")
+    print(f"{'MACD crossover: with the indicator sweep':<42} {n_backtests:9d} {total_time:8.3f}s {n_backtests / total_time * 60:14,.0f}")
+    best = np.unravel_index(np.nanargmax(sharpe), sharpe.shape)
+    print(f"  best: {prices.columns[best[0]]} (fast, slow, signal) = {tuple(params[best[1]].tolist())}, sharpe {sharpe[best]:.2f}")
+
+    # RSI thresholds: 100 windows x 10 (lower, upper) bands
+    start = time.perf_counter()
+    rsi = sweep_rsi(prices, range(2, 102))['rsi']
+    n_backtests = 0
+    for lower in range(10, 50, 4):
+        stats = backtest(price_block, rsi_threshold_signals(rsi, lower, 100 - lower), args.cost_bps)
+        n_backtests += stats['sharpe'].size
+    total_time = time.perf_counter() - start
+    print(f"{'RSI thresholds: sweep + signals + backtest':<42} {n_backtests:9d} {total_time:8.3f}s {n_backtests / total_time * 60:14,.0f}")
@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from bulk_insert import bulk_insert, async_bulk_insert, ensure_metals
+from indicators import calculate_indicator_block, to_wide_frame
+from market_data import MARKET_DATA_CSV, load_market_data
+from models import Base, MetalPrice
+
+# Function to build the wide indicator frame for all six MarketData.csv columns
+def build_indicator_frame(csv_file: str = MARKET_DATA_CSV):
+    df = load_market_data(csv_file)
+    metals = df.columns[1:]
+    return to_wide_frame(df['Dates'], calculate_indicator_block(df[metals])), metals
+
+# Current path: one ORM object per (date, metal) cell, as in Question3.populate_sql_table
+def orm_insert(engine, df, metals):
+    Session = sessionmaker(bind=engine)
+    session = Session()
+    metal_ids = ensure_metals(session.connection(), metals)
+    for index, row in df.iterrows():
+        date = row['Dates']
+        for metal in metals:
+            session.add(MetalPrice(date=date, metal_id=metal_ids[metal], price=row[metal],
+                                   macd=row[f'{metal}_macd'], macd_signal=row[f'{metal}_macd_signal'],
+                                   rsi=row[f'{metal}_rsi']))
+    session.commit()
+    session.close()
+    return len(df) * len(metals)
+
+# Function to time one insert path against a fresh SQLite file
+def time_sync(label, insert_func, df, metals, **kwargs):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        Base.metadata.create_all(engine)
+        start = time.perf_counter()
+        rows = insert_func(engine, df, metals, **kwargs)
+        elapsed = time.perf_counter() - start
+        engine.dispose()
+    print(f"{label:<32} {rows:>8} rows  {elapsed:8.3f} s  {rows / elapsed:>12,.0f} rows/s")
+
+async def _time_async(label, df, metals, chunk_size):
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp_dir, 'bench.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        start = time.perf_counter()
+        rows = await async_bulk_insert(engine, df, metals, chunk_size=chunk_size)
+        elapsed = time.perf_counter() - start
+        await engine.dispose()
+    print(f"{label:<32} {rows:>8} rows  {elapsed:8.3f} s  {rows / elapsed:>12,.0f} rows/s")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark ORM vs bulk inserts of the indicator table')
+    parser.add_argument('--repeat', type=int, default=1, help='Concatenate the history N times to enlarge the input')
+    parser.add_argument('--chunk-sizes', type=int, nargs='+', default=[1000, 5000, 20000])
+    args = parser.parse_args()
+
+    df, metals = build_indicator_frame()
+    df = pd.concat([df] * args.repeat, ignore_index=True)
+
+    time_sync('ORM session.add (current)', orm_insert, df, metals)
+    for chunk_size in args.chunk_sizes:
+        time_sync(f'Core bulk sync chunk={chunk_size}', bulk_insert, df, metals, chunk_size=chunk_size)
+        asyncio.run(_time_async(f'Core bulk async chunk={chunk_size}', df, metals, chunk_size))
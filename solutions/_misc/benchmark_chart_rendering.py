@@ -0,0 +1,119 @@
+import argparse
+import os
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+from array_store import PriceStore
+from benchmark_indicator_block import synthetic_prices
+from chart_rendering import downsample, lttb_indices, minmax_indices, render_reports
+from price_archive import append_archive, write_archive
+
+# Current path: plot_macd_rsi_price's figure built from scratch per metal, saved instead of shown
+def plot_per_metal(df: pd.DataFrame, metals, out_dir: str) -> None:
+    for metal in metals:
+        fig, (ax1, ax2, ax3) = plt.subplots(3, 1, figsize=(10, 10), gridspec_kw={'height_ratios': [7, 2, 2]})
+        ax1.plot(df['Dates'], df[metal], label='Price')
+        ax1.set_title(f'{metal} Analysis')
+        ax1.set_ylabel('Price')
+        ax1.legend()
+        ax1.grid(True)
+        ax2.plot(df['Dates'], df[f'{metal}_macd'], label='MACD')
+        ax2.plot(df['Dates'], df[f'{metal}_macd_signal'], label='MACD Signal')
+        ax2.set_ylabel('MACD')
+        ax2.legend()
+        ax2.grid(True)
+        ax3.plot(df['Dates'], df[f'{metal}_rsi'], label='RSI', color='orange')
+        ax3.set_ylabel('RSI')
+        ax3.legend()
+        ax3.grid(True)
+        plt.xlabel('Date')
+        plt.tight_layout()
+        plt.savefig(os.path.join(out_dir, f'{metal}_analysis.png'))
+        plt.close(fig)
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+def synthetic_store(n_metals: int, n_dates: int) -> PriceStore:
+    dates = pd.bdate_range('2000-01-03', periods=n_dates)
+    raw = pd.concat([pd.Series(dates, name='Dates'), synthetic_prices(n_metals, n_dates)], axis=1)
+    return PriceStore.from_frame(raw).with_indicators()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Batched chart rendering vs a pyplot figure per metal')
+    parser.add_argument('--metals', type=int, default=48)
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    # Downsamplers: min/max keeps every bucket's extremes, LTTB the requested number of points
+    walk = np.random.default_rng(0).normal(size=100_000).cumsum()
+    x = np.arange(len(walk), dtype=np.float64)
+    picked = minmax_indices(walk, 2000)
+    assert len(picked) <= 2000 and walk[picked].max() == walk.max() and walk[picked].min() == walk.min()
+    picked = lttb_indices(x, walk, 2000)
+    assert len(picked) == 2000 and (np.diff(picked) > 0).all() and picked[0] == 0 and picked[-1] == len(walk) - 1
+
+    store = synthetic_store(args.metals, args.years * 261)
+    # calculate_macd_rsi's wide layout, which the store reads as is
+    columns = ['Dates'] + [f'{metal}{suffix}' for metal in store.metals for suffix in ('', '_macd', '_macd_signal', '_rsi')]
+    wide = pd.DataFrame({column: store[column] for column in columns})
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        print(f"{args.metals} metals x {len(store)} days, {args.workers} worker(s)")
+        print(f"{'run':<44} {'charts':>7} {'time':>9} {'per chart':>10}")
+        def report(label: str, n_charts: int, seconds: float) -> None:
+            per_chart = f'{seconds / n_charts * 1e3:8.1f}ms' if n_charts else f"{'-':>10}"
+            print(f"{label:<44} {n_charts:7d} {seconds:8.2f}s {per_chart}")
+
+        baseline_dir = os.path.join(tmp_dir, 'pyplot')
+        os.makedirs(baseline_dir)
+        _, seconds = timed(lambda: plot_per_metal(wide, store.metals, baseline_dir))
+        report('pyplot figure per metal (plot_macd_rsi_price)', args.metals, seconds)
+
+        for method in (None, 'minmax', 'lttb'):
+            out_dir = os.path.join(tmp_dir, f'template_{method}')
+            result, seconds = timed(lambda: render_reports(store, out_dir, max_workers=1, downsample_method=method))
+            assert (result['status'] == 'rendered').all()
+            report(f'template, serial, downsample={method}', args.metals, seconds)
+
+        # Workers map an archive themselves: only metal names are sent
+        archive_path = os.path.join(tmp_dir, 'archive')
+        write_archive(archive_path, store.slice(end=store.dates[-2]))
+        charts_dir = os.path.join(tmp_dir, 'charts')
+        result, seconds = timed(lambda: render_reports(archive_path, charts_dir, max_workers=args.workers))
+        report(f'template, {args.workers} worker(s), archive source', len(result), seconds)
+
+        # Nothing changed: every chart is skipped on its hash
+        result, seconds = timed(lambda: render_reports(archive_path, charts_dir, max_workers=args.workers))
+        assert (result['status'] == 'skipped').all()
+        report('unchanged data (all skipped)', 0, seconds)
+
+        # A new day appended: every chart's data changed, so all are redrawn; then a subset is requested
+        append_archive(archive_path, store)
+        result, seconds = timed(lambda: render_reports(archive_path, charts_dir, metals=store.metals[:4],
+                                                        max_workers=args.workers))
+        assert (result['status'] == 'rendered').all()
+        report('one day appended, 4 metals requested', len(result), seconds)
+        result = render_reports(archive_path, charts_dir, metals=store.metals[:4], max_workers=args.workers)
+        assert (result['status'] == 'skipped').all()
+
+        # Long series: 100k bars per line, where downsampling decides the drawing cost
+        long_store = synthetic_store(4, 100_000)
+        for method in (None, 'minmax', 'lttb'):
+            out_dir = os.path.join(tmp_dir, f'long_{method}')
+            _, seconds = timed(lambda: render_reports(long_store, out_dir, max_workers=1, downsample_method=method))
+            report(f'100k bars, serial, downsample={method}', 4, seconds)
+
+        view = long_store.metal(long_store.metals[0])
+        dates = np.asarray(long_store.dates, dtype='datetime64[D]').astype(np.float64)
+        _, seconds = timed(lambda: downsample(dates, view.price, 'lttb'))
+        print(f"{'lttb on one 100k-bar line':<44} {'':>7} {seconds * 1e3:8.2f}ms")
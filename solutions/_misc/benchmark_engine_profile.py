@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from benchmark_bulk_insert import build_indicator_frame
+from bulk_insert import bulk_insert, melt_indicator_frame, iter_param_chunks, upsert_statement
+from engine_factory import create_sqlite_engines
+from explain_query_plans import QUERIES
+from migrate_schema import upgrade_schema
+
+# Function to build a populated database in the default rollback-journal mode
+def build_database(db_file: str):
+    engine = create_engine(f'sqlite:///{db_file}')
+    with engine.begin() as conn:
+        upgrade_schema(conn)
+    df, metals = build_indicator_frame()
+    bulk_insert(engine, df, metals)
+    with engine.connect() as conn:
+        metal_ids = dict(conn.exec_driver_sql('SELECT name, id FROM metals').all())
+    engine.dispose()
+    return melt_indicator_frame(df, metals, metal_ids)
+
+# Writer: rewrite the whole table in batch_size-row transactions until told to stop
+async def write_loop(engine, batches, stop: asyncio.Event) -> int:
+    statement = upsert_statement()
+    commits = 0
+    while not stop.is_set():
+        for params in batches:
+            async with engine.begin() as conn:
+                await conn.execute(statement, params)
+            commits += 1
+            if stop.is_set():
+                break
+    return commits
+
+async def timed_read(engine, statement, latencies: list, errors: list) -> None:
+    start = time.perf_counter()
+    try:
+        async with engine.connect() as conn:
+            (await conn.execute(statement)).fetchall()
+    except OperationalError as exc:
+        errors.append(str(exc.orig))
+        return
+    latencies.append(time.perf_counter() - start)
+
+# Readers: the five concurrent_reads queries, `rounds` times, each round gathered as in Question 4
+async def read_rounds(engine, rounds: int):
+    latencies, errors = [], []
+    for _ in range(rounds):
+        await asyncio.gather(*(timed_read(engine, statement, latencies, errors) for _, statement, _ in QUERIES))
+    return np.array(latencies), errors
+
+async def scenario(reader, writer, batches, rounds: int, with_writer: bool):
+    stop = asyncio.Event()
+    writer_task = asyncio.create_task(write_loop(writer, batches, stop)) if with_writer else None
+    await asyncio.sleep(0.05 if with_writer else 0)
+    start = time.perf_counter()
+    latencies, errors = await read_rounds(reader, rounds)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    commits = await writer_task if writer_task else 0
+    return latencies, errors, commits, elapsed
+
+def report(label: str, latencies, errors, commits: int, elapsed: float) -> None:
+    p50, p95, p99 = (np.percentile(latencies, q) * 1e3 for q in (50, 95, 99)) if len(latencies) else (np.nan,) * 3
+    print(f"{label:<34} {len(latencies):5d} reads  p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  p99 {p99:7.1f} ms  "
+          f"errors {len(errors):3d}  writer commits {commits:4d}  ({elapsed:.1f} s)")
+
+async def main(rounds: int, batch_size: int, read_pool_size: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        default_db = os.path.join(tmp_dir, 'default.db')
+        long_df = build_database(default_db)
+        profiled_db = os.path.join(tmp_dir, 'profiled.db')
+        shutil.copy(default_db, profiled_db)
+        batches = list(iter_param_chunks(long_df, batch_size))
+
+        # Before: one engine with default journaling and pooling, shared by readers and the writer
+        engine = create_async_engine(f'sqlite+aiosqlite:///{default_db}')
+        for with_writer in (False, True):
+            label = f"default engine, {'with' if with_writer else 'no'} writer"
+            report(label, *await scenario(engine, engine, batches, rounds, with_writer))
+        await engine.dispose()
+
+        # After: WAL + pragmas, a one-connection write engine and a pooled read engine
+        engines = create_sqlite_engines(profiled_db, read_pool_size=read_pool_size)
+        for with_writer in (False, True):
+            label = f"WAL profile, {'with' if with_writer else 'no'} writer"
+            report(label, *await scenario(engines.reader, engines.writer, batches, rounds, with_writer))
+        await engines.dispose()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Read latency of the concurrent_reads queries under a concurrent writer')
+    parser.add_argument('--rounds', type=int, default=40, help='concurrent_reads rounds (5 queries each) per scenario')
+    parser.add_argument('--batch-size', type=int, default=5000, help='rows per writer transaction')
+    parser.add_argument('--read-pool-size', type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main(args.rounds, args.batch_size, args.read_pool_size))
@@ -0,0 +1,58 @@
+import time
+import timeit
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from benchmark_bulk_insert import build_indicator_frame
+from incremental import MetalIndicator, save_indicator_states, load_indicator_states
+from indicators import calculate_macd, calculate_rsi
+from models import Base
+
+# Function to recompute MACD/RSI over the full history, as calculate_macd_rsi does every run
+def full_recompute(prices):
+    macd_line, macd_signal = calculate_macd(prices)
+    rsi = calculate_rsi(prices)
+    return macd_line.iloc[-1], macd_signal.iloc[-1], rsi.iloc[-1]
+
+if __name__ == '__main__':
+    df, metals = build_indicator_frame()
+    metal = metals[0]
+    history, last_bar = df.iloc[:-1], df.iloc[-1]
+
+    # Warm the state on all bars but the last, then round-trip it through the database
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        indicators = [MetalIndicator(m) for m in metals]
+        for indicator in indicators:
+            indicator.update_many(history['Dates'].dt.date, history[indicator.metal])
+        save_indicator_states(session, indicators)
+    with Session(engine) as session:
+        states = load_indicator_states(session)
+
+    # The appended bar must match the batch pandas calculation exactly
+    for m in metals:
+        appended = states[m].update(last_bar['Dates'].date(), last_bar[m])
+        expected = (last_bar[f'{m}_macd'], last_bar[f'{m}_macd_signal'], last_bar[f'{m}_rsi'])
+        assert np.array_equal(appended, expected, equal_nan=True), (m, appended, expected)
+
+    n_bars = len(df)
+    number = 200
+    full = timeit.timeit(lambda: full_recompute(df[metal]), number=number) / number
+
+    # Feed a daily stream of new bars into one state and report the per-bar cost
+    state = states[metal]
+    new_dates = pd.date_range(last_bar['Dates'] + pd.Timedelta(days=1), periods=10000).date
+    new_prices = last_bar[metal] + np.random.default_rng(0).normal(0, 50, len(new_dates)).cumsum()
+    start = time.perf_counter()
+    for bar_date, price in zip(new_dates, new_prices):
+        state.update(bar_date, price)
+    append = (time.perf_counter() - start) / len(new_dates)
+
+    print(f"History: {n_bars} bars for {metal} ({df['Dates'].iloc[0].date()} to {df['Dates'].iloc[-1].date()})")
+    print(f"Full recompute (calculate_macd + calculate_rsi): {full * 1e6:10.1f} us")
+    print(f"Append one bar (incremental state update):       {append * 1e6:10.1f} us")
+    print(f"Speed-up: {full / append:.0f}x")
@@ -0,0 +1,84 @@
+import os
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import create_engine, func, select
+
+from benchmark_bulk_insert import build_indicator_frame
+from bulk_insert import bulk_insert
+from incremental_load import incremental_load, REVISION_BARS
+from market_data import load_market_data
+from migrate_schema import upgrade_schema
+from models import Metal, MetalPrice
+
+NEW_BARS = 5
+
+# Function to read the stored table back as {(metal, date): (price, macd, macd_signal, rsi)}
+def stored_rows(engine) -> dict:
+    with engine.connect() as conn:
+        rows = conn.execute(select(Metal.name, MetalPrice.date, MetalPrice.price, MetalPrice.macd,
+                                   MetalPrice.macd_signal, MetalPrice.rsi).join(Metal)).all()
+    return {(name, bar_date): values for name, bar_date, *values in rows}
+
+# Function to return the largest difference from the reference, relative to each row's price
+def max_rel_diff(actual: dict, expected: dict) -> float:
+    a = np.array([actual[key] for key in expected], dtype=np.float64)
+    b = np.array(list(expected.values()), dtype=np.float64)
+    assert np.array_equal(np.isnan(a), np.isnan(b)), 'NULL pattern differs from the full load'
+    return float(np.nanmax(np.abs(a - b) / np.abs(b[:, :1])))
+
+if __name__ == '__main__':
+    prices = load_market_data()
+    history = prices.iloc[:-NEW_BARS]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Reference: the whole file computed and inserted in one go
+        full_engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'full.db')}")
+        with full_engine.begin() as conn:
+            upgrade_schema(conn, covering_indexes=False)
+        df, metals = build_indicator_frame()
+        start = time.perf_counter()
+        full_rows = bulk_insert(full_engine, df, metals)
+        full_time = time.perf_counter() - start
+        expected = stored_rows(full_engine)
+
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'incremental.db')}")
+        with engine.begin() as conn:
+            upgrade_schema(conn, covering_indexes=False)
+
+        # First run on an empty database loads everything it is given
+        initial_rows = incremental_load(engine, history)
+
+        # Daily refresh: the full file again, of which only the last NEW_BARS dates are new
+        start = time.perf_counter()
+        refresh_rows = incremental_load(engine, prices)
+        refresh_time = time.perf_counter() - start
+        diff = max_rel_diff(stored_rows(engine), expected)
+
+        # Re-running the same file adds nothing and only rewrites the revision window
+        rerun_rows = incremental_load(engine, prices)
+        with engine.connect() as conn:
+            total = conn.execute(select(func.count()).select_from(MetalPrice)).scalar_one()
+
+        # A revised settlement price for the last bar replaces the stored one
+        revised = prices.copy()
+        revised.iloc[-1, 1] += 1.0
+        incremental_load(engine, revised)
+        metal, last_date = revised.columns[1], revised['Dates'].iloc[-1].date()
+        stored_price = stored_rows(engine)[(metal, last_date)][0]
+
+        full_engine.dispose()
+        engine.dispose()
+
+    n_metals = len(metals)
+    print(f"Full load:         {full_rows:8d} rows {full_time:8.3f} s")
+    print(f"Initial load:      {initial_rows:8d} rows")
+    print(f"Daily refresh:     {refresh_rows:8d} rows {refresh_time:8.3f} s  ({full_time / refresh_time:.0f}x faster)")
+    print(f"Re-run same file:  {rerun_rows:8d} rows, table size {total} (full load {full_rows})")
+    print(f"Max |refresh - full load| / price over all stored values: {diff:.3e}")
+
+    assert refresh_rows == n_metals * (NEW_BARS + REVISION_BARS)
+    assert rerun_rows == n_metals * REVISION_BARS and total == full_rows
+    assert stored_price == revised.iloc[-1, 1], (stored_price, revised.iloc[-1, 1])
+    assert diff < 1e-7, diff
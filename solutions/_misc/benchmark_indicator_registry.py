@@ -0,0 +1,88 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmark_indicator_block import synthetic_prices
+from indicator_registry import IndicatorEvaluator, MACD_PRESETS, calculate_indicators
+from indicators import calculate_indicator_block, calculate_macd, calculate_rsi
+
+# Every MACD preset plus the other indicators: the outputs a dashboard would request together
+FULL_SET = ([f'macd_{preset}{suffix}' for preset in MACD_PRESETS for suffix in ('', '_signal', '_hist')]
+            + ['rsi', 'bollinger_mid', 'bollinger_upper', 'bollinger_lower', 'atr', 'stoch_k', 'stoch_d'])
+
+# Previous style: each output computed on its own from the prices, intermediates recomputed per output
+def independent(prices: pd.DataFrame, names) -> pd.DataFrame:
+    return pd.concat({name: IndicatorEvaluator(prices).get(name) for name in names}, axis=1)
+
+# Function to check the registry's outputs against the per-Series formulas for one metal
+def check_against_formulas(prices: pd.DataFrame) -> None:
+    block = calculate_indicators(prices, FULL_SET)
+    close = prices.iloc[:, 0]
+    metal = prices.columns[0]
+    for preset, (fast, slow, signal) in MACD_PRESETS.items():
+        macd_line, signal_line = calculate_macd(close, slow, fast, signal)
+        assert np.allclose(block[f'macd_{preset}'][metal], macd_line, equal_nan=True), preset
+        assert np.allclose(block[f'macd_{preset}_signal'][metal], signal_line, equal_nan=True), preset
+    assert np.allclose(block['rsi'][metal], calculate_rsi(close), equal_nan=True)
+
+    mid = close.rolling(20).mean()
+    std = close.rolling(20).apply(lambda window: np.std(window), raw=True)
+    assert np.allclose(block['bollinger_upper'][metal], mid + 2 * std, equal_nan=True)
+    assert np.allclose(block['bollinger_lower'][metal], mid - 2 * std, equal_nan=True)
+
+    # Close-only ATR: Wilder's running average of |close change|, seeded with the first bar's zero range
+    true_range = close.diff().abs().fillna(0).to_numpy()
+    atr = np.full(len(close), np.nan)
+    average = true_range[0]
+    for index in range(1, len(close)):
+        average += (true_range[index] - average) / 14
+        if index >= 13:
+            atr[index] = average
+    assert np.allclose(block['atr'][metal], atr, equal_nan=True)
+
+    lowest, highest = close.rolling(14).min(), close.rolling(14).max()
+    stoch_k = 100 * (close - lowest) / (highest - lowest)
+    assert np.allclose(block['stoch_k'][metal], stoch_k, equal_nan=True)
+    assert np.allclose(block['stoch_d'][metal], stoch_k.rolling(3).mean(), equal_nan=True)
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Lazy, shared indicator evaluation vs hardwired and per-output paths')
+    parser.add_argument('--metals', type=int, default=200)
+    parser.add_argument('--bars', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    prices = synthetic_prices(args.metals, args.bars)
+    check_against_formulas(prices.iloc[:, :3])
+    # The hardwired block is now a registry request and returns exactly what it did
+    assert calculate_indicator_block(prices).equals(calculate_indicators(prices))
+    assert calculate_indicators(prices, FULL_SET).equals(independent(prices, FULL_SET))
+
+    evaluator = IndicatorEvaluator(prices)
+    evaluator.evaluate(FULL_SET)
+    n_shared = len(evaluator.computed)
+    n_independent = 0
+    for name in FULL_SET:
+        single = IndicatorEvaluator(prices)
+        single.get(name)
+        n_independent += len(single.computed)
+
+    runs = [('hardwired MACD+RSI block', lambda: calculate_indicator_block(prices)),
+            ('registry: rsi only', lambda: calculate_indicators(prices, ['rsi'])),
+            ('registry: macd + macd_signal', lambda: calculate_indicators(prices, ['macd', 'macd_signal'])),
+            (f'per-output: {len(FULL_SET)} outputs', lambda: independent(prices, FULL_SET)),
+            (f'registry: {len(FULL_SET)} outputs', lambda: calculate_indicators(prices, FULL_SET))]
+    print(f"{args.metals} metals x {args.bars} bars; full set computes {n_shared} nodes shared vs {n_independent} independently")
+    print(f"{'request':<32} {'time':>9}")
+    for label, run in runs:
+        print(f"{label:<32} {best_of(run, args.repeat):8.3f}s")
@@ -0,0 +1,228 @@
+import argparse
+import asyncio
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+from urllib.parse import urlencode
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from array_store import PriceStore
+from benchmark_indicator_block import synthetic_prices
+from bulk_insert import FIELDS, bulk_insert_store, upsert_statement
+from indicator_service import HAVE_ARROW, IndicatorService
+from migrate_schema import upgrade_schema
+from series_reader import get_series, lookup_metal_ids
+
+# Define Client class: one keep-alive HTTP/1.1 connection, reading Content-Length and chunked bodies
+class Client:
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.reader = self.writer = None
+
+    async def __aenter__(self) -> 'Client':
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.writer.close()
+
+    async def get(self, target: str, accept: str = '*/*'):
+        self.writer.write(f'GET {target} HTTP/1.1\r\nHost: {self.host}\r\nAccept: {accept}\r\n\r\n'.encode('latin-1'))
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if 'content-length' in headers:
+            return status, headers, await self.reader.readexactly(int(headers['content-length']))
+        pieces = []
+        while True:
+            size = int((await self.reader.readline()).strip(), 16)
+            if size == 0:
+                await self.reader.readline()
+                break
+            pieces.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+        return status, headers, b''.join(pieces)
+
+    async def json(self, target: str):
+        status, headers, body = await self.get(target)
+        assert status == 200, (target, status, body[:200])
+        if headers['content-type'] == 'application/x-ndjson':
+            return [json.loads(line) for line in body.splitlines()]
+        return json.loads(body)
+
+def url(path: str, **params) -> str:
+    return f'{path}?{urlencode(params)}' if params else path
+
+def build_database(db_file: str, n_metals: int, n_dates: int) -> PriceStore:
+    dates = pd.bdate_range('2000-01-03', periods=n_dates)
+    raw = pd.concat([pd.Series(dates, name='Dates'), synthetic_prices(n_metals, n_dates)], axis=1)
+    store = PriceStore.from_frame(raw).with_indicators()
+    engine = create_engine(f'sqlite:///{db_file}')
+    with engine.begin() as conn:
+        upgrade_schema(conn)
+    bulk_insert_store(engine, store)
+    engine.dispose()
+    return store
+
+# Function to send n_requests requests over `concurrency` keep-alive connections, each taking the next
+# target in turn. Returns the latency of every request, the wall time and the bytes received.
+async def load(host: str, port: int, targets, n_requests: int, concurrency: int):
+    latencies, received = np.empty(n_requests), [0]
+    queue = iter(range(n_requests))
+
+    async def worker():
+        async with Client(host, port) as client:
+            for index in queue:
+                start = time.perf_counter()
+                status, _, body = await client.get(targets[index % len(targets)])
+                latencies[index] = time.perf_counter() - start
+                assert status == 200, (targets[index % len(targets)], status, body[:200])
+                received[0] += len(body)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, time.perf_counter() - start, received[0]
+
+# Function to run the service as its own process, as the desk tools would see it, and return it with its address
+def start_server(db_file: str, *options: str):
+    process = subprocess.Popen([sys.executable, 'indicator_service.py', '--db', db_file, '--port', '0', *options],
+                               cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.PIPE, text=True)
+    banner = process.stdout.readline()
+    host, port = banner.split('http://')[1].split()[0].rsplit(':', 1)
+    return process, host, int(port)
+
+# A database the service cannot read, legacy (metal name per row) or without tables, stops it at start with a message
+def check_unmigrated(tmp_dir: str) -> None:
+    legacy_file = os.path.join(tmp_dir, 'legacy.db')
+    engine = create_engine(f'sqlite:///{legacy_file}')
+    with engine.begin() as conn:
+        conn.exec_driver_sql('CREATE TABLE metal_prices (id INTEGER PRIMARY KEY, date DATE, metal VARCHAR, price FLOAT)')
+    engine.dispose()
+    for db_file in (legacy_file, os.path.join(tmp_dir, 'empty.db')):
+        result = subprocess.run([sys.executable, 'indicator_service.py', '--db', db_file, '--port', '0'],
+                                cwd=os.path.dirname(os.path.abspath(__file__)), capture_output=True, text=True, timeout=60)
+        assert result.returncode == 1 and 'run migrate_schema.py' in result.stderr, (db_file, result)
+
+def stop_server(process) -> None:
+    process.send_signal(signal.SIGTERM)
+    process.wait(timeout=30)
+
+# Checks run on an in-process service: responses against get_series, error statuses, cache invalidation
+async def check(db_file: str, store: PriceStore) -> None:
+    service = IndicatorService(db_file, read_pool_size=2, stream_rows=1000)
+    await service.start(port=0)
+    host, port = service.address
+    metals = list(store.metals[:3])
+    days = [day.date() for day in pd.DatetimeIndex(store.dates)]
+    # A window inside the history, whatever its length
+    start, end = days[len(days) // 50], days[len(days) // 2]
+    engine = create_engine(f'sqlite:///{db_file}')
+    with engine.connect() as conn:
+        expected = get_series(conn, metals, start, end, FIELDS)
+        metal_id = lookup_metal_ids(conn, metals[:1])[metals[0]]
+    async with Client(host, port) as client:
+        rows = await client.json(url('/series', metal=','.join(metals), start=str(start),
+                                     end=str(end)))
+        # Streamed in 1000-row chunks, metal by metal, in date order
+        assert [row['metal'] for row in rows] == [metal for metal in metals for _ in range(len(expected))]
+        for metal in metals:
+            frame = pd.DataFrame([row for row in rows if row['metal'] == metal]).set_index('date')
+            assert list(frame.index) == [str(day.date()) for day in expected.index]
+            for field in FIELDS:
+                assert np.allclose(frame[field].to_numpy(dtype=np.float64), expected[(field, metal)].to_numpy(),
+                                   rtol=0, atol=0, equal_nan=True), (metal, field)
+        assert await client.json(url('/series', metal=','.join(metals), start=str(start),
+                                     end=str(end), format='json')) == rows
+
+        # /latest: each metal's last bar, the requested fields only
+        latest = await client.json(url('/latest', metal=metals[0], fields='price,rsi'))
+        full = await client.json(url('/series', metal=metals[0], start=str(days[-1])))
+        assert latest == [{key: full[-1][key] for key in ('metal', 'date', 'price', 'rsi')}], latest
+        assert [row['metal'] for row in await client.json('/latest')] == list(store.metals)
+
+        for target, status in ((url('/series', metal='NOPE'), 404), (url('/series', fields='volume'), 400),
+                               (url('/series', start='yesterday'), 400), ('/nothing', 404),
+                               (url('/series', format='csv'), 400)):
+            got, _, body = await client.get(target)
+            assert got == status, (target, got, body)
+        got, headers, body = await client.get(url('/series', metal=metals[0]), accept='application/vnd.apache.arrow.stream')
+        if HAVE_ARROW:
+            import pyarrow.ipc
+            table = pyarrow.ipc.open_stream(body).read_all()
+            assert got == 200 and table.num_rows == len(store) and table.column_names == ['metal', 'date'] + FIELDS
+        else:
+            assert got == 406, got
+
+        # A write through the service's writer engine invalidates the cached bar at once
+        assert (await client.json(url('/latest', metal=metals[0])))[0]['price'] == latest[0]['price']
+        revised = {'metal_id': metal_id, 'date': days[-1], 'price': 123.0, 'macd': None, 'macd_signal': None, 'rsi': None}
+        async with service.engines.writer.begin() as conn:
+            await conn.execute(upsert_statement(), [revised])
+        assert (await client.json(url('/latest', metal=metals[0])))[0]['price'] == 123.0
+        stats = await client.json('/stats')
+        assert stats['latest_cache']['invalidations'] >= 1 and stats['errors'] == 6, stats
+    engine.dispose()
+    await service.close()
+
+def report(label: str, latencies: np.ndarray, seconds: float, received: int) -> None:
+    print(f"{label:<42} {len(latencies):6d} {len(latencies) / seconds:9.0f} {np.percentile(latencies, 50) * 1e3:8.2f}ms "
+          f"{np.percentile(latencies, 99) * 1e3:8.2f}ms {received / seconds / 1e6:8.1f}")
+
+async def main(n_metals: int, years: int, n_requests: int, concurrency: int, pool_size: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, 'service.db')
+        store = build_database(db_file, n_metals, years * 261)
+        await check(db_file, store)
+        check_unmigrated(tmp_dir)
+
+        rng = np.random.default_rng(0)
+        metals = list(store.metals)
+        recent = str(store.dates[-63])
+        scenarios = [
+            ('latest, all metals', ['/latest'], n_requests),
+            ('latest, one metal', [url('/latest', metal=metal) for metal in rng.choice(metals, 50)], n_requests),
+            ('series, one metal, 3 months, json',
+             [url('/series', metal=metal, start=recent, format='json') for metal in rng.choice(metals, 50)], n_requests),
+            (f'series, one metal, {years} years, ndjson',
+             [url('/series', metal=metal) for metal in rng.choice(metals, 50)], max(20, n_requests // 20)),
+            (f'series, {n_metals} metals, {years} years, ndjson', ['/series'], max(4, n_requests // 500)),
+        ]
+        print(f"{n_metals} metals x {len(store)} days ({n_metals * len(store):,} rows), {concurrency} keep-alive "
+              f"connections, pool {pool_size}")
+        print(f"{'endpoint':<42} {'reqs':>6} {'req/s':>9} {'p50':>10} {'p99':>10} {'MB/s':>8}")
+        for label, options in (('latest cache on', []), ('latest cache off', ['--latest-ttl', '0'])):
+            process, host, port = start_server(db_file, '--pool-size', str(pool_size), *options)
+            try:
+                for scenario, targets, count in scenarios:
+                    if options and not scenario.startswith('latest'):
+                        continue
+                    latencies, seconds, received = await load(host, port, targets, count, concurrency)
+                    report(f'{scenario} ({label})' if scenario.startswith('latest') else scenario,
+                           latencies, seconds, received)
+            finally:
+                stop_server(process)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test of the indicator HTTP service on a local SQLite database')
+    parser.add_argument('--metals', type=int, default=20)
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=2000, help='requests per small-response scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='keep-alive client connections')
+    parser.add_argument('--pool-size', type=int, default=5)
+    args = parser.parse_args()
+    if args.years < 1:
+        parser.error(f"--years must be at least 1, got {args.years}")
+    asyncio.run(main(args.metals, args.years, args.requests, args.concurrency, args.pool_size))
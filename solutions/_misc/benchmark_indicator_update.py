@@ -0,0 +1,94 @@
+import argparse
+import asyncio
+import os
+import sqlite3
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from aiosqlite_writer import AiosqliteBulkWriter
+from benchmark_aiosqlite_writer import MetalPrice, create_table, read_prices
+from benchmark_streaming import write_synthetic_csv
+from indicator_update import recompute_indicators
+from indicators import calculate_macd, calculate_rsi
+
+async def load(db_file: str, csv_file: str, n_dates: int) -> int:
+    df = read_prices(csv_file).iloc[:n_dates]
+    metals = list(df.columns[1:])
+    dates = np.repeat([date.isoformat() for date in df['Dates']], len(metals)).tolist()
+    prices = df[metals].to_numpy(dtype=np.float64).ravel().tolist()
+    async with AiosqliteBulkWriter(db_file, 'metal_prices', ['date', 'metal', 'price']) as writer:
+        return await writer.write(zip(dates, metals * len(df), prices))
+
+# Previous path: Question5_v4.calculate_macd_rsi's algorithm, made to run. For every row it rescans all rows for
+# that metal's prices and recomputes the indicators, then updates the row with its own values (the original
+# wrote whole Series into the scalar columns of every row of the metal, which SQLite rejects).
+async def per_row(engine) -> int:
+    async with async_sessionmaker(bind=engine, expire_on_commit=False)() as session:
+        metal_prices = (await session.execute(select(MetalPrice).order_by(MetalPrice.id))).scalars().all()
+        for metal_price in metal_prices:
+            same_metal = [row for row in metal_prices if row.metal == metal_price.metal]
+            prices = pd.Series([row.price for row in same_metal])
+            position = next(index for index, row in enumerate(same_metal) if row is metal_price)
+            macd_line, macd_signal = calculate_macd(prices)
+            rsi = calculate_rsi(prices)
+            values = [None if np.isnan(value) else float(value)
+                      for value in (macd_line[position], macd_signal[position], rsi[position])]
+            await session.execute(update(MetalPrice).where(MetalPrice.id == metal_price.id)
+                                  .values(macd=values[0], macd_signal=values[1], rsi=values[2]))
+        await session.commit()
+    return len(metal_prices)
+
+# New path: Question5_v4.calculate_macd_rsi
+async def set_based(engine) -> int:
+    async with engine.begin() as conn:
+        return await conn.run_sync(recompute_indicators, MetalPrice.__table__)
+
+def stored(db_file: str) -> np.ndarray:
+    with sqlite3.connect(db_file) as conn:
+        rows = conn.execute('SELECT macd, macd_signal, rsi FROM metal_prices ORDER BY id').fetchall()
+    return np.array(rows, dtype=np.float64)
+
+async def timed(path, db_file: str) -> float:
+    engine = create_async_engine(f'sqlite+aiosqlite:///{db_file}')
+    start = time.perf_counter()
+    await path(engine)
+    elapsed = time.perf_counter() - start
+    await engine.dispose()
+    return elapsed
+
+async def main(sizes, per_row_limit: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_file = os.path.join(tmp_dir, 'prices.csv')
+        write_synthetic_csv(csv_file, max(sizes))
+        print(f"{'rows':>9} {'per-row rescan':>15} {'set-based':>10} {'speed-up':>9}")
+        for n_dates in sizes:
+            timings = {}
+            for label, path in (('per_row', per_row), ('set_based', set_based)):
+                db_file = os.path.join(tmp_dir, f'{label}_{n_dates}.db')
+                create_table(db_file)
+                rows = await load(db_file, csv_file, n_dates)
+                if label == 'per_row' and rows > per_row_limit:
+                    continue
+                timings[label] = await timed(path, db_file)
+            if 'per_row' in timings:
+                # Both paths must store the same values
+                per_row_values = stored(os.path.join(tmp_dir, f'per_row_{n_dates}.db'))
+                set_values = stored(os.path.join(tmp_dir, f'set_based_{n_dates}.db'))
+                assert np.array_equal(per_row_values, set_values, equal_nan=True), n_dates
+                print(f"{rows:9d} {timings['per_row']:14.2f}s {timings['set_based']:9.3f}s "
+                      f"{timings['per_row'] / timings['set_based']:8.0f}x")
+            else:
+                print(f"{rows:9d} {'-':>15} {timings['set_based']:9.3f}s {'-':>9}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Per-row rescan vs set-based recompute of the indicator columns')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 200, 400, 2000, 20000, 200000],
+                        help='dates per run; each date has 5 metals')
+    parser.add_argument('--per-row-limit', type=int, default=2000, help='largest row count to run the O(n^2) path on')
+    args = parser.parse_args()
+    asyncio.run(main(args.sizes, args.per_row_limit))
@@ -0,0 +1,41 @@
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from benchmark_indicator_block import synthetic_prices
+from indicators import calculate_indicator_block
+from parallel_indicators import calculate_indicator_block_parallel
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serial vs process-sharded indicator block over 1..N workers')
+    parser.add_argument('--metals', type=int, default=400)
+    parser.add_argument('--bars', type=int, default=20000, help='bars per metal (intraday history)')
+    parser.add_argument('--max-workers', type=int, default=max(os.cpu_count() or 1, 4))
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    prices = synthetic_prices(args.metals, args.bars)
+    serial = calculate_indicator_block(prices)
+    serial_time = best_of(lambda: calculate_indicator_block(prices), args.repeat)
+
+    print(f"{args.metals} metals x {args.bars} bars, {os.cpu_count()} CPUs available")
+    print(f"{'workers':>7} {'time':>9} {'speed-up':>9}")
+    print(f"{'serial':>7} {serial_time:8.2f}s {1.0:8.2f}x")
+    for workers in range(1, args.max_workers + 1):
+        # Keep the pool warm across repeats: start-up cost is paid once per process, not per call
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            parallel = calculate_indicator_block_parallel(prices, max_workers=workers, executor=executor)
+            assert parallel.equals(serial) and np.array_equal(parallel.to_numpy(), serial.to_numpy(), equal_nan=True), workers
+            elapsed = best_of(lambda: calculate_indicator_block_parallel(prices, max_workers=workers, executor=executor), args.repeat)
+        print(f"{workers:7d} {elapsed:8.2f}s {serial_time / elapsed:8.2f}x")
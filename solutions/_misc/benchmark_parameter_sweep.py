@@ -0,0 +1,116 @@
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmark_indicator_block import synthetic_prices
+from indicators import calculate_macd, calculate_rsi
+from indicator_registry import IndicatorEvaluator, calculate_indicators
+from parameter_sweep import iter_macd_sweep, macd_grid, sweep_macd, sweep_rsi
+
+# (fast, slow, signal) grids of 10, 100 and 1000 combinations
+GRIDS = {
+    10: ((8, 12), (21, 26, 30, 35, 40), (9,)),
+    100: ((5, 8, 10, 12, 15), (20, 26, 30, 35, 40), (5, 7, 9, 11)),
+    1000: (range(4, 24, 2), range(26, 46, 2), range(3, 13)),
+}
+
+# Current path: calculate_macd per metal per combination, every EMA recomputed for every call
+def per_call_macd(prices: pd.DataFrame, params: np.ndarray) -> np.ndarray:
+    macd = np.empty((*prices.shape, len(params)))
+    for index, (fast, slow, signal) in enumerate(params):
+        for column, metal in enumerate(prices.columns):
+            macd[:, column, index] = calculate_macd(prices[metal], slow, fast, signal)[0].to_numpy()
+    return macd
+
+# Block path without sharing: one registry evaluation per combination, all metals at once
+def per_combo_macd(prices: pd.DataFrame, params: np.ndarray) -> np.ndarray:
+    macd = np.empty((2, *prices.shape, len(params)))
+    for index, (fast, slow, signal) in enumerate(params):
+        block = calculate_indicators(prices, [('macd_line', fast, slow), ('macd_signal', fast, slow, signal)])
+        macd[:, :, :, index] = block.to_numpy().reshape(len(prices), 2, -1).transpose(1, 0, 2)
+    return macd
+
+def per_call_rsi(prices: pd.DataFrame, windows) -> np.ndarray:
+    rsi = np.empty((*prices.shape, len(windows)))
+    for index, window in enumerate(windows):
+        for column, metal in enumerate(prices.columns):
+            rsi[:, column, index] = calculate_rsi(prices[metal], window).to_numpy()
+    return rsi
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+# A chunk's working memory stays within max_bytes: one signal span, so the whole chunk goes through a single ewm,
+# with the shared EMAs computed beforehand (they are held for the whole sweep, outside the chunk budget)
+def check_chunk_memory(prices: pd.DataFrame, max_bytes: int) -> None:
+    params = macd_grid(*GRIDS[1000][:2], (9,))
+    evaluator = IndicatorEvaluator(prices)
+    for span in np.unique(params[:, :2]):
+        evaluator.get(('ema', int(span)))
+    tracemalloc.start()
+    try:
+        for lo, hi, macd, signal in iter_macd_sweep(prices, params, max_bytes, evaluator):
+            del macd, signal
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak <= max_bytes, (peak, max_bytes)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Vectorized MACD/RSI parameter sweeps vs one call per parameter set')
+    parser.add_argument('--metals', type=int, default=10)
+    parser.add_argument('--bars', type=int, default=2500)
+    parser.add_argument('--max-mb', type=int, default=256, help='working memory per sweep chunk')
+    parser.add_argument('--per-call-limit', type=int, default=100, help='largest grid to run the per-metal calls on')
+    args = parser.parse_args()
+    prices = synthetic_prices(args.metals, args.bars)
+    max_bytes = args.max_mb * 1024 ** 2
+
+    check_chunk_memory(prices, 32 * 1024 ** 2)
+    print(f"{args.metals} metals x {args.bars} bars, chunks of {args.max_mb} MiB")
+    print(f"{'sweep':<12} {'combos':>6} {'per-metal calls':>16} {'per-combo block':>16} {'vectorized':>11} {'output':>9}")
+    for n_combos, (fast, slow, signal) in GRIDS.items():
+        params = macd_grid(fast, slow, signal)
+        assert len(params) == n_combos, len(params)
+        result, sweep_time = timed(sweep_macd, prices, params, max_bytes)
+        combo, combo_time = timed(per_combo_macd, prices, params)
+        assert np.array_equal(result['macd'], combo[0], equal_nan=True), n_combos
+        assert np.array_equal(result['macd_signal'], combo[1], equal_nan=True), n_combos
+        per_call = '-'
+        if n_combos <= args.per_call_limit:
+            reference, call_time = timed(per_call_macd, prices, params)
+            assert np.array_equal(result['macd'], reference, equal_nan=True), n_combos
+            per_call = f'{call_time:.3f}s'
+        # Spot-check the signal lines of a few combinations against calculate_macd
+        for index in np.linspace(0, n_combos - 1, 3).astype(int):
+            fast_period, slow_period, signal_period = params[index]
+            expected = calculate_macd(prices.iloc[:, 0], slow_period, fast_period, signal_period)[1]
+            assert np.array_equal(result['macd_signal'][:, 0, index], expected.to_numpy(), equal_nan=True)
+        megabytes = (result['macd'].nbytes + result['macd_signal'].nbytes) / 1024 ** 2
+        print(f"{'MACD':<12} {n_combos:6d} {per_call:>16} {combo_time:15.3f}s {sweep_time:10.3f}s {megabytes:7.0f}MB")
+        del result, combo
+
+    for n_windows in GRIDS:
+        windows = list(range(2, n_windows + 2))
+        result, sweep_time = timed(sweep_rsi, prices, windows)
+        per_call = '-'
+        if n_windows <= args.per_call_limit:
+            reference, call_time = timed(per_call_rsi, prices, windows)
+            assert np.allclose(result['rsi'], reference, rtol=1e-9, atol=1e-9, equal_nan=True), n_windows
+            per_call = f'{call_time:.3f}s'
+        print(f"{'RSI':<12} {n_windows:6d} {per_call:>16} {'-':>16} {sweep_time:10.3f}s {result['rsi'].nbytes / 1024 ** 2:7.0f}MB")
+
+    # Streaming reduction: the 1000-combo sweep scored chunk by chunk in 32 MiB, never holding the full arrays
+    params = macd_grid(*GRIDS[1000])
+    start = time.perf_counter()
+    crossings = np.empty(len(params), dtype=np.int64)
+    for lo, hi, macd, signal in iter_macd_sweep(prices, params, 32 * 1024 ** 2):
+        above = macd > signal
+        crossings[lo:hi] = (above[1:] != above[:-1]).sum(axis=(0, 1))
+    print(f"{'MACD scored':<12} {len(params):6d} {'-':>16} {'-':>16} {time.perf_counter() - start:10.3f}s "
+          f"{'32MB':>9} (signal crossings per combo: {crossings.min()}..{crossings.max()})")
@@ -0,0 +1,131 @@
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from array_store import PriceStore
+from benchmark_indicator_block import synthetic_prices
+from bulk_insert import bulk_insert_store
+from market_data import MARKET_DATA_CSV, parse_market_data
+from migrate_schema import upgrade_schema
+from price_archive import PriceArchive, append_archive, write_archive
+from series_reader import get_series
+
+FIELDS = ('price', 'macd', 'macd_signal', 'rsi')
+
+def best_of(func, repeat: int = 5) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+# Function to read this process's resident and proportional set sizes (kB) from /proc
+def memory_kb() -> dict:
+    sizes = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            if key in ('Rss', 'Pss'):
+                sizes[key] = int(value.split()[0])
+    return sizes
+
+# Child process: map the archive, read every page of every field, then report memory while all readers still
+# hold their mappings (a shared page's Pss is split between the processes mapping it)
+def touch_archive(path: str, barrier, queue) -> None:
+    archive = PriceArchive(path)
+    before = memory_kb()
+    # One byte per page: faults the whole file in without allocating anything of the reader's own
+    checksum = sum(int(matrix.reshape(-1).view(np.uint8)[::4096].sum()) for matrix in archive.store.fields.values())
+    barrier.wait()
+    after = memory_kb()
+    queue.put((after['Rss'] - before['Rss'], after['Pss'] - before['Pss'], checksum))
+    barrier.wait()
+
+def check_archive(archive: PriceArchive, store: PriceStore) -> None:
+    assert archive.metals == store.metals and np.array_equal(archive.store.days, store.days)
+    for field in FIELDS:
+        assert np.array_equal(archive.store.fields[field], store.fields[field], equal_nan=True), field
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Memory-mapped price archive vs CSV parse and SQLite reads')
+    parser.add_argument('--metals', type=int, default=500, help='metals in the synthetic universe')
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--processes', type=int, default=4, help='readers sharing the synthetic archive')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # MarketData.csv history: every metal, every field
+        def from_csv() -> PriceStore:
+            return PriceStore.from_frame(parse_market_data(MARKET_DATA_CSV)).with_indicators()
+        market = from_csv()
+        market_path = os.path.join(tmp_dir, 'market')
+        write_archive(market_path, market)
+        check_archive(PriceArchive(market_path), market)
+
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'archive.db')}")
+        with engine.begin() as conn:
+            upgrade_schema(conn, covering_indexes=False)
+        bulk_insert_store(engine, market)
+        with engine.connect() as conn:
+            sql_time = best_of(lambda: get_series(conn, list(market.metals), fields=FIELDS), 3)
+        engine.dispose()
+
+        print(f"MarketData.csv: {len(market.metals)} metals x {len(market)} days, {len(FIELDS)} fields")
+        print(f"{'full history':<42} {'time':>10}")
+        print(f"{'parse CSV + compute indicators':<42} {best_of(from_csv, 3) * 1e3:8.2f}ms")
+        print(f"{'SQLite get_series':<42} {sql_time * 1e3:8.2f}ms")
+        print(f"{'PriceArchive open':<42} {best_of(lambda: PriceArchive(market_path), 20) * 1e3:8.2f}ms")
+
+        # Synthetic universe: open cost stays flat as the archive grows, slices are views into the mapping
+        dates = pd.bdate_range('2000-01-03', periods=args.years * 261)
+        raw = pd.concat([pd.Series(dates, name='Dates'), synthetic_prices(args.metals, len(dates))], axis=1)
+        store = PriceStore.from_frame(raw).with_indicators()
+        path = os.path.join(tmp_dir, 'universe')
+        split = len(dates) - 261
+        write_time = best_of(lambda: write_archive(path, store.slice(end=dates[split - 1])), 1)
+        archive = PriceArchive(path)
+
+        # Appends: the last year a day at a time, picked up by an open reader on refresh
+        start = time.perf_counter()
+        for day in dates[split:]:
+            assert append_archive(path, store.slice(day, day)) == 1
+        append_time = (time.perf_counter() - start) / (len(dates) - split)
+        assert append_archive(path, store) == 0
+        assert archive.refresh() and not archive.refresh()
+        # Opening copies nothing: the store's arrays are the mappings themselves
+        assert not any(array.flags.owndata for array in (archive.store.days, *archive.store.fields.values()))
+        check_archive(archive, store)
+
+        window = archive.slice(dates[len(dates) // 2], dates[len(dates) // 2 + 20])
+        assert all(np.shares_memory(window.fields[field], archive.store.fields[field]) for field in FIELDS)
+        archive_bytes = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+        print(f"\nsynthetic: {args.metals} metals x {len(dates)} business days, {archive_bytes / 1024 ** 2:.1f} MiB on disk")
+        print(f"{'write archive (first ' + str(split) + ' days)':<42} {write_time * 1e3:8.2f}ms")
+        print(f"{'append one day (fsync per file)':<42} {append_time * 1e3:8.2f}ms")
+        print(f"{'PriceArchive open':<42} {best_of(lambda: PriceArchive(path), 20) * 1e3:8.2f}ms")
+        print(f"{'21-day slice of the open archive':<42} {best_of(lambda: archive.slice(dates[100], dates[120]), 20) * 1e3:8.3f}ms")
+
+        # Several readers: each touches every page, but the pages are the page cache's, counted once across them
+        context = multiprocessing.get_context('spawn')
+        barrier, queue = context.Barrier(args.processes), context.Queue()
+        workers = [context.Process(target=touch_archive, args=(path, barrier, queue)) for _ in range(args.processes)]
+        for worker in workers:
+            worker.start()
+        results = [queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        expected = sum(int(np.ascontiguousarray(archive.store.fields[field]).reshape(-1).view(np.uint8)[::4096].sum())
+                       for field in FIELDS)
+        assert all(checksum == expected for _, _, checksum in results)
+        print(f"{'reader':<8} {'Rss added':>12} {'Pss added':>12}   ({archive_bytes / 1024 ** 2:.1f} MiB archive, "
+              f"{args.processes} readers)")
+        for index, (rss_kb, pss_kb, _) in enumerate(results):
+            print(f"{index:<8} {rss_kb / 1024:10.1f}MB {pss_kb / 1024:10.1f}MB")
@@ -0,0 +1,122 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmark_indicator_block import synthetic_prices
+from market_data import parse_market_data
+from price_cleaning import (CALENDARS, FLAG_CLOSED, FLAG_FILLED, FLAG_MISSING, FLAG_UNFILLED, INSTRUMENT_EXCHANGES,
+                            RESAMPLE_HOWS, clean_prices, forward_fill_limit, resample_prices, trading_days)
+from rollups import period_starts
+
+def best_of(func, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+# Current path: column by column, each series reindexed, masked, filled and flagged on its own
+def per_column(prices: pd.DataFrame, days: pd.DatetimeIndex, closed: dict, limit: int):
+    values, flags = {}, {}
+    for metal in prices.columns:
+        series = prices[metal].reindex(days)
+        flag = series.isna().astype(np.uint8) * FLAG_MISSING
+        if metal in closed:
+            flag[closed[metal]] |= FLAG_CLOSED
+            series[closed[metal]] = np.nan
+        filled = series.ffill(limit=limit)
+        flag[series.isna() & filled.notna()] |= FLAG_FILLED
+        flag[filled.isna()] |= FLAG_UNFILLED
+        values[metal], flags[metal] = filled, flag
+    return pd.DataFrame(values), pd.DataFrame(flags)
+
+# Reference resampling: pandas groupby on the period start, one reduction at a time
+def groupby_resample(prices: pd.DataFrame, period: str) -> pd.DataFrame:
+    grouped = prices.groupby(pd.DatetimeIndex(period_starts(prices.index.values, period), name='period_start'))
+    reductions = {'open': grouped.first(), 'high': grouped.max(), 'low': grouped.min(), 'close': grouped.last(),
+                  'mean': grouped.mean(), 'bars': grouped.count().astype(np.float64)}
+    return pd.concat(reductions, axis=1)
+
+def with_holes(prices: pd.DataFrame, fraction: float, seed: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    values = prices.to_numpy().copy()
+    values[rng.random(values.shape) < fraction] = np.nan
+    # A few long outages, longer than any fill limit
+    for column in rng.choice(values.shape[1], size=max(1, values.shape[1] // 20), replace=False):
+        start = rng.integers(0, len(values) - 30)
+        values[start:start + 30, column] = np.nan
+    return pd.DataFrame(values, index=prices.index, columns=prices.columns)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Calendar alignment, forward-fill, gap flags and resampling')
+    parser.add_argument('--metals', type=int, default=500)
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--limit', type=int, default=5, help='most consecutive days forward-filled')
+    args = parser.parse_args()
+
+    # MarketData.csv: the export repeats the previous settlement on exchange holidays; the calendars find them
+    market = parse_market_data().set_index('Dates')
+    repeated = market.diff() == 0
+    print(f"{'exchange':<8} {'holidays':>9} {'cells repeating the previous settlement':>40}")
+    for exchange in CALENDARS:
+        holidays = CALENDARS[exchange].holidays(market.index[1], market.index[-1])
+        holidays = holidays[holidays.isin(market.index)]
+        columns = [metal for metal, name in INSTRUMENT_EXCHANGES.items() if name == exchange]
+        share = repeated.loc[holidays, columns].to_numpy().mean()
+        assert share > 0.98, (exchange, share)
+        print(f"{exchange:<8} {len(holidays):9d} {share:39.1%}")
+        # Each closure listed once, and no open day where every column carried the settlement over (a missed
+        # closure); a single column repeats a price by chance now and then, so one-column exchanges are skipped
+        listed = CALENDARS[exchange].holidays(market.index[0], market.index[-1], return_name=True)
+        assert not listed.index.duplicated().any(), listed[listed.index.duplicated(keep=False)]
+        if len(columns) > 1:
+            carried = repeated[columns].all(axis=1) & ~market.index.isin(listed.index)
+            assert not carried.iloc[1:].any(), list(market.index[1:][carried.iloc[1:]].date)
+
+    print(f"\n{'calendar':<10} {'days':>6} {'closed':>7} {'filled':>7} {'gap runs':>9}")
+    for calendar in ('LME', 'NYMEX', 'union', 'common', 'business'):
+        cleaned = clean_prices(market, calendar, limit=args.limit)
+        flags = cleaned.flags.to_numpy()
+        assert not cleaned.dense().isna().any().any()
+        print(f"{calendar:<10} {len(flags):6d} {((flags & FLAG_CLOSED) != 0).sum():7d} "
+              f"{((flags & FLAG_FILLED) != 0).sum():7d} {len(cleaned.gaps()):9d}")
+    store = clean_prices(market).to_store().with_indicators()
+    assert not np.isnan(store.fields['rsi'][14:]).any()
+
+    # Synthetic universe with scattered holes and a few 30-day outages
+    dates = pd.bdate_range('2000-01-03', periods=args.years * 261)
+    prices = with_holes(synthetic_prices(args.metals, len(dates)).set_axis(dates), 0.02)
+    exchanges = {metal: ('LME', 'NYMEX')[index % 2] for index, metal in enumerate(prices.columns)}
+    days = trading_days('LME', dates[0], dates[-1])
+    nymex_closed = days.isin(CALENDARS['NYMEX'].holidays(days[0], days[-1]))
+    closed = {metal: nymex_closed for metal, name in exchanges.items() if name == 'NYMEX'}
+
+    cleaned = clean_prices(prices, 'LME', limit=args.limit, exchanges=exchanges)
+    expected_values, expected_flags = per_column(prices, days, closed, args.limit)
+    assert np.array_equal(cleaned.prices.to_numpy(), expected_values.to_numpy(), equal_nan=True)
+    assert np.array_equal(cleaned.flags.to_numpy(), expected_flags.to_numpy())
+    filled, _ = forward_fill_limit(prices.to_numpy(), None)
+    assert np.array_equal(filled, prices.ffill().to_numpy(), equal_nan=True)
+    gaps = cleaned.gaps()
+    assert gaps['bars'].sum() == ((cleaned.flags.to_numpy() & (FLAG_MISSING | FLAG_CLOSED)) != 0).sum()
+    assert (~gaps['filled']).sum() >= args.metals // 20
+
+    loop_time = best_of(lambda: per_column(prices, days, closed, args.limit))
+    clean_time = best_of(lambda: clean_prices(prices, 'LME', limit=args.limit, exchanges=exchanges))
+    print(f"\n{args.metals} metals x {len(dates)} business days, 2% holes, limit {args.limit}: "
+          f"{len(gaps)} gap runs, {(~gaps['filled']).sum()} not fully filled")
+    print(f"{'step':<40} {'time':>10}")
+    print(f"{'align + fill + flag, per column':<40} {loop_time * 1e3:8.1f}ms")
+    print(f"{'align + fill + flag, clean_prices':<40} {clean_time * 1e3:8.1f}ms")
+
+    for period in ('W', 'M'):
+        resampled = resample_prices(cleaned.prices, period, RESAMPLE_HOWS)
+        reference = groupby_resample(cleaned.prices, period)
+        assert np.allclose(resampled.to_numpy(), reference[resampled.columns].to_numpy(), equal_nan=True), period
+        groupby_time = best_of(lambda: groupby_resample(cleaned.prices, period))
+        resample_time = best_of(lambda: resample_prices(cleaned.prices, period, RESAMPLE_HOWS))
+        print(f"{f'resample {period}, 6 reductions: groupby':<40} {groupby_time * 1e3:8.1f}ms")
+        print(f"{f'resample {period}, 6 reductions: resample_prices':<40} {resample_time * 1e3:8.1f}ms")
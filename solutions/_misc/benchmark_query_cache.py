@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from benchmark_engine_profile import build_database
+from bulk_insert import upsert_statement
+from engine_factory import create_sqlite_engines
+from models import Metal, MetalPrice
+from query_cache import QueryCache
+
+# Dashboard panels: per-metal windows ending at the latest bar, cross-metal windows and indicator screens
+WINDOWS_DAYS = [30, 90, 365, None]
+
+def build_query_mix(metals, last_date):
+    queries = []
+    for metal in metals:
+        for days in WINDOWS_DAYS:
+            statement = select(MetalPrice).join(Metal).where(Metal.name == metal)
+            if days is not None:
+                statement = statement.where(MetalPrice.date >= last_date - timedelta(days=days))
+            queries.append((f'{metal} {days or "all"}d', statement))
+    for days in (30, 90):
+        queries.append((f'all metals {days}d', select(MetalPrice).where(MetalPrice.date >= last_date - timedelta(days=days))))
+    queries.append(('rsi >= 70', select(MetalPrice).where(MetalPrice.rsi >= 70)))
+    queries.append(('rsi <= 30', select(MetalPrice).where(MetalPrice.rsi <= 30)))
+    return queries
+
+# Uncached path: Question 4's read_data, a new session and a full fetchall per call
+async def read_data(session_factory, statement):
+    async with session_factory() as session:
+        return (await session.execute(statement)).fetchall()
+
+def values(rows):
+    return [(row[0].id, row[0].price, row[0].macd, row[0].macd_signal, row[0].rsi) for row in rows]
+
+# Writer step: a revised settlement price for the latest bar of one metal, upserted on the write engine
+async def revise_latest(writer, metal_id: int, rng) -> None:
+    async with writer.begin() as conn:
+        latest = (await conn.execute(select(MetalPrice.__table__).where(MetalPrice.metal_id == metal_id)
+                                     .order_by(MetalPrice.date.desc()).limit(1))).mappings().one()
+        revised = {key: latest[key] for key in ('metal_id', 'date', 'price', 'macd', 'macd_signal', 'rsi')}
+        revised['price'] = (revised['price'] or 0.0) + float(rng.normal())
+        await conn.execute(upsert_statement(), [revised])
+
+async def replay(read, queries, order, writes_every: int, writer, metal_ids, seed: int):
+    rng = np.random.default_rng(seed)
+    latencies = []
+    for step, index in enumerate(order):
+        if writes_every and step and step % writes_every == 0:
+            await revise_latest(writer, int(rng.choice(metal_ids)), rng)
+        start = time.perf_counter()
+        await read(queries[index][1])
+        latencies.append(time.perf_counter() - start)
+    return np.array(latencies)
+
+def report(label: str, latencies) -> None:
+    print(f"{label:<10} {len(latencies):6d} queries  total {latencies.sum():7.2f} s  "
+          f"mean {latencies.mean() * 1e3:7.2f} ms  p50 {np.percentile(latencies, 50) * 1e3:7.2f} ms  "
+          f"p99 {np.percentile(latencies, 99) * 1e3:7.2f} ms")
+
+async def main(n_queries: int, writes_every: int, max_mb: float, ttl: float, seed: int) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_file = os.path.join(tmp_dir, 'cache.db')
+        build_database(db_file)
+        engines = create_sqlite_engines(db_file)
+        session_factory = async_sessionmaker(bind=engines.reader, expire_on_commit=False)
+        async with engines.reader.connect() as conn:
+            metal_ids = dict((await conn.execute(select(Metal.name, Metal.id))).all())
+            last_date = (await conn.execute(select(func.max(MetalPrice.date)))).scalar_one()
+
+        # Zipf-weighted mix: a few panels are refreshed constantly, most only now and then
+        queries = build_query_mix(sorted(metal_ids), last_date)
+        rng = np.random.default_rng(seed)
+        weights = 1.0 / np.arange(1, len(queries) + 1)
+        order = rng.choice(len(queries), size=n_queries, p=weights / weights.sum())
+        ids = list(metal_ids.values())
+
+        uncached = await replay(lambda statement: read_data(session_factory, statement),
+                                queries, order, writes_every, engines.writer, ids, seed)
+
+        cache = QueryCache(max_bytes=int(max_mb * 1024 * 1024), ttl=ttl)
+        cache.watch(engines.writer)
+        cached = await replay(lambda statement: cache.fetch(session_factory, statement),
+                              queries, order, writes_every, engines.writer, ids, seed)
+
+        # After the replay every cached answer must equal a fresh read
+        for label, statement in queries:
+            assert values(await cache.fetch(session_factory, statement)) == values(await read_data(session_factory, statement)), label
+
+        # A write to one metal invalidates that metal's panels and the cross-metal ones, nothing else
+        probe = QueryCache()
+        probe.watch(engines.writer)
+        for _, statement in queries:
+            await probe.fetch(session_factory, statement)
+        await revise_latest(engines.writer, metal_ids['COPPER'], rng)
+        dropped = probe.stats.invalidations
+        await engines.dispose()
+
+    stats = cache.stats
+    print(f"{len(queries)} distinct queries, {n_queries} replayed, a revised bar every {writes_every} queries")
+    report('uncached', uncached)
+    report('cached', cached)
+    print(f"Speed-up: {uncached.sum() / cached.sum():.1f}x")
+    print(f"hits {stats.hits}  misses {stats.misses}  hit rate {stats.hit_rate:.1%}  evictions {stats.evictions}  "
+          f"expirations {stats.expirations}  invalidations {stats.invalidations}  "
+          f"entries {stats.entries}  size {stats.bytes / 1024 / 1024:.1f} MB")
+    print(f"One COPPER write invalidated {dropped} of {len(queries)} entries")
+    assert dropped == len(WINDOWS_DAYS) + 4, dropped
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay a dashboard query mix with and without the query cache')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--writes-every', type=int, default=100, help='queries between revised-bar upserts (0: no writes)')
+    parser.add_argument('--max-mb', type=float, default=64.0, help='cache size cap in MB')
+    parser.add_argument('--ttl', type=float, default=300.0, help='seconds before an entry expires')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    asyncio.run(main(args.queries, args.writes_every, args.max_mb, args.ttl, args.seed))
@@ -0,0 +1,157 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from async_pipeline import IngestPipeline
+from incremental_load import incremental_load
+from migrate_schema import upgrade_schema
+from rollups import get_rollups, rebuild_rollups, rollup_counts
+from series_reader import get_series
+from streaming import stream_csv_to_db
+
+ALL_FIELDS = ('open', 'high', 'low', 'close', 'mean', 'volatility', 'bars')
+
+# Function to build n_metals x n_years of business-day prices as a 'Dates' + one-column-per-metal frame
+def synthetic_market_data(n_metals: int, n_years: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range('2000-01-03', periods=n_years * 261)
+    # Geometric random walk, so prices stay positive and log returns are defined
+    prices = 1000 * np.exp(rng.normal(0, 0.01, size=(len(dates), n_metals)).cumsum(axis=0))
+    df = pd.DataFrame(prices, columns=[f'METAL_{i}' for i in range(n_metals)])
+    df.insert(0, 'Dates', dates)
+    return df
+
+# Current path: Question 1's monthly averages, on the daily history read back from the database.
+# create_time_features copies the frame to add day/month/year columns; grouping on (year, month) rather
+# than month alone keeps e.g. January 2001 and January 2002 apart so the result is comparable.
+def daily_monthly_means(engine, metals) -> pd.DataFrame:
+    with engine.connect() as conn:
+        daily = get_series(conn, metals)['price']
+    df = daily.copy()
+    df['day'] = df.index.day
+    df['month'] = df.index.month
+    df['year'] = df.index.year
+    return df.groupby(['year', 'month'])[metals].mean()
+
+# New path: the monthly rollups
+def rollup_monthly_means(engine, metals) -> pd.DataFrame:
+    with engine.connect() as conn:
+        return get_rollups(conn, metals, 'M')['mean']
+
+# Function to check the stored rollups of one period against pandas resampling of the daily prices
+def check_against_resample(engine, metals, period: str, rule: str) -> None:
+    with engine.connect() as conn:
+        daily = get_series(conn, metals)['price']
+        rollups = get_rollups(conn, metals, period, fields=('open', 'high', 'low', 'close', 'mean', 'volatility', 'bars'))
+    resampled = daily.resample(rule)
+    log_returns = np.log(daily)
+    expected = {'open': resampled.first(), 'high': resampled.max(), 'low': resampled.min(), 'close': resampled.last(),
+                'mean': resampled.mean(), 'bars': resampled.count(),
+                # Returns inside each period only: the first bar's return against the previous period is dropped
+                'volatility': log_returns.groupby(pd.Grouper(freq=rule)).diff().resample(rule).std()}
+    for field, frame in expected.items():
+        assert np.allclose(rollups[field].to_numpy(), frame.to_numpy(dtype=np.float64), rtol=1e-10, equal_nan=True), (period, field)
+
+def read_rollups(engine, metals) -> dict:
+    with engine.connect() as conn:
+        return {period: get_rollups(conn, metals, period, fields=ALL_FIELDS) for period in ('W', 'M', 'Y')}
+
+# Function to check maintained rollups against a rebuild from the daily rows; returns the rebuild's row counts
+def check_against_rebuild(engine, metals, maintained: dict) -> dict:
+    with engine.begin() as conn:
+        rebuild_rollups(conn)
+        counts = rollup_counts(conn)
+    for period, frame in read_rollups(engine, metals).items():
+        assert frame.shape == maintained[period].shape, period
+        assert np.allclose(maintained[period].to_numpy(), frame.to_numpy(), rtol=1e-12, equal_nan=True), period
+    return counts
+
+async def pipeline_load(db_file: str, csv_file: str) -> int:
+    engine = create_async_engine(f'sqlite+aiosqlite:///{db_file}')
+    try:
+        return await IngestPipeline(engine, chunksize=300, batch_size=1000, max_workers=1).run(csv_file)
+    finally:
+        await engine.dispose()
+
+# Every bulk write path keeps the rollups of what it writes: loaded in chunks, the maintained rollups
+# equal a rebuild, periods split across chunks included
+def check_write_paths(tmp_dir: str, prices: pd.DataFrame, metals) -> None:
+    csv_file = os.path.join(tmp_dir, 'prices.csv')
+    prices.to_csv(csv_file, index=False)
+    loaders = {'stream_csv_to_db': lambda db_file, engine: stream_csv_to_db(csv_file, engine, chunksize=300),
+               'IngestPipeline': lambda db_file, engine: asyncio.run(pipeline_load(db_file, csv_file))}
+    for name, load in loaders.items():
+        db_file = os.path.join(tmp_dir, f'{name}.db')
+        engine = create_engine(f'sqlite:///{db_file}')
+        with engine.begin() as conn:
+            upgrade_schema(conn, covering_indexes=False)
+        load(db_file, engine)
+        check_against_rebuild(engine, metals, read_rollups(engine, metals))
+        engine.dispose()
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Monthly analytics from the daily history vs the rollup tables')
+    parser.add_argument('--metals', type=int, default=20)
+    parser.add_argument('--years', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    prices = synthetic_market_data(args.metals, args.years)
+    metals = list(prices.columns[1:])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'rollups.db')}")
+        with engine.begin() as conn:
+            upgrade_schema(conn, covering_indexes=False)
+        start = time.perf_counter()
+        incremental_load(engine, prices.iloc[:-1])
+        initial_time = time.perf_counter() - start
+
+        # Daily refresh: one new bar per metal plus the revision window, rollups of the touched periods refreshed
+        start = time.perf_counter()
+        incremental_load(engine, prices)
+        refresh_time = time.perf_counter() - start
+        # Steady state: re-running the same file, with and without the rollup maintenance
+        plain_time = best_of(lambda: incremental_load(engine, prices, rollups=False), args.repeat)
+        rerun_time = best_of(lambda: incremental_load(engine, prices), args.repeat)
+        incremental = read_rollups(engine, metals)
+
+        # Rebuilding from scratch gives the same rollups as the incremental maintenance
+        start = time.perf_counter()
+        counts = check_against_rebuild(engine, metals, incremental)
+        rebuild_time = time.perf_counter() - start
+
+        for period, rule in (('W', 'W-SUN'), ('M', 'MS'), ('Y', 'YS')):
+            check_against_resample(engine, metals, period, rule)
+
+        # Monthly means: Question 1's regroup of the daily history vs a read of the monthly rollups
+        daily_means = daily_monthly_means(engine, metals)
+        rollup_means = rollup_monthly_means(engine, metals)
+        assert np.allclose(daily_means.to_numpy(), rollup_means.to_numpy(), rtol=1e-12), 'monthly means differ'
+        daily_time = best_of(lambda: daily_monthly_means(engine, metals), args.repeat)
+        rollup_time = best_of(lambda: rollup_monthly_means(engine, metals), args.repeat)
+
+        check_write_paths(tmp_dir, prices.iloc[:3 * 261, :4], metals[:3])
+
+    print(f"{args.metals} metals x {len(prices)} business days; rollup rows: {counts}")
+    print(f"{'initial load (with rollups)':<36} {initial_time:8.3f}s")
+    print(f"{'daily refresh (one new bar)':<36} {refresh_time:8.3f}s")
+    print(f"{'re-run, rollups=False':<36} {plain_time:8.3f}s")
+    print(f"{'re-run, rollups maintained':<36} {rerun_time:8.3f}s")
+    print(f"{'full rollup rebuild (and check)':<36} {rebuild_time:8.3f}s")
+    print(f"{'monthly means from daily rows':<36} {daily_time:8.3f}s")
+    print(f"{'monthly means from rollups':<36} {rollup_time:8.3f}s  {daily_time / rollup_time:6.1f}x")
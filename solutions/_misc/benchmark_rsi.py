@@ -0,0 +1,93 @@
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmark_indicator_block import synthetic_prices
+from indicators import calculate_rsi
+from market_data import parse_market_data
+from rsi import HAVE_NUMBA, rsi, rsi_reference
+
+def best_of(func, repeat: int = 3) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+# Reference Wilder RSI in pandas: the SMA seed at row `window`, then ewm(alpha=1/window, adjust=False)
+def wilder_pandas(prices: pd.Series, window: int = 14) -> pd.Series:
+    delta = prices.diff()
+    averages = []
+    for moves in (delta.clip(lower=0), (-delta).clip(lower=0)):
+        seeded = moves.copy()
+        seeded.iloc[:window + 1] = np.nan
+        seeded.iloc[window] = moves.iloc[1:window + 1].mean()
+        averages.append(seeded.ewm(alpha=1 / window, adjust=False).mean())
+    gain, loss = averages
+    result = 100 - 100 / (1 + gain / loss)
+    return result.mask(loss == 0, np.where(gain > 0, 100.0, np.nan))
+
+def check(prices: pd.DataFrame, window: int) -> None:
+    expected = prices.apply(calculate_rsi, window=window).to_numpy()
+    for label, result in (('sma numpy', rsi(prices, window, engine='numpy').to_numpy()),
+                          ('sma kernel', rsi_reference(prices.to_numpy(), window))):
+        assert np.array_equal(np.isnan(result), np.isnan(expected)), label
+        assert np.allclose(result, expected, rtol=0, atol=1e-9, equal_nan=True), label
+    expected = prices.apply(wilder_pandas, window=window).to_numpy()
+    for label, result in (('wilder numpy', rsi(prices, window, 'wilder', engine='numpy').to_numpy()),
+                          ('wilder kernel', rsi_reference(prices.to_numpy(), window, 'wilder'))):
+        assert np.array_equal(np.isnan(result), np.isnan(expected)), label
+        assert np.allclose(result, expected, rtol=0, atol=1e-9, equal_nan=True), label
+    if HAVE_NUMBA:
+        for method in ('sma', 'wilder'):
+            assert np.allclose(rsi(prices, window, method, engine='numba'), rsi(prices, window, method, engine='numpy'),
+                               rtol=0, atol=1e-9, equal_nan=True), method
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='RSI kernels (SMA and Wilder) vs the pandas implementation')
+    parser.add_argument('--max-bars', type=int, default=10_000_000)
+    parser.add_argument('--window', type=int, default=14)
+    args = parser.parse_args()
+
+    # Same values as calculate_rsi / a pandas Wilder reference, including flat stretches (0/0) and pure up-runs
+    market = parse_market_data().set_index('Dates')
+    synthetic = synthetic_prices(6, 2000)
+    synthetic.iloc[500:560, 1] = 900.0
+    synthetic.iloc[800:840, 2] = np.linspace(1000, 1200, 40)
+    for window in (1, 2, args.window, 50):
+        check(market, window)
+        check(synthetic, window)
+
+    engines = ['numpy'] + (['numba'] if HAVE_NUMBA else [])
+    if HAVE_NUMBA:
+        # Compile outside the timings
+        for method in ('sma', 'wilder'):
+            rsi(np.arange(100.0), args.window, method, engine='numba')
+    print(f"window {args.window}, numba {'installed' if HAVE_NUMBA else 'not installed'}; time per series")
+    header = ['pandas calculate_rsi', 'pandas Wilder (ewm)'] + [f'{method} {engine}' for engine in engines
+                                                                for method in ('sma', 'wilder')]
+    print(f"{'bars':>10} " + ' '.join(f'{label:>20}' for label in header))
+    bars = 10_000
+    while bars <= args.max_bars:
+        series = synthetic_prices(1, bars)['METAL_0']
+        values = series.to_numpy()
+        repeat = 3 if bars <= 1_000_000 else 1
+        timings = [best_of(lambda: calculate_rsi(series, args.window), repeat),
+                   best_of(lambda: wilder_pandas(series, args.window), repeat)]
+        for engine in engines:
+            for method in ('sma', 'wilder'):
+                timings.append(best_of(lambda: rsi(values, args.window, method, engine=engine), repeat))
+        print(f"{bars:>10,} " + ' '.join(f'{timing * 1e3:18.2f}ms' for timing in timings))
+        bars *= 10
+
+    # Many series at once: a 500-metal x 20-year block in one call
+    block = synthetic_prices(500, 5220)
+    timings = [best_of(lambda: block.apply(calculate_rsi, window=args.window)),
+               best_of(lambda: block.apply(wilder_pandas, window=args.window))]
+    for engine in engines:
+        for method in ('sma', 'wilder'):
+            timings.append(best_of(lambda: rsi(block, args.window, method, engine=engine)))
+    print(f"{'500 x 5220':>10} " + ' '.join(f'{timing / 500 * 1e3:18.3f}ms' for timing in timings))
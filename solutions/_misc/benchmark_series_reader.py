@@ -0,0 +1,87 @@
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import Session
+
+from benchmark_indicator_block import synthetic_prices
+from bulk_insert import bulk_insert
+from indicators import calculate_indicator_block, to_wide_frame
+from migrate_schema import upgrade_schema
+from models import Metal, MetalPrice
+from series_reader import get_series
+
+FIELDS = ['price', 'macd', 'macd_signal', 'rsi']
+
+# Function to build a database of n_metals x n_dates daily bars with indicators
+def build_database(db_file: str, n_metals: int, n_dates: int):
+    prices = synthetic_prices(n_metals, n_dates)
+    dates = pd.Series(pd.date_range('1990-01-01', periods=n_dates, freq='D'), name='Dates')
+    df = to_wide_frame(dates, calculate_indicator_block(prices))
+    engine = create_engine(f'sqlite:///{db_file}')
+    with engine.begin() as conn:
+        upgrade_schema(conn, covering_indexes=False)
+    bulk_insert(engine, df, prices.columns, chunk_size=20000)
+    return engine, list(prices.columns)
+
+# Current path: select(MetalPrice) into identity-mapped ORM objects, then a frame built from their attributes
+def orm_series(engine, metals, fields):
+    with Session(engine) as session:
+        objects = session.execute(select(MetalPrice).join(Metal).where(Metal.name.in_(metals))).scalars().all()
+        long_df = pd.DataFrame({'Dates': pd.to_datetime([obj.date for obj in objects]),
+                                'metal': [obj.metal.name for obj in objects],
+                                **{field: [getattr(obj, field) for obj in objects] for field in fields}})
+    wide = long_df.pivot(index='Dates', columns='metal', values=fields).astype(np.float64)
+    return wide.reindex(columns=pd.MultiIndex.from_product([fields, metals]))
+
+def columnar_series(engine, metals, fields):
+    with engine.connect() as conn:
+        return get_series(conn, metals, fields=fields)
+
+def columnar_arrays(engine, metals, fields):
+    with engine.connect() as conn:
+        return get_series(conn, metals, fields=fields, as_frame=False)
+
+def measure(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func(*args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Columnar get_series vs ORM objects on a large metal_prices table')
+    parser.add_argument('--metals', type=int, default=100)
+    parser.add_argument('--dates', type=int, default=10000, help='daily bars per metal (100 x 10000 = 1M rows)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        engine, metals = build_database(os.path.join(tmp_dir, 'series.db'), args.metals, args.dates)
+
+        # Both paths must return the same frame
+        expected = orm_series(engine, metals, FIELDS)
+        actual = columnar_series(engine, metals, FIELDS)
+        pd.testing.assert_frame_equal(actual, expected, check_names=False, check_freq=False)
+
+        print(f"{args.metals} metals x {args.dates} dates = {args.metals * args.dates:,} rows, fields {FIELDS}")
+        print(f"{'path':<28} {'time':>9} {'peak alloc':>12}")
+        results = {}
+        for label, func in [('ORM objects -> DataFrame', orm_series),
+                            ('get_series -> DataFrame', columnar_series),
+                            ('get_series -> NumPy dict', columnar_arrays)]:
+            results[label] = measure(func, engine, metals, FIELDS)
+            elapsed, peak = results[label]
+            print(f"{label:<28} {elapsed:8.2f}s {peak / 1024 / 1024:10.1f}MB")
+        engine.dispose()
+
+    orm_time, orm_peak = results['ORM objects -> DataFrame']
+    frame_time, frame_peak = results['get_series -> DataFrame']
+    print(f"Speed-up {orm_time / frame_time:.1f}x, peak memory {orm_peak / frame_peak:.1f}x lower")
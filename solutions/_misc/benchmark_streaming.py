@@ -0,0 +1,110 @@
+import argparse
+import os
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import create_engine
+
+from bulk_insert import bulk_insert
+from indicators import calculate_macd_rsi
+from models import Base
+from streaming import stream_csv_to_db
+
+BASE_ROWS = 2000
+STREAM_CHUNKSIZE = 500      # Several chunks even at the smallest scale, so every run reaches steady state
+METALS = ['COPPER', 'ALUMINUM', 'ZINC', 'LEAD', 'TIN']
+
+# Function to write a synthetic daily price CSV in the 'Dates,METAL,...' layout.
+# metal_prices holds one row per (metal, date), so long inputs start early: 200k bars run from 1700 to 2247.
+def write_synthetic_csv(path: str, n_rows: int, seed: int = 0, metals: list = METALS) -> None:
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range('1700-01-01', periods=n_rows, freq='D')
+    with open(path, 'w') as f:
+        f.write('Dates,' + ','.join(metals) + '\n')
+        # Write in slices so generating the large input does not itself need much memory
+        level = np.full(len(metals), 5000.0)
+        for start in range(0, n_rows, 100000):
+            stop = min(start + 100000, n_rows)
+            steps = rng.normal(0, 2, size=(stop - start, len(metals)))
+            prices = level + steps.cumsum(axis=0)
+            level = prices[-1]
+            block = pd.DataFrame(prices.round(2), columns=metals)
+            block.insert(0, 'Dates', dates[start:stop].strftime('%Y-%m-%d'))
+            block.to_csv(f, header=False, index=False)
+
+# Function to read this process's peak RSS. VmHWM is per address space, whereas ru_maxrss survives
+# fork/exec and would include the parent's peak.
+def peak_rss_mb() -> float:
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Child process: run one pipeline mode and report its peak RSS
+def run_child(mode: str, csv_file: str, db_file: str) -> None:
+    engine = create_engine(f'sqlite:///{db_file}')
+    Base.metadata.create_all(engine)
+    start = time.perf_counter()
+    if mode == 'stream':
+        rows = stream_csv_to_db(csv_file, engine, chunksize=STREAM_CHUNKSIZE)
+    else:
+        df, metals = calculate_macd_rsi(csv_file)
+        rows = bulk_insert(engine, df, metals)
+    elapsed = time.perf_counter() - start
+    peak_mb = peak_rss_mb()
+    print(f'{rows} {elapsed:.3f} {peak_mb:.1f}')
+
+# Function to read back the stored bars in a fixed order, to compare the two modes
+def read_indicators(db_file: str) -> np.ndarray:
+    with sqlite3.connect(db_file) as conn:
+        rows = conn.execute('SELECT m.name, p.date, p.price, p.macd, p.macd_signal, p.rsi FROM metal_prices p '
+                            'JOIN metals m ON m.id = p.metal_id ORDER BY m.name, p.date').fetchall()
+    return np.array([row[2:] for row in rows], dtype=np.float64)
+
+def measure(mode: str, csv_file: str, db_file: str):
+    output = subprocess.run([sys.executable, __file__, '--child', mode, csv_file, db_file],
+                            check=True, capture_output=True, text=True).stdout.split()
+    return int(output[0]), float(output[1]), float(output[2])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Peak memory and throughput of streaming vs load-everything ingest')
+    parser.add_argument('--child', nargs=3, metavar=('MODE', 'CSV', 'DB'), help=argparse.SUPPRESS)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(*args.child)
+        sys.exit(0)
+
+    print(f"{'input rows':>10} {'mode':>8} {'db rows':>9} {'time':>9} {'rows/s':>9} {'peak RSS':>10}")
+    peaks, times = {}, {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for scale in args.scales:
+            csv_file = os.path.join(tmp_dir, f'prices_{scale}.csv')
+            write_synthetic_csv(csv_file, BASE_ROWS * scale)
+            for mode in ('stream', 'load-all'):
+                db_file = os.path.join(tmp_dir, f'{mode}_{scale}.db')
+                rows, elapsed, peak_mb = measure(mode, csv_file, db_file)
+                peaks[mode, scale], times[mode, scale] = peak_mb, elapsed
+                print(f'{BASE_ROWS * scale:>10} {mode:>8} {rows:>9} {elapsed:>8.2f}s {rows / elapsed:>9.0f} {peak_mb:>8.1f}MB')
+            # Chunked indicators carry their state across chunks, so they match the full-history calculation
+            streamed = read_indicators(os.path.join(tmp_dir, f'stream_{scale}.db'))
+            loaded = read_indicators(os.path.join(tmp_dir, f'load-all_{scale}.db'))
+            assert streamed.shape == loaded.shape, (streamed.shape, loaded.shape)
+            assert np.allclose(streamed, loaded, rtol=1e-9, atol=1e-9, equal_nan=True), f'streamed indicators differ at scale {scale}'
+            os.remove(csv_file)
+
+    # Streaming peak RSS must stay flat while the input grows 100x
+    smallest, largest = min(args.scales), max(args.scales)
+    growth = peaks['stream', largest] / peaks['stream', smallest]
+    print(f'Streaming peak RSS growth {smallest}x -> {largest}x input: {growth:.2f}x')
+    assert growth < 1.2, f'streaming peak RSS grew {growth:.2f}x'
+    for scale in args.scales:
+        print(f"{BASE_ROWS * scale} rows: streaming at {times['load-all', scale] / times['stream', scale]:.2f}x load-all throughput")
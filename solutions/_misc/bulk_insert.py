@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.ext.asyncio import AsyncEngine
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+from models import Metal, MetalPrice
+
+# Columns written for every (date, metal) cell, in table order
+FIELDS = ['price', 'macd', 'macd_signal', 'rsi']
+DEFAULT_CHUNK_SIZE = 5000
+
+# Function to build the INSERT ... ON CONFLICT (metal_id, date) DO UPDATE statement used for upserts.
+# A bar already stored for that metal and date (e.g. a revised settlement price) is overwritten in place.
+def upsert_statement():
+    statement = sqlite_insert(MetalPrice.__table__)
+    return statement.on_conflict_do_update(index_elements=['metal_id', 'date'],
+                                           set_={field: statement.excluded[field] for field in FIELDS})
+
+# Function to look up metal ids by name, adding any metal not yet in the metals dimension.
+# With an AsyncConnection use `await conn.run_sync(ensure_metals, names)`.
+def ensure_metals(conn: Connection, names: Iterable[str]) -> Dict[str, int]:
+    names = list(dict.fromkeys(names))
+    metal_ids = dict(conn.execute(select(Metal.name, Metal.id).where(Metal.name.in_(names))).all())
+    missing = [name for name in names if name not in metal_ids]
+    if missing:
+        conn.execute(insert(Metal.__table__), [{'name': name} for name in missing])
+        metal_ids.update(conn.execute(select(Metal.name, Metal.id).where(Metal.name.in_(missing))).all())
+    return metal_ids
+
+# Function to melt the wide indicator frame into long (date, metal, ...) form without a Python loop.
+# Row order matches the original populate_sql_table: date-major, then metals in column order.
+# With metal_ids the rows carry the metal_id foreign key, ready for insert; without, the metal name.
+def melt_indicator_frame(df: pd.DataFrame, metals: pd.Index, metal_ids: Optional[Dict[str, int]] = None) -> pd.DataFrame:
+    metals = list(metals)
+    n_dates, n_metals = len(df), len(metals)
+
+    long_df = pd.DataFrame({'date': np.repeat(pd.DatetimeIndex(df['Dates']).date, n_metals)})
+    if metal_ids is None:
+        long_df['metal'] = np.tile(np.asarray(metals, dtype=object), n_dates)
+    else:
+        long_df['metal_id'] = np.tile(np.asarray([metal_ids[metal] for metal in metals], dtype=np.int64), n_dates)
+    # to_numpy() on a (dates x metals) block ravels date-major, matching the repeat/tile above
+    long_df['price'] = df[metals].to_numpy(dtype=np.float64).ravel()
+    long_df['macd'] = df[[f'{metal}_macd' for metal in metals]].to_numpy(dtype=np.float64).ravel()
+    long_df['macd_signal'] = df[[f'{metal}_macd_signal' for metal in metals]].to_numpy(dtype=np.float64).ravel()
+    long_df['rsi'] = df[[f'{metal}_rsi' for metal in metals]].to_numpy(dtype=np.float64).ravel()
+
+    # SQLite has no NaN, store missing indicator values (warm-up period) as NULL
+    return long_df.astype(object).where(long_df.notna(), None)
+
+# Function to split the long frame into executemany parameter batches
+def iter_param_chunks(long_df: pd.DataFrame, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[List[dict]]:
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size must be positive, got {chunk_size}")
+    for start in range(0, len(long_df), chunk_size):
+        yield long_df.iloc[start:start + chunk_size].to_dict('records')
+
+# Function to refresh the weekly/monthly/yearly rollups of the periods a write touched, on the writing
+# connection so the aggregates commit with the daily rows. Called by every bulk write path below.
+# With an AsyncConnection use `await conn.run_sync(refresh_written_rollups, metal_ids, dates)`.
+def refresh_written_rollups(conn: Connection, metal_ids: Iterable[int], dates: Sequence) -> int:
+    # Imported here: rollups itself builds on this module's helpers
+    from rollups import refresh_rollups
+    metal_ids = {int(metal_id) for metal_id in metal_ids}
+    if not metal_ids:
+        return 0
+    return refresh_rollups(conn, metal_ids, min(dates), max(dates))
+
+# Function to bulk insert a PriceStore (array_store) with the same statements, melted straight from its matrices
+def bulk_insert_store(engine: Engine, store, chunk_size: int = DEFAULT_CHUNK_SIZE, upsert: bool = False,
+                      rollups: bool = True) -> int:
+    statement = upsert_statement() if upsert else insert(MetalPrice.__table__)
+
+    with engine.begin() as conn:
+        long_df = store.melt(ensure_metals(conn, store.metals), FIELDS)
+        for params in iter_param_chunks(long_df, chunk_size):
+            conn.execute(statement, params)
+        if rollups:
+            refresh_written_rollups(conn, long_df['metal_id'], long_df['date'])
+
+    return len(long_df)
+
+# Function to bulk insert the indicator frame using Core insert() and executemany (sync engine)
+def bulk_insert(engine: Engine, df: pd.DataFrame, metals: pd.Index, chunk_size: int = DEFAULT_CHUNK_SIZE, upsert: bool = False,
+                rollups: bool = True) -> int:
+    statement = upsert_statement() if upsert else insert(MetalPrice.__table__)
+
+    with engine.begin() as conn:
+        long_df = melt_indicator_frame(df, metals, ensure_metals(conn, metals))
+        for params in iter_param_chunks(long_df, chunk_size):
+            conn.execute(statement, params)
+        if rollups:
+            refresh_written_rollups(conn, long_df['metal_id'], long_df['date'])
+
+    return len(long_df)
+
+# Function to bulk insert the indicator frame using Core insert() and executemany (aiosqlite engine)
+async def async_bulk_insert(engine: AsyncEngine, df: pd.DataFrame, metals: pd.Index, chunk_size: int = DEFAULT_CHUNK_SIZE, upsert: bool = False,
+                            rollups: bool = True) -> int:
+    statement = upsert_statement() if upsert else insert(MetalPrice.__table__)
+
+    async with engine.begin() as conn:
+        long_df = melt_indicator_frame(df, metals, await conn.run_sync(ensure_metals, list(metals)))
+        for params in iter_param_chunks(long_df, chunk_size):
+            await conn.execute(statement, params)
+        if rollups:
+            await conn.run_sync(refresh_written_rollups, long_df['metal_id'], long_df['date'])
+
+    return len(long_df)
@@ -0,0 +1,223 @@
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from matplotlib import dates as mdates
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from array_store import PriceStore
+from price_archive import PriceArchive
+
+# Bump when the chart layout changes, so every chart is redrawn once
+TEMPLATE_VERSION = 1
+MANIFEST_FILE = 'charts.json'
+CHART_FIELDS = ('price', 'macd', 'macd_signal', 'rsi')
+FORMATS = ('png', 'svg')
+DEFAULT_MAX_POINTS = 2000
+
+# Function to pick at most max_points indices of (x, y) keeping each bucket's lowest and highest point, so
+# spikes survive; first and last points are always kept. x must be increasing and y free of NaN.
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    n = len(y)
+    n_buckets = max(1, (max_points - 2) // 2)
+    if n <= max_points:
+        return np.arange(n)
+    # Pad the tail with NaN so the points reshape into equal buckets
+    size = -(-(n - 2) // n_buckets)
+    padded = np.full(n_buckets * size, np.nan)
+    padded[:n - 2] = y[1:-1]
+    buckets = padded.reshape(n_buckets, size)
+    used = ~np.isnan(buckets).all(axis=1)
+    lows = np.nanargmin(buckets[used], axis=1)
+    highs = np.nanargmax(buckets[used], axis=1)
+    offsets = np.flatnonzero(used)[:, None] * size + 1
+    # Low and high in date order within each bucket
+    picked = np.sort(np.stack([lows, highs], axis=1), axis=1) + offsets
+    return np.unique(np.concatenate([[0], picked.ravel(), [n - 1]]))
+
+# Function to pick max_points indices with Largest-Triangle-Three-Buckets: in each bucket, the point forming
+# the largest triangle with the previous pick and the next bucket's mean. Keeps the shape of the line rather
+# than every extreme; x must be increasing and y free of NaN.
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    n = len(y)
+    if n <= max_points or max_points < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.int64)
+    # Mean point of every bucket, plus the last point standing in for the bucket after the final one
+    mean_x = np.append(np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / np.diff(edges), x[-1])
+    mean_y = np.append(np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / np.diff(edges), y[-1])
+    picked = np.empty(max_points, dtype=np.int64)
+    picked[0], picked[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        lo, hi = edges[bucket], edges[bucket + 1]
+        area = np.abs((x[previous] - mean_x[bucket + 1]) * (y[lo:hi] - y[previous])
+                      - (x[previous] - x[lo:hi]) * (mean_y[bucket + 1] - y[previous]))
+        previous = lo + int(np.argmax(area))
+        picked[bucket + 1] = previous
+    return picked
+
+DOWNSAMPLERS = {'minmax': lambda x, y, max_points: minmax_indices(y, max_points), 'lttb': lttb_indices}
+
+# Function to reduce one line to what is worth drawing: NaN points dropped (matplotlib skips them anyway),
+# then downsampled with `method` ('minmax', 'lttb' or None) to at most max_points
+def downsample(x: np.ndarray, y: np.ndarray, method: Optional[str] = 'minmax',
+               max_points: int = DEFAULT_MAX_POINTS) -> Tuple[np.ndarray, np.ndarray]:
+    keep = ~np.isnan(y)
+    x, y = x[keep], y[keep]
+    if method is None:
+        return x, y
+    if method not in DOWNSAMPLERS:
+        raise ValueError(f"unknown downsampling method {method!r}, expected one of {sorted(DOWNSAMPLERS)} or None")
+    indices = DOWNSAMPLERS[method](x, y, max_points)
+    return x[indices], y[indices]
+
+# Define ChartTemplate class: plot_macd_rsi_price's three-panel figure (price; MACD and signal; RSI), built
+# once with empty lines. render() only swaps the line data and the title, rescales the axes and saves, so a
+# worker draws hundreds of metals without building a figure per metal. Draws on the Agg canvas directly:
+# pyplot, its global figure list and the interactive backend are never involved.
+class ChartTemplate:
+    def __init__(self, figsize: Tuple[float, float] = (10, 10), dpi: int = 100):
+        self.figure = Figure(figsize=figsize, dpi=dpi)
+        FigureCanvasAgg(self.figure)
+        grid = self.figure.add_gridspec(3, 1, height_ratios=[7, 2, 2])
+        price_ax, macd_ax, rsi_ax = (self.figure.add_subplot(grid[row]) for row in range(3))
+        self.axes = (price_ax, macd_ax, rsi_ax)
+
+        self.lines = {'price': price_ax.plot([], [], label='Price')[0],
+                      'macd': macd_ax.plot([], [], label='MACD')[0],
+                      'macd_signal': macd_ax.plot([], [], label='MACD Signal')[0],
+                      'rsi': rsi_ax.plot([], [], label='RSI', color='orange')[0]}
+        self.title = price_ax.set_title('')
+        for ax, label in zip(self.axes, ('Price', 'MACD', 'RSI')):
+            ax.set_ylabel(label)
+            ax.legend(loc='upper left')
+            ax.grid(True)
+            locator = mdates.AutoDateLocator()
+            ax.xaxis.set_major_locator(locator)
+            ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        rsi_ax.set_xlabel('Date')
+        # Fixed margins: tight_layout would re-measure every tick label on every chart
+        self.figure.subplots_adjust(left=0.09, right=0.98, bottom=0.06, top=0.96, hspace=0.25)
+
+    # Function to draw one metal: `lines` maps each of CHART_FIELDS to its (x, y), x in matplotlib date numbers
+    def render(self, metal: str, lines: Dict[str, Tuple[np.ndarray, np.ndarray]]) -> None:
+        for field, line in self.lines.items():
+            line.set_data(*lines[field])
+        self.title.set_text(f'{metal} Analysis')
+        for ax in self.axes:
+            ax.relim()
+            ax.autoscale_view()
+
+    def save(self, path: str, fmt: str = 'png') -> None:
+        self.figure.savefig(path, format=fmt)
+
+# Function to turn a metal name into a file name, e.g. 'LME COPPER 3MO ($)' -> 'LME_COPPER_3MO_'
+def chart_file_name(metal: str, fmt: str = 'png') -> str:
+    return f"{re.sub(r'[^A-Za-z0-9.-]+', '_', metal)}.{fmt}"
+
+# Function to hash everything a chart is drawn from: its data, the format and downsampling, the template version
+def chart_hash(metal: str, days: np.ndarray, columns: Sequence[np.ndarray], fmt: str, method: Optional[str],
+               max_points: int) -> str:
+    digest = hashlib.sha256(json.dumps([TEMPLATE_VERSION, metal, fmt, method, max_points]).encode())
+    digest.update(np.ascontiguousarray(days, dtype='<i4').tobytes())
+    for column in columns:
+        digest.update(np.ascontiguousarray(column, dtype='<f8').tobytes())
+    return digest.hexdigest()
+
+def _read_manifest(out_dir: str) -> dict:
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def _write_manifest(out_dir: str, manifest: dict) -> None:
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+# Per-process rendering state, built once: the worker's template and, for an archive source, its mapping
+_worker: dict = {}
+
+def _init_worker(archive_path: Optional[str], fmt: str, method: Optional[str], max_points: int) -> None:
+    _worker.update(template=ChartTemplate(), fmt=fmt, method=method, max_points=max_points,
+                   store=PriceArchive(archive_path).store if archive_path else None)
+
+# Function run in a worker: draw a batch of charts; each task is (metal, path, days, columns) or, with an
+# archive source, (metal, path) with the columns read from the worker's own mapping. Returns seconds spent.
+def _render_batch(tasks: List[tuple]) -> float:
+    start = time.perf_counter()
+    for task in tasks:
+        metal, path = task[:2]
+        if len(task) > 2:
+            days, columns = task[2:]
+        else:
+            view = _worker['store'].metal(metal)
+            days, columns = view.store.days, [getattr(view, field) for field in CHART_FIELDS]
+        x = mdates.date2num(days.astype('datetime64[D]'))
+        lines = {field: downsample(x, np.asarray(column, dtype=np.float64), _worker['method'], _worker['max_points'])
+                 for field, column in zip(CHART_FIELDS, columns)}
+        _worker['template'].render(metal, lines)
+        _worker['template'].save(path, _worker['fmt'])
+    return time.perf_counter() - start
+
+# Function to render plot_macd_rsi_price's chart for many metals into out_dir as PNG or SVG files, headless.
+# `source` is a PriceStore with the CHART_FIELDS (e.g. calculate_macd_rsi_store's) or the path of a
+# PriceArchive, which workers map themselves so only metal names cross the process boundary. A chart whose
+# data hash matches out_dir's manifest and whose file exists is skipped (force=True redraws everything).
+# Long series are downsampled to max_points per line ('minmax' keeps spikes, 'lttb' the shape, None off).
+# Returns one row per metal: file, status ('rendered' or 'skipped') and hash.
+def render_reports(source: Union[PriceStore, str], out_dir: str, metals: Optional[Sequence[str]] = None,
+                   fmt: str = 'png', max_workers: Optional[int] = None, downsample_method: Optional[str] = 'minmax',
+                   max_points: int = DEFAULT_MAX_POINTS, batch_size: int = 16, force: bool = False) -> pd.DataFrame:
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown format {fmt!r}, expected one of {FORMATS}")
+    if downsample_method is not None and downsample_method not in DOWNSAMPLERS:
+        raise ValueError(f"unknown downsampling method {downsample_method!r}")
+    archive_path = source if isinstance(source, str) else None
+    store = PriceArchive(archive_path).store if archive_path else source
+    missing = [field for field in CHART_FIELDS if field not in store.fields]
+    if missing:
+        raise ValueError(f"source lacks fields {missing}")
+    metals = list(store.metals if metals is None else metals)
+    os.makedirs(out_dir, exist_ok=True)
+
+    manifest = _read_manifest(out_dir)
+    tasks, rows = [], []
+    for metal in metals:
+        view = store.metal(metal)
+        columns = [getattr(view, field) for field in CHART_FIELDS]
+        digest = chart_hash(metal, store.days, columns, fmt, downsample_method, max_points)
+        file_name = chart_file_name(metal, fmt)
+        path = os.path.join(out_dir, file_name)
+        unchanged = manifest.get(metal, {}).get('sha256') == digest and os.path.exists(path)
+        rows.append({'metal': metal, 'file': file_name, 'status': 'skipped' if unchanged and not force else 'rendered',
+                     'sha256': digest})
+        if force or not unchanged:
+            tasks.append((metal, path) if archive_path else (metal, path, store.days, columns))
+
+    batches = [tasks[lo:lo + batch_size] for lo in range(0, len(tasks), batch_size)]
+    settings = (archive_path, fmt, downsample_method, max_points)
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers == 1 or len(batches) <= 1:
+        _init_worker(*settings)
+        for batch in batches:
+            _render_batch(batch)
+    elif batches:
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(batches)), initializer=_init_worker,
+                                 initargs=settings) as pool:
+            list(pool.map(_render_batch, batches))
+
+    for row in rows:
+        manifest[row['metal']] = {'file': row['file'], 'sha256': row['sha256']}
+    _write_manifest(out_dir, manifest)
+    return pd.DataFrame(rows)
@@ -0,0 +1,69 @@
+from dataclasses import dataclass, field
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+# Define SQLiteProfile class: the pragmas applied to every new connection.
+# The defaults suit this workload: one process writing daily bars, many concurrent readers.
+@dataclass
+class SQLiteProfile:
+    # WAL lets readers keep reading the last committed snapshot while a writer commits
+    journal_mode: str = 'WAL'
+    # NORMAL only syncs at checkpoints in WAL mode; a power cut can lose the last commits but never corrupts the file
+    synchronous: str = 'NORMAL'
+    # Negative values are KiB: 64 MiB of page cache per connection
+    cache_size: int = -64000
+    mmap_size: int = 256 * 1024 * 1024
+    temp_store: str = 'MEMORY'
+    # Milliseconds a connection waits for a lock before raising 'database is locked'
+    busy_timeout: int = 5000
+
+    def statements(self, read_only: bool = False) -> list:
+        pragmas = [f'PRAGMA journal_mode = {self.journal_mode}',
+                   f'PRAGMA synchronous = {self.synchronous}',
+                   f'PRAGMA cache_size = {self.cache_size}',
+                   f'PRAGMA mmap_size = {self.mmap_size}',
+                   f'PRAGMA temp_store = {self.temp_store}',
+                   f'PRAGMA busy_timeout = {self.busy_timeout}']
+        if read_only:
+            pragmas.append('PRAGMA query_only = ON')
+        return pragmas
+
+# Function to run the profile's pragmas on every connection the engine's pool opens
+def apply_profile(engine: AsyncEngine, profile: SQLiteProfile, read_only: bool = False) -> None:
+    statements = profile.statements(read_only)
+
+    @event.listens_for(engine.sync_engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for statement in statements:
+            cursor.execute(statement)
+        cursor.close()
+
+# Define SQLiteEngines class: a single-connection write engine and a pooled, query-only read engine on one file.
+# SQLite admits one writer at a time anyway; queueing writes on a one-connection pool keeps them off the
+# readers' connections, so in WAL mode up to read_pool_size queries run while a write transaction commits.
+@dataclass
+class SQLiteEngines:
+    writer: AsyncEngine
+    reader: AsyncEngine
+    profile: SQLiteProfile = field(default_factory=SQLiteProfile)
+
+    async def dispose(self) -> None:
+        await self.reader.dispose()
+        await self.writer.dispose()
+
+# Function to create the read and write engines for one SQLite file, e.g. create_sqlite_engines('metal_commodity_Q5.db')
+def create_sqlite_engines(db_file: str, profile: Optional[SQLiteProfile] = None, read_pool_size: int = 5,
+                          read_max_overflow: int = 5, **engine_kwargs) -> SQLiteEngines:
+    if read_pool_size < 1:
+        raise ValueError(f"read_pool_size must be at least 1, got {read_pool_size}")
+    profile = profile or SQLiteProfile()
+    url = f'sqlite+aiosqlite:///{db_file}'
+
+    writer = create_async_engine(url, pool_size=1, max_overflow=0, **engine_kwargs)
+    apply_profile(writer, profile)
+    reader = create_async_engine(url, pool_size=read_pool_size, max_overflow=read_max_overflow, **engine_kwargs)
+    apply_profile(reader, profile, read_only=True)
+    return SQLiteEngines(writer=writer, reader=reader, profile=profile)
@@ -0,0 +1,85 @@
+import argparse
+import os
+import tempfile
+from datetime import date
+
+from sqlalchemy import create_engine, inspect, select, text
+
+from benchmark_bulk_insert import build_indicator_frame
+from bulk_insert import bulk_insert
+from migrate_schema import is_legacy_schema, upgrade_schema
+from models import Metal, MetalPrice
+
+# The concurrent_reads queries from Question 4 on the normalized schema, with the index each one must use
+QUERIES = [
+    ('metal == COPPER',
+     select(MetalPrice).join(Metal).where(Metal.name == 'COPPER'),
+     'ux_metal_prices_metal_date'),
+    ('metal == ZINC, date range',
+     select(MetalPrice).join(Metal).where(Metal.name == 'ZINC', MetalPrice.date >= date(2022, 1, 1)),
+     'ux_metal_prices_metal_date'),
+    ('date >= 2022-01-01',
+     select(MetalPrice.__table__).where(MetalPrice.date >= date(2022, 1, 1)),
+     'ix_metal_prices_date'),
+    ('rsi >= 40',
+     select(MetalPrice.__table__).where(MetalPrice.rsi >= 40),
+     'ix_metal_prices_rsi_covering'),
+    ('macd >= 0',
+     select(MetalPrice.__table__).where(MetalPrice.macd >= 0),
+     'ix_metal_prices_macd_covering'),
+]
+
+# Function to return SQLite's EXPLAIN QUERY PLAN lines for a statement
+def explain(conn, statement) -> list:
+    sql = str(statement.compile(conn, compile_kwargs={'literal_binds': True}))
+    return [row[-1] for row in conn.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+
+# Function to check every query uses its index and none falls back to a full scan of metal_prices
+def check_query_plans(engine) -> bool:
+    ok = True
+    with engine.connect() as conn:
+        for label, statement, index_name in QUERIES:
+            plan = explain(conn, statement)
+            uses_index = any(index_name in line for line in plan)
+            full_scan = any(line.startswith('SCAN') and 'metal_prices' in line and 'INDEX' not in line for line in plan)
+            status = 'OK' if uses_index and not full_scan else 'FAIL'
+            ok &= status == 'OK'
+            print(f'[{status}] {label}')
+            for line in plan:
+                print(f'        {line}')
+    return ok
+
+# Function to open an existing database read-only: checking the plans must never change the file
+def open_read_only(db_file: str):
+    if not os.path.exists(db_file):
+        raise FileNotFoundError(db_file)
+    return create_engine(f'sqlite:///file:{os.path.abspath(db_file)}?mode=ro&uri=true')
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Check that the metal_prices queries are served by indexes')
+    parser.add_argument('db_file', nargs='?', help='Existing database to check, opened read-only; by default a temporary '
+                                                   'one is built from MarketData.csv')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if args.db_file is None:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp_dir, 'plans.db')}")
+            with engine.begin() as conn:
+                upgrade_schema(conn)
+            df, metals = build_indicator_frame()
+            bulk_insert(engine, df, metals)
+            with engine.begin() as conn:
+                conn.execute(text('ANALYZE'))
+        else:
+            engine = open_read_only(args.db_file)
+            with engine.connect() as conn:
+                tables = inspect(conn).get_table_names()
+                legacy = is_legacy_schema(conn)
+            if legacy or not {'metals', 'metal_prices'} <= set(tables):
+                engine.dispose()
+                parser.exit(1, f"{args.db_file}: {'legacy' if legacy else 'no'} metal_prices schema, "
+                               f"run migrate_schema.py on it (or a copy) first\n")
+        passed = check_query_plans(engine)
+        engine.dispose()
+
+    assert passed, 'some queries are not served by the expected index'
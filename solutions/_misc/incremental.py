@@ -0,0 +1,365 @@
+import json
+import math
+from collections import deque
+from datetime import date
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from models import IndicatorState
+
+NaN = float('nan')
+
+# Function to divide with IEEE semantics (x/0 -> +-inf, 0/0 -> nan), as pandas does for gain / loss
+def _ieee_div(a: float, b: float) -> float:
+    try:
+        return a / b
+    except ZeroDivisionError:
+        if a != a or a == 0:
+            return NaN
+        return math.copysign(math.inf, a) * math.copysign(1., b)
+
+# Function to solve y[t] = factor * y[t-1] + inflow[t] down a block, from y[-1] = previous. Within a stretch
+# y[t] = factor**(t+1) * previous + factor**t * cumsum(inflow[s] / factor**s); stretches stop before
+# factor**-t nears overflow. Each term enters with weight factor**(t-s) <= 1, so no error is amplified.
+def _decay_scan(inflow: np.ndarray, factor: float, previous: float) -> np.ndarray:
+    if factor == 0:
+        return inflow.copy()
+    out = np.empty_like(inflow)
+    stretch = max(1, int(600 / -math.log(factor)))
+    for lo in range(0, len(inflow), stretch):
+        hi = min(lo + stretch, len(inflow))
+        scale = factor ** np.arange(hi - lo, dtype=np.float64)
+        np.cumsum(inflow[lo:hi] / scale, out=out[lo:hi])
+        out[lo:hi] += previous * factor
+        out[lo:hi] *= scale
+        previous = out[hi - 1]
+    return out
+
+# Define EMAState class: O(1) update of pandas' ewm(span=...).mean() with the default adjust=True.
+# The update follows pandas' own recursion step by step so results are bit-identical to the batch path.
+class EMAState:
+    __slots__ = ('span', 'old_wt_factor', 'started', 'weighted', 'old_wt', 'nobs')
+
+    def __init__(self, span: int):
+        self.span = span
+        com = (span - 1) / 2
+        self.old_wt_factor = 1. - 1. / (1. + com)
+        self.started = False
+        self.weighted = NaN
+        self.old_wt = 1.
+        self.nobs = 0
+
+    def update(self, cur: float) -> float:
+        is_observation = cur == cur
+        self.nobs += is_observation
+        if not self.started:
+            self.started = True
+            self.weighted = cur
+        elif self.weighted == self.weighted:
+            self.old_wt *= self.old_wt_factor
+            if is_observation:
+                # Same guard as pandas, avoids numerical drift on constant series
+                if self.weighted != cur:
+                    self.weighted = (self.old_wt * self.weighted + cur) / (self.old_wt + 1.)
+                self.old_wt += 1.
+        elif is_observation:
+            self.weighted = cur
+        return self.weighted if self.nobs >= 1 else NaN
+
+    # Function to apply update() to a block of values at once. From the first observation on, the weighted sum
+    # (weighted * old_wt) and the total weight old_wt follow linear recursions: both decay by old_wt_factor
+    # every step, and an observation adds itself and a weight of 1. They are solved vectorized with
+    # _decay_scan; a missing value leaves weighted as it was. Equal to update() step by step to rounding, and
+    # leaves the same state.
+    def update_block(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        out = np.full(len(values), NaN)
+        observed = ~np.isnan(values)
+        self.started = self.started or len(values) > 0
+        if self.weighted == self.weighted:
+            first, weighted_sum, weight = 0, self.weighted * self.old_wt, self.old_wt
+            sum_inflow = np.where(observed, values, 0.)
+            weight_inflow = observed.astype(np.float64)
+        elif observed.any():
+            # Not yet observed: the first observation becomes weighted with the current old_wt, undecayed
+            first, weighted_sum, weight = int(observed.argmax()), 0., 0.
+            sum_inflow = np.where(observed[first:], values[first:], 0.)
+            sum_inflow[0] *= self.old_wt
+            weight_inflow = observed[first:].astype(np.float64)
+            weight_inflow[0] = self.old_wt
+        else:
+            return out
+        weighted_sums = _decay_scan(sum_inflow, self.old_wt_factor, weighted_sum)
+        weights = _decay_scan(weight_inflow, self.old_wt_factor, weight)
+        rows = np.flatnonzero(observed[first:])
+        block = out[first:]
+        block[rows] = weighted_sums[rows] / weights[rows]
+        # Carry weighted over missing values, as update() does
+        if first == 0 and not observed[0]:
+            block[0] = self.weighted
+        held = np.where(np.isnan(block), 0, np.arange(len(block)))
+        np.maximum.accumulate(held, out=held)
+        out[first:] = block[held]
+
+        self.weighted = float(out[-1])
+        self.old_wt = float(weights[-1])
+        self.nobs += int(observed.sum())
+        return out
+
+    def to_dict(self) -> dict:
+        return {'span': self.span, 'started': self.started, 'weighted': self.weighted, 'old_wt': self.old_wt, 'nobs': self.nobs}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'EMAState':
+        state = cls(data['span'])
+        state.started, state.weighted = data['started'], data['weighted']
+        state.old_wt, state.nobs = data['old_wt'], data['nobs']
+        return state
+
+# Define RollingMeanState class: O(1) update of pandas' rolling(window).mean(), including its
+# Kahan-compensated running sum, so the result matches the batch calculation exactly
+class RollingMeanState:
+    __slots__ = ('window', 'values', 'sum_x', 'compensation_add', 'compensation_remove',
+                 'nobs', 'neg_ct', 'prev_value', 'num_consecutive_same_value')
+
+    def __init__(self, window: int):
+        self.window = window
+        self.values = deque()
+        self.sum_x = 0.
+        self.compensation_add = 0.
+        self.compensation_remove = 0.
+        self.nobs = 0
+        self.neg_ct = 0
+        self.prev_value = NaN
+        self.num_consecutive_same_value = 0
+
+    def _remove(self, val: float) -> None:
+        if val == val:
+            self.nobs -= 1
+            y = -val - self.compensation_remove
+            t = self.sum_x + y
+            self.compensation_remove = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1., val) < 0:
+                self.neg_ct -= 1
+
+    def _add(self, val: float) -> None:
+        if val == val:
+            self.nobs += 1
+            y = val - self.compensation_add
+            t = self.sum_x + y
+            self.compensation_add = t - self.sum_x - y
+            self.sum_x = t
+            if math.copysign(1., val) < 0:
+                self.neg_ct += 1
+            if val == self.prev_value:
+                self.num_consecutive_same_value += 1
+            else:
+                self.num_consecutive_same_value = 1
+            self.prev_value = val
+
+    def update(self, val: float) -> float:
+        # pandas removes the expired value before adding the new one; the order matters for the running sum
+        if len(self.values) == self.window:
+            self._remove(self.values.popleft())
+        self.values.append(val)
+        self._add(val)
+
+        if self.nobs < self.window:
+            return NaN
+        result = self.sum_x / self.nobs
+        if self.num_consecutive_same_value >= self.nobs:
+            result = self.prev_value
+        elif self.neg_ct == 0 and result < 0:
+            result = 0.
+        elif self.neg_ct == self.nobs and result > 0:
+            result = 0.
+        return result
+
+    # Function to apply update() to a block of values at once: each row's window sum is a difference of cumulative
+    # sums over the carried window and the block, so a run of zeros gives exactly 0, and pandas' special cases
+    # (a window of one repeated value, the sign clamps) are applied per row. Equal to update() step by step to
+    # rounding; the state left behind holds the same window, its sum recomputed exactly.
+    def update_block(self, values: np.ndarray) -> np.ndarray:
+        values = np.asarray(values, dtype=np.float64)
+        window = self.window
+        combined = np.concatenate([np.asarray(self.values, dtype=np.float64), values])
+        valid = ~np.isnan(combined)
+        changed = np.concatenate([[False], combined[1:] != combined[:-1]])
+        # Row t's window is (t - window, t]: with a leading zero its sum is cum[t + 1] - cum[t + 1 - window]
+        ends = np.arange(len(combined) - len(values), len(combined)) + 1
+        starts = np.maximum(ends - window, 0)
+        window_sums = []
+        for series in (np.where(valid, combined, 0.), valid, valid & np.signbit(combined), changed):
+            cumulative = np.concatenate([[0.], np.cumsum(series, dtype=np.float64)])
+            window_sums.append(cumulative[ends] - cumulative[starts])
+        sums, nobs, negatives, changes = window_sums
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = sums / nobs
+        out[(negatives == 0) & (out < 0)] = 0.
+        out[(negatives == nobs) & (out > 0)] = 0.
+        # A change at a window's first row is against the row before the window
+        repeated = changes == changed[starts]
+        out[repeated] = combined[ends - 1][repeated]
+        out[nobs < window] = NaN
+
+        kept = combined[-window:]
+        kept_valid = kept[~np.isnan(kept)]
+        self.values = deque(kept.tolist())
+        self.sum_x = math.fsum(kept_valid.tolist())
+        self.compensation_add = self.compensation_remove = 0.
+        self.nobs = len(kept_valid)
+        self.neg_ct = int(np.signbit(kept_valid).sum())
+        new_valid = values[~np.isnan(values)]
+        if len(new_valid):
+            last = new_valid[-1]
+            differs = np.flatnonzero(new_valid != last)
+            run = len(new_valid) - (differs[-1] + 1 if len(differs) else 0)
+            if run == len(new_valid) and last == self.prev_value:
+                run += self.num_consecutive_same_value
+            self.prev_value = float(last)
+            self.num_consecutive_same_value = int(run)
+        return out
+
+    def to_dict(self) -> dict:
+        return {'window': self.window, 'values': list(self.values), 'sum_x': self.sum_x,
+                'compensation_add': self.compensation_add, 'compensation_remove': self.compensation_remove,
+                'nobs': self.nobs, 'neg_ct': self.neg_ct, 'prev_value': self.prev_value,
+                'num_consecutive_same_value': self.num_consecutive_same_value}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'RollingMeanState':
+        state = cls(data['window'])
+        state.values = deque(data['values'])
+        for name in ('sum_x', 'compensation_add', 'compensation_remove', 'nobs', 'neg_ct',
+                     'prev_value', 'num_consecutive_same_value'):
+            setattr(state, name, data[name])
+        return state
+
+# Define MetalIndicator class holding the MACD/RSI state of one metal.
+# update() appends one bar in O(1) and returns the same (macd, macd_signal, rsi) as
+# calculate_macd / calculate_rsi would for that bar over the full history.
+class MetalIndicator:
+    def __init__(self, metal: str, slow_period: int = 26, fast_period: int = 12, signal_period: int = 9, window: int = 14):
+        self.metal = metal
+        self.last_date: Optional[pd.Timestamp] = None
+        self.last_price = NaN
+        self.slow_ema = EMAState(slow_period)
+        self.fast_ema = EMAState(fast_period)
+        self.signal_ema = EMAState(signal_period)
+        self.avg_gain = RollingMeanState(window)
+        self.avg_loss = RollingMeanState(window)
+
+    def update(self, bar_date: date, price: float) -> Tuple[float, float, float]:
+        # Bars may be dates (daily feed) or datetimes (intraday replay); compare them as Timestamps
+        bar_date = pd.Timestamp(bar_date)
+        if self.last_date is not None and bar_date <= self.last_date:
+            raise ValueError(f"{self.metal}: bar dated {bar_date} is not after last update {self.last_date}")
+        result = self._step(float(price))
+        self.last_date = bar_date
+        return result
+
+    # Function to validate a block of bars once, vectorized: same length, strictly increasing, after the last update
+    def _check_block(self, dates: Iterable[date], prices: Iterable[float]) -> Tuple[pd.DatetimeIndex, np.ndarray]:
+        stamps = pd.DatetimeIndex(list(dates) if not hasattr(dates, '__len__') else dates)
+        prices = np.asarray(prices, dtype=np.float64)
+        if len(stamps) != len(prices):
+            raise ValueError(f"{self.metal}: got {len(stamps)} dates for {len(prices)} prices")
+        if len(stamps) and not (stamps.is_monotonic_increasing and stamps.is_unique):
+            raise ValueError(f"{self.metal}: bar dates must be strictly increasing")
+        if len(stamps) and self.last_date is not None and stamps[0] <= self.last_date:
+            raise ValueError(f"{self.metal}: bar dated {stamps[0]} is not after last update {self.last_date}")
+        return stamps, prices
+
+    # Function to replay a block of bars bar by bar, bit-identical to update() (and so to the batch calculation)
+    def update_many(self, dates: Iterable[date], prices: Iterable[float]) -> np.ndarray:
+        stamps, prices = self._check_block(dates, prices)
+        if len(stamps) == 0:
+            return np.empty((0, 3), dtype=np.float64)
+
+        out = np.empty((len(prices), 3), dtype=np.float64)
+        step = self._step
+        for i, price in enumerate(prices.tolist()):
+            out[i] = step(price)
+        self.last_date = stamps[-1]
+        return out
+
+    # Function to compute a block of bars (a first load or a streamed chunk) vectorized, carrying the state across
+    # blocks: equal to update_many to rounding, at numpy rather than Python speed per bar
+    def update_block(self, dates: Iterable[date], prices: Iterable[float]) -> np.ndarray:
+        stamps, prices = self._check_block(dates, prices)
+        if len(stamps) == 0:
+            return np.empty((0, 3), dtype=np.float64)
+
+        # MACD
+        macd = self.fast_ema.update_block(prices) - self.slow_ema.update_block(prices)
+        macd_signal = self.signal_ema.update_block(macd)
+
+        # RSI, with the same gain / loss values as _step (a loss of -0. where the price did not fall)
+        delta = prices - np.concatenate([[self.last_price], prices[:-1]])
+        gain = np.where(delta > 0, delta, 0.)
+        loss = np.where(delta < 0, -delta, -0.)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rs = self.avg_gain.update_block(gain) / self.avg_loss.update_block(loss)
+            rsi = 100 - 100 / (1 + rs)
+
+        self.last_price = float(prices[-1])
+        self.last_date = stamps[-1]
+        return np.column_stack([macd, macd_signal, rsi])
+
+    def _step(self, price: float) -> Tuple[float, float, float]:
+        # MACD
+        macd = self.fast_ema.update(price) - self.slow_ema.update(price)
+        macd_signal = self.signal_ema.update(macd)
+
+        # RSI, mirroring delta.where(delta > 0, 0) and -delta.where(delta < 0, 0)
+        delta = price - self.last_price
+        gain = delta if delta > 0 else 0.
+        loss = -(delta if delta < 0 else 0.)
+        rs = _ieee_div(self.avg_gain.update(gain), self.avg_loss.update(loss))
+        rsi = 100 - _ieee_div(100, 1 + rs)
+
+        self.last_price = price
+        return macd, macd_signal, rsi
+
+    def to_dict(self) -> dict:
+        return {
+            'metal': self.metal,
+            'last_date': self.last_date.isoformat() if self.last_date is not None else None,
+            'last_price': self.last_price,
+            'slow_ema': self.slow_ema.to_dict(),
+            'fast_ema': self.fast_ema.to_dict(),
+            'signal_ema': self.signal_ema.to_dict(),
+            'avg_gain': self.avg_gain.to_dict(),
+            'avg_loss': self.avg_loss.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'MetalIndicator':
+        indicator = cls(data['metal'])
+        indicator.last_date = pd.Timestamp(data['last_date']) if data['last_date'] else None
+        indicator.last_price = data['last_price']
+        indicator.slow_ema = EMAState.from_dict(data['slow_ema'])
+        indicator.fast_ema = EMAState.from_dict(data['fast_ema'])
+        indicator.signal_ema = EMAState.from_dict(data['signal_ema'])
+        indicator.avg_gain = RollingMeanState.from_dict(data['avg_gain'])
+        indicator.avg_loss = RollingMeanState.from_dict(data['avg_loss'])
+        return indicator
+
+# Function to persist indicator states; with an AsyncSession use `await session.run_sync(save_indicator_states, indicators)`
+def save_indicator_states(session: Session, indicators: Iterable[MetalIndicator]) -> None:
+    for indicator in indicators:
+        # json keeps NaN/inf and round-trips floats exactly via repr
+        last_date = indicator.last_date.date() if indicator.last_date is not None else None
+        session.merge(IndicatorState(metal=indicator.metal, last_date=last_date,
+                                     state=json.dumps(indicator.to_dict())))
+    session.commit()
+
+# Function to load persisted indicator states keyed by metal
+def load_indicator_states(session: Session) -> Dict[str, MetalIndicator]:
+    rows = session.execute(select(IndicatorState)).scalars()
+    return {row.metal: MetalIndicator.from_dict(json.loads(row.state)) for row in rows}
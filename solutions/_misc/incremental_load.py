@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from sqlalchemy.engine import Connection, Engine
+from typing import Dict, Iterable, List, Optional
+
+from bulk_insert import ensure_metals, iter_param_chunks, upsert_statement, DEFAULT_CHUNK_SIZE
+from indicators import calculate_macd, calculate_rsi
+from models import MetalPrice
+from rollups import refresh_rollups
+
+# Stored bars read back ahead of the first written bar. The EMAs forget their start at (1 - 2/27)^n, so after
+# 250 bars (about a trading year) the truncated history moves MACD by less than 1e-8 of the price level;
+# the 14-bar RSI only needs 15 bars to be exact.
+WARMUP_BARS = 250
+# Most recent stored bars rewritten on every load, so revised settlement prices replace the stored ones
+REVISION_BARS = 5
+
+# Function to return the last stored date per metal id (None for a metal with no rows yet)
+def last_stored_dates(conn: Connection, metal_ids: Iterable[int]) -> Dict[int, Optional[pd.Timestamp]]:
+    metal_ids = list(metal_ids)
+    rows = conn.execute(select(MetalPrice.metal_id, func.max(MetalPrice.date))
+                        .where(MetalPrice.metal_id.in_(metal_ids))
+                        .group_by(MetalPrice.metal_id)).all()
+    last_dates = {metal_id: None for metal_id in metal_ids}
+    last_dates.update({metal_id: pd.Timestamp(last_date) for metal_id, last_date in rows})
+    return last_dates
+
+# Function to read the most recent `n_bars` stored prices of one metal, oldest first
+def stored_tail(conn: Connection, metal_id: int, n_bars: int) -> pd.Series:
+    rows = conn.execute(select(MetalPrice.date, MetalPrice.price)
+                        .where(MetalPrice.metal_id == metal_id)
+                        .order_by(MetalPrice.date.desc())
+                        .limit(n_bars)).all()[::-1]
+    return pd.Series([price for _, price in rows], index=pd.DatetimeIndex([bar_date for bar_date, _ in rows]), dtype=np.float64)
+
+# Function to work out the rows one metal needs written: bars newer than the stored history plus the last
+# `revision_bars` stored dates, with indicators computed over the stored warm-up window followed by the new prices
+def _metal_rows(conn: Connection, metal_id: int, prices: pd.Series, last_date: Optional[pd.Timestamp],
+                warmup: int, revision_bars: int) -> pd.DataFrame:
+    if last_date is None:
+        # Nothing stored yet: the full history is in `prices`, so the indicators are exact
+        history, new = prices, prices
+    else:
+        tail = stored_tail(conn, metal_id, warmup + revision_bars)
+        if revision_bars:
+            new = prices[prices.index >= tail.index[-min(revision_bars, len(tail))]]
+        else:
+            new = prices[prices.index > last_date]
+        # Incoming prices win over stored ones for the same date; stored-only dates keep their price
+        history = new.combine_first(tail)
+
+    if new.empty:
+        return pd.DataFrame(columns=['date', 'metal_id', 'price', 'macd', 'macd_signal', 'rsi'])
+
+    macd_line, macd_signal = calculate_macd(history)
+    rsi = calculate_rsi(history)
+    return pd.DataFrame({'date': new.index.date, 'metal_id': metal_id, 'price': history.reindex(new.index).to_numpy(),
+                         'macd': macd_line.reindex(new.index).to_numpy(),
+                         'macd_signal': macd_signal.reindex(new.index).to_numpy(),
+                         'rsi': rsi.reindex(new.index).to_numpy()})
+
+# Function to load only what the database does not have yet. `prices` is a 'Dates' + one-column-per-metal
+# frame, as read from MarketData_filtered.csv; it may hold the full history or just the latest bars.
+# Rows are upserted, so re-running with the same file rewrites only the revision window and adds nothing.
+# With rollups the weekly/monthly/yearly rollups of the periods the written bars fall in are refreshed as well.
+# With an AsyncConnection use `await conn.run_sync(load_new_bars, prices)`.
+def load_new_bars(conn: Connection, prices: pd.DataFrame, warmup: int = WARMUP_BARS,
+                  revision_bars: int = REVISION_BARS, chunk_size: int = DEFAULT_CHUNK_SIZE, rollups: bool = True) -> int:
+    if warmup < 0 or revision_bars < 0:
+        raise ValueError(f"warmup and revision_bars must be non-negative, got {warmup} and {revision_bars}")
+    metals = list(prices.columns[1:])
+    indexed = prices.set_index(pd.DatetimeIndex(prices['Dates']))[metals].astype(np.float64).sort_index()
+
+    metal_ids = ensure_metals(conn, metals)
+    last_dates = last_stored_dates(conn, metal_ids.values())
+    frames: List[pd.DataFrame] = [_metal_rows(conn, metal_ids[metal], indexed[metal], last_dates[metal_ids[metal]],
+                                              warmup, revision_bars)
+                                  for metal in metals]
+    long_df = pd.concat(frames, ignore_index=True)
+    if long_df.empty:
+        return 0
+
+    # SQLite has no NaN, store missing values as NULL
+    long_df = long_df.astype(object).where(long_df.notna(), None)
+    statement = upsert_statement()
+    for params in iter_param_chunks(long_df, chunk_size):
+        conn.execute(statement, params)
+    if rollups:
+        refresh_rollups(conn, long_df['metal_id'].unique(), long_df['date'].min(), long_df['date'].max(),
+                        chunk_size=chunk_size)
+    return len(long_df)
+
+# Function to run an incremental load in its own transaction on a sync engine
+def incremental_load(engine: Engine, prices: pd.DataFrame, warmup: int = WARMUP_BARS,
+                     revision_bars: int = REVISION_BARS, chunk_size: int = DEFAULT_CHUNK_SIZE, rollups: bool = True) -> int:
+    with engine.begin() as conn:
+        return load_new_bars(conn, prices, warmup=warmup, revision_bars=revision_bars, chunk_size=chunk_size,
+                             rollups=rollups)
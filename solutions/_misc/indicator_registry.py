@@ -0,0 +1,192 @@
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from rsi import rsi as rsi_kernel
+
+# A node of the evaluation graph: its type name followed by its parameters, e.g. ('ema', 12) or
+# ('macd_signal', 12, 26, 9). ('close',), ('high',) and ('low',) are the input price blocks.
+NodeKey = Tuple
+SOURCES = ('close', 'high', 'low')
+
+# Define NodeType class: how to compute one kind of node. `inputs` maps the node's parameters to the keys it
+# depends on; `compute` receives those inputs' frames followed by the parameters.
+@dataclass(frozen=True)
+class NodeType:
+    name: str
+    inputs: Callable[..., List[NodeKey]]
+    compute: Callable[..., pd.DataFrame]
+
+NODE_TYPES: Dict[str, NodeType] = {}
+# Named outputs users can request, each pointing at a node
+INDICATORS: Dict[str, NodeKey] = {}
+
+# Decorator to register a node type; `inputs` declares its dependencies as a function of its parameters
+def register_node(name: str, inputs: Callable[..., List[NodeKey]]):
+    def decorator(compute: Callable[..., pd.DataFrame]) -> Callable[..., pd.DataFrame]:
+        if name in NODE_TYPES or name in SOURCES:
+            raise ValueError(f"node type {name!r} is already registered")
+        NODE_TYPES[name] = NodeType(name, inputs, compute)
+        return compute
+    return decorator
+
+# Function to register (or replace) a named output, e.g. register_indicator('ema_50', ('ema', 50))
+def register_indicator(name: str, key: NodeKey) -> None:
+    if key[0] not in NODE_TYPES and key[0] not in SOURCES:
+        raise ValueError(f"unknown node type {key[0]!r} in {key}")
+    INDICATORS[name] = tuple(key)
+
+# Shared building blocks
+@register_node('ema', inputs=lambda span: [('close',)])
+def _ema(close: pd.DataFrame, span: int) -> pd.DataFrame:
+    return close.ewm(span=span).mean()
+
+@register_node('sma', inputs=lambda window: [('close',)])
+def _sma(close: pd.DataFrame, window: int) -> pd.DataFrame:
+    return close.rolling(window=window).mean()
+
+@register_node('rolling_std', inputs=lambda window: [('close',)])
+def _rolling_std(close: pd.DataFrame, window: int) -> pd.DataFrame:
+    return close.rolling(window=window).std(ddof=0)
+
+@register_node('delta', inputs=lambda: [('close',)])
+def _delta(close: pd.DataFrame) -> pd.DataFrame:
+    return close.diff()
+
+# MACD: the fast and slow EMAs are nodes of their own, so parameter sets sharing a span compute it once
+@register_node('macd_line', inputs=lambda fast, slow: [('ema', fast), ('ema', slow)])
+def _macd_line(fast_ema: pd.DataFrame, slow_ema: pd.DataFrame, fast: int, slow: int) -> pd.DataFrame:
+    return fast_ema - slow_ema
+
+@register_node('macd_signal', inputs=lambda fast, slow, signal: [('macd_line', fast, slow)])
+def _macd_signal(macd_line: pd.DataFrame, fast: int, slow: int, signal: int) -> pd.DataFrame:
+    return macd_line.ewm(span=signal).mean()
+
+@register_node('macd_hist', inputs=lambda fast, slow, signal: [('macd_line', fast, slow), ('macd_signal', fast, slow, signal)])
+def _macd_hist(macd_line: pd.DataFrame, signal_line: pd.DataFrame, fast: int, slow: int, signal: int) -> pd.DataFrame:
+    return macd_line - signal_line
+
+# RSI over simple rolling means of gains and losses, as calculate_rsi
+@register_node('avg_gain', inputs=lambda window: [('delta',)])
+def _avg_gain(delta: pd.DataFrame, window: int) -> pd.DataFrame:
+    return delta.where(delta > 0, 0).rolling(window=window).mean()
+
+@register_node('avg_loss', inputs=lambda window: [('delta',)])
+def _avg_loss(delta: pd.DataFrame, window: int) -> pd.DataFrame:
+    return (-delta.where(delta < 0, 0)).rolling(window=window).mean()
+
+@register_node('rsi', inputs=lambda window: [('avg_gain', window), ('avg_loss', window)])
+def _rsi(gain: pd.DataFrame, loss: pd.DataFrame, window: int) -> pd.DataFrame:
+    return 100 - (100 / (1 + gain / loss))
+
+# Wilder's RSI, one pass down each column with the rsi module's kernel
+@register_node('rsi_wilder', inputs=lambda window: [('close',)])
+def _rsi_wilder(close: pd.DataFrame, window: int) -> pd.DataFrame:
+    return rsi_kernel(close, window, method='wilder')
+
+# Bollinger bands: SMA +/- width population standard deviations
+@register_node('bollinger_upper', inputs=lambda window, width: [('sma', window), ('rolling_std', window)])
+def _bollinger_upper(mid: pd.DataFrame, std: pd.DataFrame, window: int, width: float) -> pd.DataFrame:
+    return mid + width * std
+
+@register_node('bollinger_lower', inputs=lambda window, width: [('sma', window), ('rolling_std', window)])
+def _bollinger_lower(mid: pd.DataFrame, std: pd.DataFrame, window: int, width: float) -> pd.DataFrame:
+    return mid - width * std
+
+# Average true range with Wilder's smoothing. The first bar has no previous close, so its range is high - low.
+@register_node('true_range', inputs=lambda: [('high',), ('low',), ('close',)])
+def _true_range(high: pd.DataFrame, low: pd.DataFrame, close: pd.DataFrame) -> pd.DataFrame:
+    previous = close.shift(1)
+    ranges = np.stack([(high - low).to_numpy(), (high - previous).abs().to_numpy(), (low - previous).abs().to_numpy()])
+    return pd.DataFrame(np.fmax.reduce(ranges, axis=0), index=close.index, columns=close.columns)
+
+@register_node('atr', inputs=lambda window: [('true_range',)])
+def _atr(true_range: pd.DataFrame, window: int) -> pd.DataFrame:
+    return true_range.ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+
+# Stochastic oscillator: %K is the close's position in the window's low-high range, %D its moving average
+@register_node('stoch_k', inputs=lambda window: [('high',), ('low',), ('close',)])
+def _stoch_k(high: pd.DataFrame, low: pd.DataFrame, close: pd.DataFrame, window: int) -> pd.DataFrame:
+    lowest = low.rolling(window=window).min()
+    highest = high.rolling(window=window).max()
+    return 100 * (close - lowest) / (highest - lowest)
+
+@register_node('stoch_d', inputs=lambda window, smooth: [('stoch_k', window)])
+def _stoch_d(stoch_k: pd.DataFrame, window: int, smooth: int) -> pd.DataFrame:
+    return stoch_k.rolling(window=smooth).mean()
+
+# MACD parameter sets (fast, slow, signal) for the README's slow/medium/fast MACD; medium is the classic 12/26/9
+MACD_PRESETS: Dict[str, Tuple[int, int, int]] = {'fast': (5, 35, 5), 'medium': (12, 26, 9), 'slow': (19, 39, 9)}
+
+register_indicator('price', ('close',))
+register_indicator('macd', ('macd_line', 12, 26))
+register_indicator('macd_signal', ('macd_signal', 12, 26, 9))
+register_indicator('macd_hist', ('macd_hist', 12, 26, 9))
+for _preset, (_fast, _slow, _signal) in MACD_PRESETS.items():
+    register_indicator(f'macd_{_preset}', ('macd_line', _fast, _slow))
+    register_indicator(f'macd_{_preset}_signal', ('macd_signal', _fast, _slow, _signal))
+    register_indicator(f'macd_{_preset}_hist', ('macd_hist', _fast, _slow, _signal))
+register_indicator('rsi', ('rsi', 14))
+register_indicator('rsi_wilder', ('rsi_wilder', 14))
+register_indicator('bollinger_mid', ('sma', 20))
+register_indicator('bollinger_upper', ('bollinger_upper', 20, 2.0))
+register_indicator('bollinger_lower', ('bollinger_lower', 20, 2.0))
+register_indicator('atr', ('atr', 14))
+register_indicator('stoch_k', ('stoch_k', 14))
+register_indicator('stoch_d', ('stoch_d', 14, 3))
+
+# Define IndicatorEvaluator class: computes requested nodes on demand over one (dates x metals) price block.
+# Every node is computed at most once and kept, so outputs sharing inputs (MACD sets sharing an EMA span,
+# the Bollinger bands sharing an SMA) reuse them, and nodes no requested output depends on are never computed.
+# Without high/low blocks (only closes are stored) both default to the close, so the true range reduces to
+# the absolute close-to-close change and the stochastic to the close's position in its rolling range.
+class IndicatorEvaluator:
+    def __init__(self, close: pd.DataFrame, high: Optional[pd.DataFrame] = None, low: Optional[pd.DataFrame] = None):
+        close = close.astype('float64', copy=False)
+        self._values: Dict[NodeKey, pd.DataFrame] = {
+            ('close',): close,
+            ('high',): close if high is None else high.astype('float64', copy=False),
+            ('low',): close if low is None else low.astype('float64', copy=False),
+        }
+        # Nodes in the order they were computed, for inspection
+        self.computed: List[NodeKey] = []
+
+    def get(self, key: Union[str, NodeKey]) -> pd.DataFrame:
+        key = resolve(key)
+        if key in self._values:
+            return self._values[key]
+        node_type = NODE_TYPES[key[0]]
+        params = key[1:]
+        inputs = [self.get(dependency) for dependency in node_type.inputs(*params)]
+        value = node_type.compute(*inputs, *params)
+        self._values[key] = value
+        self.computed.append(key)
+        return value
+
+    # Function to evaluate named outputs (or node keys) into one frame with (name, metal) MultiIndex columns
+    def evaluate(self, names: Iterable[Union[str, NodeKey]]) -> pd.DataFrame:
+        return pd.concat({_label(name): self.get(name) for name in names}, axis=1)
+
+# Function to turn an output name into its node key; keys pass through after their type is checked
+def resolve(name: Union[str, NodeKey]) -> NodeKey:
+    if isinstance(name, str):
+        if name not in INDICATORS:
+            raise KeyError(f"unknown indicator {name!r}, expected one of {sorted(INDICATORS)}")
+        return INDICATORS[name]
+    key = tuple(name)
+    if key[0] not in NODE_TYPES and key[0] not in SOURCES:
+        raise KeyError(f"unknown node type {key[0]!r} in {key}")
+    return key
+
+def _label(name: Union[str, NodeKey]) -> str:
+    return name if isinstance(name, str) else '_'.join(str(part) for part in name)
+
+# Function to compute only the requested indicators for every column of a (dates x metals) price block.
+# Names come from INDICATORS; node keys such as ('macd_line', 8, 21) request other parameter sets directly.
+#   calculate_indicators(prices, ['rsi'])                                   # RSI only
+#   calculate_indicators(prices, ['macd_fast', 'macd_medium', 'macd_slow', 'bollinger_upper', 'bollinger_lower'])
+def calculate_indicators(prices: pd.DataFrame, names: Iterable[Union[str, NodeKey]] = ('price', 'macd', 'macd_signal', 'rsi'),
+                         high: Optional[pd.DataFrame] = None, low: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    return IndicatorEvaluator(prices, high, low).evaluate(names)
@@ -0,0 +1,418 @@
+import argparse
+import asyncio
+import io
+import json
+import logging
+import signal
+from collections import OrderedDict
+from contextlib import AsyncExitStack, aclosing
+from datetime import date
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+from sqlalchemy import String, func, inspect, select, text, type_coerce
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from bulk_insert import FIELDS
+from engine_factory import SQLiteProfile, create_sqlite_engines
+from migrate_schema import is_legacy_schema
+from models import Metal, MetalPrice
+from query_cache import QueryCache
+from series_reader import lookup_metal_ids
+
+# orjson is optional: it encodes rows several times faster than the json module, which is used without it
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# pyarrow is optional: without it format=arrow is refused and NDJSON / JSON are served
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+logger = logging.getLogger(__name__)
+
+HAVE_ARROW = pyarrow is not None
+# Rows fetched per partition of a streamed /series response, each sent as one chunk
+DEFAULT_STREAM_ROWS = 5000
+# Seconds a /latest response is served from the cache when no watched write invalidated it first
+DEFAULT_LATEST_TTL = 5.0
+# Encoded /latest bodies kept next to the cached rows
+MAX_CACHED_BODIES = 256
+# Longest request line or header line accepted, in bytes
+MAX_LINE = 16 * 1024
+
+CONTENT_TYPES = {'ndjson': 'application/x-ndjson', 'json': 'application/json',
+                 'arrow': 'application/vnd.apache.arrow.stream'}
+_FORMATS_BY_TYPE = {content_type: fmt for fmt, content_type in CONTENT_TYPES.items()}
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 406: 'Not Acceptable',
+            500: 'Internal Server Error'}
+
+if orjson is not None:
+    def dumps(value) -> bytes:
+        return orjson.dumps(value)
+else:
+    def dumps(value) -> bytes:
+        return json.dumps(value, separators=(',', ':')).encode()
+
+# Define RequestError class: a request the service refuses, answered with `status` and a JSON error body
+class RequestError(ValueError):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+# Function to read a query string's list parameter, given repeated (metal=A&metal=B) or comma-separated (metal=A,B)
+def list_param(params: Dict[str, List[str]], name: str) -> List[str]:
+    return [item.strip() for value in params.get(name, []) for item in value.split(',') if item.strip()]
+
+def date_param(params: Dict[str, List[str]], name: str) -> Optional[date]:
+    values = params.get(name)
+    if not values:
+        return None
+    try:
+        return date.fromisoformat(values[-1])
+    except ValueError:
+        raise RequestError(400, f"{name} must be an ISO date (YYYY-MM-DD), got {values[-1]!r}") from None
+
+def fields_param(params: Dict[str, List[str]]) -> List[str]:
+    fields = list(dict.fromkeys(list_param(params, 'fields'))) or list(FIELDS)
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        raise RequestError(400, f"unknown fields {unknown}, expected some of {FIELDS}")
+    return fields
+
+# Function to pick the response format: the format parameter, else the first known type in Accept, else NDJSON
+def format_param(params: Dict[str, List[str]], accept: str) -> str:
+    fmt = params.get('format', [None])[-1]
+    if fmt is None:
+        accepted = [item.split(';')[0].strip() for item in accept.split(',')]
+        fmt = next((_FORMATS_BY_TYPE[item] for item in accepted if item in _FORMATS_BY_TYPE), 'ndjson')
+    if fmt not in CONTENT_TYPES:
+        raise RequestError(400, f"unknown format {fmt!r}, expected one of {sorted(CONTENT_TYPES)}")
+    if fmt == 'arrow' and not HAVE_ARROW:
+        raise RequestError(406, "format=arrow needs pyarrow installed on the server")
+    return fmt
+
+# Function to frame one piece of a chunked (Transfer-Encoding: chunked) body
+def chunk(data: bytes) -> bytes:
+    return b'%x\r\n%s\r\n' % (len(data), data)
+
+# Function to encode rows as NDJSON, one object per line, keys being the selected column names
+def ndjson_lines(keys: Sequence[str], rows: Sequence[tuple]) -> bytes:
+    return b''.join(dumps(dict(zip(keys, row))) + b'\n' for row in rows)
+
+# Function to encode partitions of (metal, date text, *fields) rows as an Arrow IPC stream: the schema first,
+# then one record batch per partition. NULL values come out as NaN, as in read_series_arrays.
+async def arrow_stream(partitions: AsyncIterator[List[tuple]], fields: Sequence[str]) -> AsyncIterator[bytes]:
+    schema = pyarrow.schema([('metal', pyarrow.string()), ('date', pyarrow.date32())]
+                            + [(field, pyarrow.float64()) for field in fields])
+    sink = io.BytesIO()
+
+    def take() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    async with aclosing(partitions) as parts:
+        with pyarrow.ipc.new_stream(sink, schema) as writer:
+            yield take()
+            async for rows in parts:
+                columns = list(zip(*rows))
+                arrays = [pyarrow.array(columns[0], type=pyarrow.string()),
+                          pyarrow.array(np.array(columns[1], dtype='datetime64[D]'))]
+                arrays += [pyarrow.array(np.array(column, dtype=np.float64)) for column in columns[2:]]
+                writer.write_batch(pyarrow.record_batch(arrays, schema=schema))
+                yield take()
+        # End-of-stream marker written on close
+        yield take()
+
+Body = Union[bytes, AsyncIterator[bytes]]
+
+# Define IndicatorService class: a long-running HTTP/1.1 JSON service over the metal_prices database.
+#   GET /series?metal=&start=&end=&fields=&format=   rows of the metals in a date range, metal by metal in date
+#                                                    order, streamed as chunked NDJSON (default) or Arrow IPC,
+#                                                    or as one JSON array with format=json
+#   GET /latest?metal=&fields=                       the newest bar of each metal, served from a cache
+#   GET /stats                                       request, cache and pool counters
+# metal takes repeated or comma-separated names (none: every metal); fields defaults to all of FIELDS.
+# Reads go through async_sessionmaker on the query-only reader engine, whose pool is opened and warmed at
+# start. /latest results sit in a QueryCache together with their encoded body: writes through this
+# service's writer engine invalidate them at once, writes from other processes show after latest_ttl seconds.
+class IndicatorService:
+    def __init__(self, db_file: str, read_pool_size: int = 5, read_max_overflow: int = 5,
+                 latest_ttl: Optional[float] = DEFAULT_LATEST_TTL, stream_rows: int = DEFAULT_STREAM_ROWS,
+                 profile: Optional[SQLiteProfile] = None):
+        self.db_file = db_file
+        self.engines = create_sqlite_engines(db_file, profile, read_pool_size, read_max_overflow)
+        self.session_factory = async_sessionmaker(bind=self.engines.reader, expire_on_commit=False)
+        self.stream_rows = stream_rows
+        self.latest_cache = QueryCache(max_bytes=16 * 1024 * 1024, ttl=latest_ttl) if latest_ttl else None
+        if self.latest_cache is not None:
+            self.latest_cache.watch(self.engines.writer)
+        self.routes = {'/series': self.series, '/latest': self.latest, '/stats': self.stats}
+        self.requests = 0
+        self.errors = 0
+        self._bodies: 'OrderedDict[Tuple, Tuple[List, bytes]]' = OrderedDict()
+        self._pending: Dict[Tuple, asyncio.Future] = {}
+        self._metal_ids: Dict[str, int] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    # Open every pooled reader connection up front, each running a query, so the first requests find
+    # connections with their pragmas applied and the indexes in the page cache
+    async def warm_pool(self) -> int:
+        size = self.engines.reader.pool.size()
+        async with AsyncExitStack() as stack:
+            for _ in range(size):
+                conn = await stack.enter_async_context(self.engines.reader.connect())
+                await conn.execute(text('SELECT metal_id, max(date) FROM metal_prices GROUP BY metal_id'))
+        async with self.engines.reader.connect() as conn:
+            self._metal_ids.update((await conn.execute(text('SELECT name, id FROM metals'))).all())
+        return size
+
+    # Refuse a database without the normalized schema: an empty one, or one still holding the earlier
+    # questions' metal_prices table with the metal name on every row
+    async def check_schema(self) -> None:
+        async with self.engines.reader.connect() as conn:
+            tables = set(await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_table_names()))
+            legacy = await conn.run_sync(is_legacy_schema)
+        if legacy or not {'metals', 'metal_prices'} <= tables:
+            raise ValueError(f"{self.db_file}: {'legacy' if legacy else 'no'} metal_prices schema, "
+                             f"run migrate_schema.py on it first")
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8080) -> None:
+        await self.check_schema()
+        await self.warm_pool()
+        self._server = await asyncio.start_server(self._handle, host, port, limit=MAX_LINE)
+
+    @property
+    def address(self) -> Tuple[str, int]:
+        return self._server.sockets[0].getsockname()[:2]
+
+    async def serve_forever(self) -> None:
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        await self.engines.dispose()
+
+    # Ids of the requested metals, None for every metal; unknown names are a 404. The mapping is kept, so
+    # only names not seen before cost a query.
+    def _resolve_metals(self, conn, names: Sequence[str]) -> List[int]:
+        self._metal_ids.update(lookup_metal_ids(conn, [name for name in names if name not in self._metal_ids]))
+        unknown = [name for name in names if name not in self._metal_ids]
+        if unknown:
+            raise RequestError(404, f"unknown metals {unknown}")
+        return sorted({self._metal_ids[name] for name in names})
+
+    async def metal_ids(self, names: Sequence[str]) -> Optional[List[int]]:
+        if not names:
+            return None
+        if all(name in self._metal_ids for name in names):
+            return sorted({self._metal_ids[name] for name in names})
+        async with self.session_factory() as session:
+            return await session.run_sync(lambda s: self._resolve_metals(s.connection(), names))
+
+    # Rows of (metal name, date, *fields) for the selected metals, the date as its stored ISO text
+    @staticmethod
+    def _select(fields: Sequence[str], metal_ids: Optional[List[int]], on=None):
+        metals, table = Metal.__table__, MetalPrice.__table__
+        joined = table.c.metal_id == metals.c.id
+        statement = (select(metals.c.name, type_coerce(table.c.date, String), *[table.c[field] for field in fields])
+                     .select_from(metals.join(table, joined if on is None else joined & on)))
+        return statement if metal_ids is None else statement.where(table.c.metal_id.in_(metal_ids))
+
+    async def series(self, params: Dict[str, List[str]], accept: str) -> Tuple[str, Body]:
+        fields, fmt = fields_param(params), format_param(params, accept)
+        start, end = date_param(params, 'start'), date_param(params, 'end')
+        metal_ids = await self.metal_ids(list_param(params, 'metal'))
+
+        # Metal by metal in date order: the order of the (metal_id, date) index, so SQLite never sorts
+        table = MetalPrice.__table__
+        statement = self._select(fields, metal_ids).order_by(table.c.metal_id, table.c.date)
+        if start is not None:
+            statement = statement.where(table.c.date >= start)
+        if end is not None:
+            statement = statement.where(table.c.date <= end)
+        keys = ['metal', 'date'] + fields
+
+        if fmt == 'json':
+            async with self.session_factory() as session:
+                rows = (await session.execute(statement)).all()
+            return CONTENT_TYPES[fmt], self._encode(keys, rows)
+
+        async def partitions() -> AsyncIterator[List[tuple]]:
+            async with self.session_factory() as session:
+                result = await session.stream(statement.execution_options(yield_per=self.stream_rows))
+                async for partition in result.partitions():
+                    yield partition
+
+        async def ndjson() -> AsyncIterator[bytes]:
+            async with aclosing(partitions()) as parts:
+                async for rows in parts:
+                    yield ndjson_lines(keys, rows)
+
+        return CONTENT_TYPES[fmt], ndjson() if fmt == 'ndjson' else arrow_stream(partitions(), fields)
+
+    async def latest(self, params: Dict[str, List[str]], accept: str) -> Tuple[str, Body]:
+        fields = fields_param(params)
+        metal_ids = await self.metal_ids(list_param(params, 'metal'))
+
+        # Driven from metals (hence the order on metals.id): each metal's newest date is one probe of the
+        # (metal_id, date) index, then one lookup of that bar. Driven from metal_prices, the max would run per row.
+        metals, table, later = Metal.__table__, MetalPrice.__table__, MetalPrice.__table__.alias('later')
+        newest = select(func.max(later.c.date)).where(later.c.metal_id == metals.c.id).scalar_subquery()
+        statement = self._select(fields, metal_ids, table.c.date == newest).order_by(metals.c.id)
+        keys = ['metal', 'date'] + fields
+
+        if self.latest_cache is None:
+            async with self.session_factory() as session:
+                rows = (await session.execute(statement)).all()
+            return CONTENT_TYPES['json'], self._encode(keys, rows)
+
+        # Concurrent requests for the same bars share one lookup, so an expired entry is read back once
+        key = QueryCache.key(statement)
+        task = self._pending.get(key)
+        if task is None:
+            task = self._pending[key] = asyncio.ensure_future(self._cached_latest(key, statement, keys))
+            task.add_done_callback(lambda _: self._pending.pop(key, None))
+        return CONTENT_TYPES['json'], await asyncio.shield(task)
+
+    def _encode(self, keys: Sequence[str], rows) -> bytes:
+        return dumps([dict(zip(keys, row)) for row in rows])
+
+    # The encoded body is reused for as long as the cache hands back the very same rows
+    async def _cached_latest(self, key: Tuple, statement, keys: Sequence[str]) -> bytes:
+        rows = await self.latest_cache.fetch(self.session_factory, statement)
+        cached = self._bodies.get(key)
+        if cached is not None and cached[0] is rows:
+            self._bodies.move_to_end(key)
+            return cached[1]
+        body = self._encode(keys, rows)
+        self._bodies[key] = (rows, body)
+        if len(self._bodies) > MAX_CACHED_BODIES:
+            self._bodies.popitem(last=False)
+        return body
+
+    async def stats(self, params: Dict[str, List[str]], accept: str) -> Tuple[str, Body]:
+        stats = {'requests': self.requests, 'errors': self.errors, 'pool': self.engines.reader.pool.status(),
+                 'latest_cache': self.latest_cache.stats.__dict__ if self.latest_cache else None}
+        return CONTENT_TYPES['json'], dumps(stats)
+
+    # One connection: requests answered in turn for as long as the client keeps it alive
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                parts = request_line.decode('latin-1').split()
+                version = parts[2] if len(parts) == 3 else 'HTTP/1.0'
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+                await self._respond(parts, headers, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, parts: List[str], headers: Dict[str, str], writer: asyncio.StreamWriter,
+                       keep_alive: bool) -> None:
+        self.requests += 1
+        try:
+            if len(parts) != 3:
+                raise RequestError(400, 'malformed request line')
+            if parts[0] != 'GET':
+                raise RequestError(405, f"method {parts[0]} not allowed, only GET")
+            url = urlsplit(parts[1])
+            handler = self.routes.get(url.path)
+            if handler is None:
+                raise RequestError(404, f"no such endpoint {url.path}, expected one of {sorted(self.routes)}")
+            content_type, body = await handler(parse_qs(url.query), headers.get('accept', ''))
+        except RequestError as exc:
+            self.errors += 1
+            content_type, body, status = CONTENT_TYPES['json'], dumps({'error': str(exc)}), exc.status
+        except Exception:
+            logger.exception('request %s failed', ' '.join(parts))
+            self.errors += 1
+            content_type, body, status = CONTENT_TYPES['json'], dumps({'error': 'internal error'}), 500
+        else:
+            status = 200
+
+        head = [f'HTTP/1.1 {status} {_REASONS[status]}', f'Content-Type: {content_type}',
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if isinstance(body, bytes):
+            head.append(f'Content-Length: {len(body)}')
+            writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+            await writer.drain()
+            return
+
+        # Streamed: one chunk per partition, waiting on drain so a slow client holds back the reads. A failure
+        # past the headers can only cut the stream short: the connection is closed without the final chunk.
+        head.append('Transfer-Encoding: chunked')
+        writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1'))
+        async with aclosing(body) as pieces:
+            try:
+                async for piece in pieces:
+                    if piece:
+                        writer.write(chunk(piece))
+                        await writer.drain()
+            except ConnectionError:
+                raise
+            except Exception as exc:
+                logger.exception('stream of %s failed', ' '.join(parts))
+                self.errors += 1
+                raise ConnectionAbortedError(str(exc)) from exc
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+async def serve(db_file: str, host: str, port: int, read_pool_size: int, latest_ttl: float, stream_rows: int) -> None:
+    service = IndicatorService(db_file, read_pool_size=read_pool_size, latest_ttl=latest_ttl or None,
+                               stream_rows=stream_rows)
+    try:
+        await service.start(host, port)
+    except BaseException:
+        await service.close()
+        raise
+    host, port = service.address
+    print(f"Serving {db_file} on http://{host}:{port} (pool {read_pool_size}, latest cache "
+          f"{f'{latest_ttl:g}s' if latest_ttl else 'off'}, arrow {'on' if HAVE_ARROW else 'off'})", flush=True)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    server = asyncio.create_task(service.serve_forever())
+    await stop.wait()
+    server.cancel()
+    await service.close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='HTTP/JSON query service for stored prices and indicators')
+    parser.add_argument('--db', default='metal_commodity_Q5.db')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080, help='0 picks a free port')
+    parser.add_argument('--pool-size', type=int, default=5, help='pooled read connections kept open')
+    parser.add_argument('--latest-ttl', type=float, default=DEFAULT_LATEST_TTL,
+                        help='seconds a /latest response is cached (0: no cache)')
+    parser.add_argument('--stream-rows', type=int, default=DEFAULT_STREAM_ROWS, help='rows per streamed chunk')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.db, args.host, args.port, args.pool_size, args.latest_ttl, args.stream_rows))
+    except ValueError as exc:
+        parser.exit(1, f"{exc}\n")
@@ -0,0 +1,60 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import String, Table, select, text, type_coerce
+from sqlalchemy.engine import Connection
+
+from indicators import calculate_macd, calculate_rsi
+
+INDICATOR_COLUMNS = ['macd', 'macd_signal', 'rsi']
+
+# Function to compute MACD/RSI for one metal's date-ordered prices
+def _indicator_frame(group: pd.DataFrame) -> pd.DataFrame:
+    prices = group['price'].astype(np.float64).reset_index(drop=True)
+    macd_line, macd_signal = calculate_macd(prices)
+    rsi = calculate_rsi(prices)
+    return pd.DataFrame({'metal': group['metal'].to_numpy(), 'date': group['date'].to_numpy(),
+                         'macd': macd_line.to_numpy(), 'macd_signal': macd_signal.to_numpy(), 'rsi': rsi.to_numpy()})
+
+# Function to recompute the indicator columns of every stored row in place, set-based:
+#   1. one ordered scan loads each metal's price series once,
+#   2. indicators are computed vectorized per metal,
+#   3. the results go into a temp table keyed on (metal, date) with one executemany,
+#   4. a single UPDATE ... FROM joins it back onto the table (SQLite 3.33+).
+# `table` is any metal_prices-like table with date/price/macd/macd_signal/rsi columns; metal_column names the
+# column identifying the metal ('metal' in the original single-table schema, 'metal_id' in the normalized one).
+# Where a (metal, date) pair is stored more than once the latest row's price is used, and every copy is updated.
+# With an AsyncConnection use `await conn.run_sync(recompute_indicators, table)`.
+def recompute_indicators(conn: Connection, table: Table, metal_column: str = 'metal') -> int:
+    metal = table.c[metal_column]
+    # The date is read back as its stored text so the join matches it exactly
+    rows = conn.execute(select(metal, type_coerce(table.c.date, String), table.c.price)
+                        .where(metal.is_not(None), table.c.date.is_not(None))
+                        .order_by(metal, table.c.date, table.c.id)).all()
+    if not rows:
+        return 0
+    prices = pd.DataFrame(rows, columns=['metal', 'date', 'price']).drop_duplicates(['metal', 'date'], keep='last')
+    frames: List[pd.DataFrame] = [_indicator_frame(group) for _, group in prices.groupby('metal', sort=False)]
+    updates = pd.concat(frames, ignore_index=True)
+    # SQLite has no NaN, store missing values (warm-up period) as NULL
+    params = updates.astype(object).where(updates.notna(), None).itertuples(index=False, name=None)
+
+    # Same column types as the target, so both join columns compare with the same affinity and the
+    # (metal, date) primary key serves the lookup; mismatched affinities limit it to the metal prefix
+    metal_type = metal.type.compile(dialect=conn.dialect)
+    date_type = table.c.date.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"CREATE TEMP TABLE indicator_update (metal {metal_type}, date {date_type}, "
+                      f"macd REAL, macd_signal REAL, rsi REAL, PRIMARY KEY (metal, date))"))
+    try:
+        conn.exec_driver_sql("INSERT INTO indicator_update (metal, date, macd, macd_signal, rsi) VALUES (?, ?, ?, ?, ?)",
+                             list(params))
+        result = conn.execute(text(f"""
+            UPDATE {table.name}
+            SET macd = u.macd, macd_signal = u.macd_signal, rsi = u.rsi
+            FROM indicator_update AS u
+            WHERE {table.name}.{metal_column} = u.metal AND {table.name}.date = u.date
+        """))
+        return result.rowcount
+    finally:
+        conn.execute(text("DROP TABLE temp.indicator_update"))
@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from typing import Tuple
+
+from array_store import PriceStore
+from indicator_registry import IndicatorEvaluator
+
+# Function to calculate MACD for a series of prices
+def calculate_macd(prices: pd.Series, slow_period: int = 26, fast_period: int = 12, signal_period: int = 9) -> Tuple[pd.Series, pd.Series]:
+    slow_ema = prices.ewm(span=slow_period).mean()
+    fast_ema = prices.ewm(span=fast_period).mean()
+    macd_line = fast_ema - slow_ema
+    signal_line = macd_line.ewm(span=signal_period).mean()
+    return macd_line, signal_line
+
+# Function to calculate RSI for a series of prices
+def calculate_rsi(prices: pd.Series, window: int = 14) -> pd.Series:
+    delta = prices.diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
+    rs = gain / loss
+    rsi = 100 - (100 / (1 + rs))
+    return rsi
+
+# Function to calculate price, MACD, MACD signal and RSI for every column of a (dates x metals) price block at once.
+# Returns one frame with (field, metal) MultiIndex columns, built in a single concat instead of column-by-column inserts.
+# The fields are evaluated through the indicator registry; use indicator_registry.calculate_indicators for others.
+def calculate_indicator_block(prices: pd.DataFrame, slow_period: int = 26, fast_period: int = 12, signal_period: int = 9, window: int = 14) -> pd.DataFrame:
+    evaluator = IndicatorEvaluator(prices)
+    # DataFrame-wide ewm/rolling run the same kernels as the per-Series calls, one pass per field
+    return pd.concat({'price': evaluator.get(('close',)),
+                      'macd': evaluator.get(('macd_line', fast_period, slow_period)),
+                      'macd_signal': evaluator.get(('macd_signal', fast_period, slow_period, signal_period)),
+                      'rsi': evaluator.get(('rsi', window))}, axis=1)
+
+# Function to flatten an indicator block into the wide layout used by populate_sql_table ('Dates', metal, f'{metal}_macd', ...)
+def to_wide_frame(dates: pd.Series, block: pd.DataFrame) -> pd.DataFrame:
+    metals = block['price'].columns
+    suffixed = {field: block[field].add_suffix(f'_{field}') for field in ('macd', 'macd_signal', 'rsi')}
+    columns = [f'{metal}_{field}' for metal in metals for field in ('macd', 'macd_signal', 'rsi')]
+    indicators = pd.concat(suffixed.values(), axis=1)[columns]
+    return pd.concat([dates.reset_index(drop=True), block['price'].reset_index(drop=True), indicators.reset_index(drop=True)], axis=1)
+
+# Function to read CSV file and calculate MACD and RSI
+def calculate_macd_rsi(csv_file: str) -> Tuple[pd.DataFrame, pd.Index]:
+    # Read CSV file into DataFrame
+    df = pd.read_csv(csv_file)
+
+    # Convert 'Dates' column to datetime
+    df['Dates'] = pd.to_datetime(df['Dates'])
+
+    # Extract metal column names
+    metals = df.columns[1:]
+
+    # Calculate MACD, RSI for all metal columns in one pass
+    block = calculate_indicator_block(df[metals])
+    df = to_wide_frame(df['Dates'], block)
+
+    return (df, metals)
+
+# Function to read CSV file and calculate MACD and RSI into a PriceStore: the same values as calculate_macd_rsi
+# held as one matrix per field instead of a wide frame (float32 halves it again, for analytics and charts)
+def calculate_macd_rsi_store(csv_file: str, dtype=np.float64) -> PriceStore:
+    df = pd.read_csv(csv_file)
+    df['Dates'] = pd.to_datetime(df['Dates'])
+    return PriceStore.from_frame(df, dtype=dtype).with_indicators()
@@ -0,0 +1,133 @@
+import inspect
+import json
+import logging
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from functools import wraps
+from typing import List, Optional
+
+from sqlalchemy import event
+
+# Structured records go to their own logger so the human-readable log stays unchanged
+metrics_logger = logging.getLogger('sql_metrics')
+
+# Operation currently being timed by log_sql, carried across awaits (and into SQLAlchemy's greenlets)
+_current_operation: ContextVar[Optional['OperationStats']] = ContextVar('current_sql_operation', default=None)
+
+# Define OperationStats class holding the timings of one decorated call
+@dataclass
+class OperationStats:
+    name: str
+    is_async: bool
+    parent: Optional['OperationStats'] = None
+    wall_time: float = 0.0
+    cpu_time: float = 0.0
+    rows: int = 0
+    statement_count: int = 0
+    statement_time: float = 0.0
+    statements: List[dict] = field(default_factory=list)
+
+    def add_statement(self, record: dict) -> None:
+        self.statement_count += 1
+        self.statement_time += record['elapsed']
+        self.rows += max(record['rows'], 0)
+        self.statements.append(record)
+
+    def to_record(self) -> dict:
+        return {
+            'type': 'operation',
+            'timestamp': datetime.now().isoformat(timespec='milliseconds'),
+            'operation': self.name,
+            'async': self.is_async,
+            'wall_time': round(self.wall_time, 6),
+            'cpu_time': round(self.cpu_time, 6),
+            'rows': self.rows,
+            'statement_count': self.statement_count,
+            'statement_time': round(self.statement_time, 6),
+            'statements': self.statements,
+        }
+
+# Function to send JSON-lines records to a file, e.g. configure_jsonl('sql_metrics_Q5.jsonl')
+def configure_jsonl(path: str) -> logging.Handler:
+    handler = logging.FileHandler(path)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    metrics_logger.addHandler(handler)
+    metrics_logger.setLevel(logging.INFO)
+    metrics_logger.propagate = False
+    return handler
+
+def _emit(record: dict) -> None:
+    metrics_logger.info(json.dumps(record, default=str))
+
+# Function to hook cursor execution events on a sync or async engine and time every statement
+def instrument_engine(engine, max_statement_chars: int = 200) -> None:
+    sync_engine = getattr(engine, 'sync_engine', engine)
+    if sync_engine.__dict__.get('_sql_instrumented'):
+        return
+    sync_engine._sql_instrumented = True
+
+    @event.listens_for(sync_engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        elapsed = time.perf_counter() - conn.info['query_start_time'].pop()
+        record = {
+            'statement': ' '.join(statement.split())[:max_statement_chars],
+            'executemany': executemany,
+            'batch_size': len(parameters) if executemany else 1,
+            'rows': cursor.rowcount,
+            'elapsed': round(elapsed, 6),
+        }
+
+        operation = _current_operation.get()
+        if operation is not None:
+            operation.add_statement(record)
+        else:
+            _emit({'type': 'statement', 'timestamp': datetime.now().isoformat(timespec='milliseconds'), **record})
+
+def _start(func, is_async: bool):
+    operation = OperationStats(name=func.__name__, is_async=is_async, parent=_current_operation.get())
+    token = _current_operation.set(operation)
+    return operation, token, time.perf_counter(), time.process_time()
+
+def _finish(operation: OperationStats, token, wall_start: float, cpu_start: float) -> None:
+    operation.wall_time = time.perf_counter() - wall_start
+    # process_time covers the aiosqlite worker thread too, but also any task running concurrently
+    operation.cpu_time = time.process_time() - cpu_start
+    _current_operation.reset(token)
+
+    # Roll statement totals up into the enclosing operation, if any
+    if operation.parent is not None:
+        operation.parent.rows += operation.rows
+        operation.parent.statement_count += operation.statement_count
+        operation.parent.statement_time += operation.statement_time
+
+    mode = 'asynchronous' if operation.is_async else 'synchronous'
+    logging.info(f"SQL operation {operation.name} executed in {operation.wall_time} seconds ({mode}), "
+                 f"cpu {operation.cpu_time:.6f} s, {operation.rows} rows, {operation.statement_count} statements")
+    _emit(operation.to_record())
+
+# Define decorator to log SQL operations; coroutine functions are awaited so the timing covers the real work
+def log_sql(func):
+    if inspect.iscoroutinefunction(func):
+        @wraps(func)    # Preserve metadata of original function, helps debugging
+        async def async_wrapper(*args, **kwargs):
+            operation, token, wall_start, cpu_start = _start(func, is_async=True)
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _finish(operation, token, wall_start, cpu_start)
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        operation, token, wall_start, cpu_start = _start(func, is_async=False)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _finish(operation, token, wall_start, cpu_start)
+    return wrapper
@@ -0,0 +1,114 @@
+import csv
+import hashlib
+import json
+import os
+import re
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+MARKET_DATA_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'data', 'MarketData.csv')
+HEADER_ROWS = 7     # Start Date, End Date, blank, description, ticker, field description, field mnemonic
+DATE_FORMAT = '%d/%m/%Y'
+CACHE_VERSION = 1
+
+# Define MarketDataHeader class holding the metadata block of the Bloomberg-style export
+@dataclass
+class MarketDataHeader:
+    start_date: str
+    end_date: str
+    columns: List[str]
+    descriptions: List[str]
+    tickers: List[str]
+    fields: List[str]
+
+# Function to derive a short column name, e.g. 'LME COPPER    3MO ($)' -> 'COPPER', 'CL1 Comdty' -> 'CL'
+def _short_name(description: str, ticker: str) -> str:
+    words = description.split()
+    if len(words) > 1 and words[0] == 'LME':
+        return words[1]
+    return re.sub(r'\d+$', '', ticker.split()[0])
+
+# Function to parse the header block of the export into column metadata
+def read_market_data_header(csv_file: str = MARKET_DATA_CSV) -> MarketDataHeader:
+    with open(csv_file, newline='') as f:
+        rows = [row for _, row in zip(range(HEADER_ROWS), csv.reader(f))]
+
+    start_date = datetime.strptime(rows[0][1], DATE_FORMAT).date().isoformat()
+    end_date = datetime.strptime(rows[1][1], DATE_FORMAT).date().isoformat()
+    descriptions = [cell.strip() for cell in rows[3][1:]]
+    tickers = [cell.strip() for cell in rows[4][1:]]
+    fields = [cell.strip() for cell in rows[6][1:]]
+    columns = [_short_name(description, ticker) for description, ticker in zip(descriptions, tickers)]
+    return MarketDataHeader(start_date, end_date, columns, descriptions, tickers, fields)
+
+# Function to parse the CSV body with an explicit date format and typed float columns
+def parse_market_data(csv_file: str = MARKET_DATA_CSV, dtype: str = 'float64') -> pd.DataFrame:
+    header = read_market_data_header(csv_file)
+    df = pd.read_csv(csv_file, skiprows=HEADER_ROWS, header=None, names=['Dates'] + header.columns,
+                     dtype={column: dtype for column in header.columns})
+    df['Dates'] = pd.to_datetime(df['Dates'], format=DATE_FORMAT).astype('datetime64[ns]')
+
+    # The export is already in date order; only sort when it is not
+    if not df['Dates'].is_monotonic_increasing:
+        df = df.sort_values('Dates', ignore_index=True)
+    return df
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _cache_paths(csv_file: str, cache_dir: Optional[str], dtype: str):
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(csv_file)), '.cache')
+    stem = f"{os.path.splitext(os.path.basename(csv_file))[0]}.{dtype}"
+    base = os.path.join(cache_dir, stem)
+    return cache_dir, base + '.dates.npy', base + '.prices.npy', base + '.json'
+
+# Function to load the market data, reusing a binary .npy cache until the CSV changes.
+# The cache is keyed on the CSV's mtime and size; when those differ the content hash decides.
+def load_market_data(csv_file: str = MARKET_DATA_CSV, dtype: str = 'float64', cache_dir: Optional[str] = None,
+                     use_cache: bool = True, mmap: bool = False) -> pd.DataFrame:
+    if not use_cache:
+        return parse_market_data(csv_file, dtype)
+
+    cache_dir, dates_path, prices_path, meta_path = _cache_paths(csv_file, cache_dir, dtype)
+    stat = os.stat(csv_file)
+    meta = None
+    if os.path.exists(meta_path) and os.path.exists(dates_path) and os.path.exists(prices_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        if meta.get('version') != CACHE_VERSION:
+            meta = None
+        elif (meta['mtime_ns'], meta['size']) != (stat.st_mtime_ns, stat.st_size):
+            # Touched but possibly unchanged (e.g. a fresh checkout): compare content before reparsing
+            if meta['sha256'] == _file_sha256(csv_file):
+                meta.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+                with open(meta_path, 'w') as f:
+                    json.dump(meta, f, indent=2)
+            else:
+                meta = None
+
+    if meta is None:
+        df = parse_market_data(csv_file, dtype)
+        header = read_market_data_header(csv_file)
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(dates_path, df['Dates'].to_numpy(dtype='datetime64[D]'))
+        np.save(prices_path, np.ascontiguousarray(df[header.columns].to_numpy(dtype=dtype)))
+        meta = {'version': CACHE_VERSION, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                'sha256': _file_sha256(csv_file), 'dtype': dtype, 'header': asdict(header)}
+        with open(meta_path, 'w') as f:
+            json.dump(meta, f, indent=2)
+        return df
+
+    mmap_mode = 'r' if mmap else None
+    dates = np.load(dates_path, mmap_mode=mmap_mode)
+    prices = np.load(prices_path, mmap_mode=mmap_mode)
+    df = pd.DataFrame(prices, columns=meta['header']['columns'], copy=False)
+    df.insert(0, 'Dates', dates.astype('datetime64[ns]'))
+    return df
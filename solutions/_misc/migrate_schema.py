@@ -0,0 +1,86 @@
+import argparse
+import logging
+import shutil
+from typing import Dict
+
+from sqlalchemy import create_engine, inspect, select, text
+from sqlalchemy.engine import Connection
+
+from models import Base, Metal, MetalPrice, PriceRollup, COVERING_INDEXES
+from rollups import rebuild_rollups
+
+# Function to check whether metal_prices still has the original single-table layout (metal stored as text)
+def is_legacy_schema(conn: Connection) -> bool:
+    inspector = inspect(conn)
+    if not inspector.has_table('metal_prices'):
+        return False
+    return 'metal' in {column['name'] for column in inspector.get_columns('metal_prices')}
+
+# Function to move a legacy metal_prices table to the normalized schema, keeping the newest row per (metal, date)
+def _migrate_legacy_table(conn: Connection) -> Dict[str, int]:
+    total = conn.execute(text("SELECT COUNT(*) FROM metal_prices")).scalar_one()
+
+    conn.execute(text("ALTER TABLE metal_prices RENAME TO metal_prices_legacy"))
+    # SQLite keeps index names when renaming, so drop any that would clash with the new table's
+    for (name,) in conn.execute(text("SELECT name FROM sqlite_master WHERE type = 'index' "
+                                     "AND tbl_name = 'metal_prices_legacy' AND sql IS NOT NULL")).all():
+        conn.execute(text(f'DROP INDEX "{name}"'))
+
+    Metal.__table__.create(conn, checkfirst=True)
+    MetalPrice.__table__.create(conn)
+    conn.execute(text("INSERT OR IGNORE INTO metals (name) "
+                      "SELECT DISTINCT metal FROM metal_prices_legacy WHERE metal IS NOT NULL"))
+    # Re-runs of the old pipeline appended whole copies of the history; the latest id wins
+    conn.execute(text("""
+        INSERT INTO metal_prices (id, metal_id, date, price, macd, macd_signal, rsi)
+        SELECT p.id, m.id, p.date, p.price, p.macd, p.macd_signal, p.rsi
+        FROM metal_prices_legacy AS p
+        JOIN metals AS m ON m.name = p.metal
+        WHERE p.id IN (SELECT MAX(id) FROM metal_prices_legacy
+                       WHERE metal IS NOT NULL AND date IS NOT NULL GROUP BY metal, date)
+    """))
+    kept = conn.execute(text("SELECT COUNT(*) FROM metal_prices")).scalar_one()
+    conn.execute(text("DROP TABLE metal_prices_legacy"))
+    return {'legacy_rows': total, 'kept_rows': kept, 'dropped_rows': total - kept}
+
+# Function to bring a database to the current schema. Safe to run repeatedly: new databases get the
+# tables, legacy ones are migrated, and up-to-date ones only get any missing indexes. Databases with daily
+# rows but no rollups yet (legacy, or written before price_rollups existed) get their rollups backfilled.
+def upgrade_schema(conn: Connection, covering_indexes: bool = True) -> Dict[str, int]:
+    report = {'legacy_rows': 0, 'kept_rows': 0, 'dropped_rows': 0, 'rollup_rows': 0}
+    if is_legacy_schema(conn):
+        report.update(_migrate_legacy_table(conn))
+
+    Base.metadata.create_all(conn)
+    for index in MetalPrice.__table__.indexes:
+        index.create(conn, checkfirst=True)
+    if covering_indexes:
+        for name, columns in COVERING_INDEXES.items():
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON metal_prices ({', '.join(columns)})"))
+    if conn.execute(select(PriceRollup.id).limit(1)).first() is None:
+        report['rollup_rows'] = rebuild_rollups(conn)
+    conn.execute(text("ANALYZE"))
+    return report
+
+# Function to upgrade one database file in place, optionally keeping a .bak copy first
+def migrate_file(db_file: str, covering_indexes: bool = True, backup: bool = True) -> Dict[str, int]:
+    if backup:
+        shutil.copy2(db_file, db_file + '.bak')
+    engine = create_engine(f'sqlite:///{db_file}')
+    with engine.begin() as conn:
+        report = upgrade_schema(conn, covering_indexes=covering_indexes)
+    engine.dispose()
+    return report
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S')
+    parser = argparse.ArgumentParser(description='Upgrade metal_commodity*.db files to the indexed, normalized schema')
+    parser.add_argument('db_files', nargs='+', help='e.g. ../metal_commodity.db ../metal_commodity_Q4.db')
+    parser.add_argument('--skip-covering-indexes', action='store_true', help='Only create the (metal_id, date) and date indexes')
+    parser.add_argument('--no-backup', action='store_true', help='Do not write <db>.bak before migrating')
+    args = parser.parse_args()
+
+    for db_file in args.db_files:
+        report = migrate_file(db_file, covering_indexes=not args.skip_covering_indexes, backup=not args.no_backup)
+        logging.info(f"{db_file}: {report['legacy_rows']} legacy rows, {report['kept_rows']} kept, "
+                     f"{report['dropped_rows']} duplicates dropped, {report['rollup_rows']} rollup rows built")
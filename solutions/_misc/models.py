@@ -0,0 +1,71 @@
+from sqlalchemy import Column, Integer, String, Float, Date, Text, ForeignKey, Index
+from sqlalchemy.orm import DeclarativeBase, relationship
+
+# Define Base class for declarative ORM
+class Base(DeclarativeBase):
+    pass
+
+# Define Metal ORM class: the metal dimension, one row per instrument
+class Metal(Base):
+    __tablename__ = 'metals'
+
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False, unique=True)
+
+# Define MetalPrice ORM class, shared by the pipeline modules.
+# One row per (metal, date); the unique index also serves every metal / metal + date-range lookup.
+class MetalPrice(Base):
+    __tablename__ = 'metal_prices'
+    __table_args__ = (
+        Index('ux_metal_prices_metal_date', 'metal_id', 'date', unique=True),
+        Index('ix_metal_prices_date', 'date'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    metal_id = Column(Integer, ForeignKey('metals.id'), nullable=False)
+    date = Column(Date, nullable=False)
+    price = Column(Float)
+    macd = Column(Float)
+    macd_signal = Column(Float)
+    rsi = Column(Float)
+
+    metal = relationship(Metal, lazy='joined')
+
+# Optional covering indexes for the indicator filters (rsi >= x, macd >= x). They hold every column of
+# metal_prices (the id is SQLite's rowid), so those scans never touch the table, at the cost of roughly
+# doubling its size on disk. Created by migrate_schema.py unless --skip-covering-indexes is given.
+COVERING_INDEXES = {
+    'ix_metal_prices_rsi_covering': ('rsi', 'metal_id', 'date', 'price', 'macd', 'macd_signal'),
+    'ix_metal_prices_macd_covering': ('macd', 'metal_id', 'date', 'price', 'macd_signal', 'rsi'),
+}
+
+# Define PriceRollup ORM class: one row per metal per calendar week ('W', starting Monday), month ('M') or
+# year ('Y'), aggregated from the daily metal_prices rows. Maintained by rollups.refresh_rollups.
+class PriceRollup(Base):
+    __tablename__ = 'price_rollups'
+    __table_args__ = (
+        Index('ux_price_rollups_metal_period', 'metal_id', 'period', 'period_start', unique=True),
+    )
+
+    id = Column(Integer, primary_key=True)
+    metal_id = Column(Integer, ForeignKey('metals.id'), nullable=False)
+    period = Column(String(1), nullable=False)
+    period_start = Column(Date, nullable=False)
+    first_date = Column(Date)
+    last_date = Column(Date)
+    bars = Column(Integer)
+    open = Column(Float)
+    high = Column(Float)
+    low = Column(Float)
+    close = Column(Float)
+    mean = Column(Float)
+    # Sample standard deviation of the daily log returns inside the period
+    volatility = Column(Float)
+
+# Define IndicatorState ORM class: serialized incremental MACD/RSI state, one row per metal
+class IndicatorState(Base):
+    __tablename__ = 'indicator_state'
+
+    metal = Column(String, primary_key=True)
+    last_date = Column(Date)
+    state = Column(Text)
@@ -0,0 +1,95 @@
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indicators import calculate_indicator_block, to_wide_frame
+
+# Indicator outputs written back by the workers, in calculate_indicator_block order after 'price'
+OUTPUT_FIELDS = ['macd', 'macd_signal', 'rsi']
+
+# Function to split n_metals columns into at most n_shards contiguous, near-equal ranges
+def shard_ranges(n_metals: int, n_shards: int) -> List[Tuple[int, int]]:
+    bounds = np.linspace(0, n_metals, min(n_shards, n_metals) + 1).round().astype(int)
+    return [(int(lo), int(hi)) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+# Function to view a shared memory block as a column-major (dates x metals [x fields]) float64 array,
+# so one metal's series, and therefore one shard's columns, is a contiguous slice
+def _view(shm: shared_memory.SharedMemory, shape: Tuple[int, ...]) -> np.ndarray:
+    return np.ndarray(shape, dtype=np.float64, buffer=shm.buf, order='F')
+
+# Function run in a worker process: attach to the shared price and output blocks by name, compute one shard
+# of columns with the same block kernel as the serial path, and write the results in place. Only the block
+# names, shapes and column range are pickled.
+def compute_shard(price_name: str, output_name: str, shape: Tuple[int, int], columns: Tuple[int, int],
+                  slow_period: int, fast_period: int, signal_period: int, window: int) -> int:
+    price_shm = shared_memory.SharedMemory(name=price_name)
+    output_shm = shared_memory.SharedMemory(name=output_name)
+    try:
+        lo, hi = columns
+        prices = _view(price_shm, shape)[:, lo:hi]
+        block = calculate_indicator_block(pd.DataFrame(prices), slow_period, fast_period, signal_period, window)
+        output = _view(output_shm, (*shape, len(OUTPUT_FIELDS)))
+        for index, field in enumerate(OUTPUT_FIELDS):
+            output[:, lo:hi, index] = block[field].to_numpy()
+        # Drop the views before closing, or the buffers are still exported
+        del prices, output
+        return hi - lo
+    finally:
+        price_shm.close()
+        output_shm.close()
+
+# Function to calculate the indicator block with metals sharded across worker processes.
+# Returns exactly what calculate_indicator_block returns: every kernel is column-wise, so each column's
+# result does not depend on which other columns share its shard.
+def calculate_indicator_block_parallel(prices: pd.DataFrame, slow_period: int = 26, fast_period: int = 12,
+                                       signal_period: int = 9, window: int = 14, max_workers: Optional[int] = None,
+                                       shards: Optional[int] = None, executor: Optional[Executor] = None) -> pd.DataFrame:
+    max_workers = max_workers or os.cpu_count() or 1
+    if max_workers < 1:
+        raise ValueError(f"max_workers must be at least 1, got {max_workers}")
+    shape = prices.shape
+    if max_workers == 1 or shape[1] < 2:
+        return calculate_indicator_block(prices, slow_period, fast_period, signal_period, window)
+
+    nbytes = max(shape[0] * shape[1] * 8, 1)
+    price_shm = shared_memory.SharedMemory(create=True, size=nbytes)
+    output_shm = shared_memory.SharedMemory(create=True, size=nbytes * len(OUTPUT_FIELDS))
+    pool = executor or ProcessPoolExecutor(max_workers=max_workers)
+    try:
+        price_view = _view(price_shm, shape)
+        price_view[:] = prices.to_numpy(dtype=np.float64)
+
+        # A few shards per worker evens out stragglers without adding many task round trips
+        ranges = shard_ranges(shape[1], shards or max_workers * 4)
+        futures = [pool.submit(compute_shard, price_shm.name, output_shm.name, shape, columns,
+                               slow_period, fast_period, signal_period, window)
+                   for columns in ranges]
+        for future in futures:
+            future.result()
+
+        # Copy out of shared memory before it is unlinked
+        output = _view(output_shm, (*shape, len(OUTPUT_FIELDS)))
+        frames = {'price': pd.DataFrame(price_view.copy(), index=prices.index, columns=prices.columns)}
+        for index, field in enumerate(OUTPUT_FIELDS):
+            frames[field] = pd.DataFrame(output[:, :, index].copy(), index=prices.index, columns=prices.columns)
+        del price_view, output
+        return pd.concat(frames, axis=1)
+    finally:
+        if executor is None:
+            pool.shutdown(wait=True)
+        price_shm.close()
+        price_shm.unlink()
+        output_shm.close()
+        output_shm.unlink()
+
+# Function to read CSV file and calculate MACD and RSI with the metals spread over max_workers processes
+def calculate_macd_rsi_parallel(csv_file: str, max_workers: Optional[int] = None) -> Tuple[pd.DataFrame, pd.Index]:
+    df = pd.read_csv(csv_file)
+    df['Dates'] = pd.to_datetime(df['Dates'])
+    metals = df.columns[1:]
+    block = calculate_indicator_block_parallel(df[metals], max_workers=max_workers)
+    return to_wide_frame(df['Dates'], block), metals
@@ -0,0 +1,91 @@
+from itertools import product
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from indicator_registry import IndicatorEvaluator
+
+# Working memory allowed per chunk of parameter combinations
+DEFAULT_MAX_BYTES = 256 * 1024 ** 2
+
+# Function to build a (fast, slow, signal) grid as an (n_params, 3) int array, skipping fast >= slow
+def macd_grid(fast_periods: Iterable[int], slow_periods: Iterable[int], signal_periods: Iterable[int]) -> np.ndarray:
+    combos = [(fast, slow, signal) for fast, slow, signal in product(fast_periods, slow_periods, signal_periods)
+              if fast < slow]
+    return np.array(combos, dtype=np.int64).reshape(-1, 3)
+
+# Function to pick how many parameter combinations fit in max_bytes: each one holds `arrays` float64
+# (dates x metals) blocks at once
+def params_per_chunk(shape: Tuple[int, int], arrays: int, max_bytes: int = DEFAULT_MAX_BYTES) -> int:
+    return max(1, max_bytes // max(shape[0] * shape[1] * 8 * arrays, 1))
+
+# Function to compute MACD and its signal line for every (fast, slow, signal) row of `params`, chunk by chunk.
+# Yields (lo, hi, macd, macd_signal) for params[lo:hi], the arrays being (dates x metals x chunk) views.
+# Each distinct EMA span is computed once over the whole price block and shared by every combination using it,
+# and each chunk's signal lines take one DataFrame-wide ewm per distinct signal span. Values are exactly those
+# of calculate_macd / the indicator registry for the same parameters.
+def iter_macd_sweep(prices: pd.DataFrame, params: np.ndarray, max_bytes: int = DEFAULT_MAX_BYTES,
+                    evaluator: Optional[IndicatorEvaluator] = None) -> Iterator[Tuple[int, int, np.ndarray, np.ndarray]]:
+    params = np.asarray(params, dtype=np.int64).reshape(-1, 3)
+    evaluator = evaluator or IndicatorEvaluator(prices)
+    n_dates, n_metals = evaluator.get(('close',)).shape
+    emas: Dict[int, np.ndarray] = {int(span): evaluator.get(('ema', int(span))).to_numpy()
+                                   for span in np.unique(params[:, :2])}
+
+    # Peak per combination, measured with tracemalloc when a whole chunk shares one signal span: its MACD line,
+    # its signal line, the gathered copy of its MACD line and pandas' ewm working arrays (input copy and output)
+    step = params_per_chunk((n_dates, n_metals), 5, max_bytes)
+    for lo in range(0, len(params), step):
+        chunk = params[lo:lo + step]
+        # Built (dates x chunk x metals): each combination's block is contiguous per date, so the combinations
+        # of a signal span flatten to (dates, k * metals) columns for one DataFrame-wide ewm
+        macd = np.empty((n_dates, len(chunk), n_metals))
+        for index, (fast, slow, _) in enumerate(chunk):
+            np.subtract(emas[int(fast)], emas[int(slow)], out=macd[:, index])
+        signal = np.empty_like(macd)
+        for span in np.unique(chunk[:, 2]):
+            columns = np.flatnonzero(chunk[:, 2] == span)
+            # Fancy indexing gathers the span's combinations into a new array (a copy, counted in step above)
+            lines = pd.DataFrame(macd[:, columns].reshape(n_dates, -1))
+            signal[:, columns] = lines.ewm(span=int(span)).mean().to_numpy().reshape(n_dates, len(columns), n_metals)
+        yield lo, lo + len(chunk), macd.transpose(0, 2, 1), signal.transpose(0, 2, 1)
+
+# Function to compute the full MACD sweep as (dates x metals x params) arrays, in the order of `params`.
+# Returns {'params': (n_params, 3), 'macd': ..., 'macd_signal': ...}; the two outputs are allocated once and
+# filled chunk by chunk. Use iter_macd_sweep to reduce each chunk instead when the full arrays do not fit.
+def sweep_macd(prices: pd.DataFrame, params: np.ndarray, max_bytes: int = DEFAULT_MAX_BYTES) -> Dict[str, np.ndarray]:
+    params = np.asarray(params, dtype=np.int64).reshape(-1, 3)
+    shape = (*prices.shape, len(params))
+    result = {'params': params, 'macd': np.empty(shape), 'macd_signal': np.empty(shape)}
+    for lo, hi, macd, signal in iter_macd_sweep(prices, params, max_bytes):
+        result['macd'][:, :, lo:hi] = macd
+        result['macd_signal'][:, :, lo:hi] = signal
+    return result
+
+# Function to compute RSI for every window as a (dates x metals x windows) array. Gains and losses are
+# computed once and every window's rolling sums come from the same cumulative sums, so a window costs two
+# subtractions and a divide over the block. Matches calculate_rsi to floating-point rounding (differences of
+# running sums instead of pandas' rolling kernel).
+def sweep_rsi(prices: pd.DataFrame, windows: Sequence[int]) -> Dict[str, np.ndarray]:
+    windows = np.asarray(windows, dtype=np.int64).ravel()
+    if (windows < 1).any():
+        raise ValueError(f"windows must be positive, got {windows.tolist()}")
+    delta = IndicatorEvaluator(prices).get(('delta',)).to_numpy()
+    # As calculate_rsi: a missing change (the first bar, or a NaN price) counts as neither gain nor loss
+    gain = np.where(delta > 0, delta, 0.0)
+    loss = np.where(delta < 0, -delta, 0.0)
+    n_dates, n_metals = delta.shape
+    # Leading zero row, so the sum over (t - w, t] is cumsum[t + 1] - cumsum[t + 1 - w]
+    cum_gain = np.concatenate([np.zeros((1, n_metals)), np.cumsum(gain, axis=0)])
+    cum_loss = np.concatenate([np.zeros((1, n_metals)), np.cumsum(loss, axis=0)])
+
+    rsi = np.full((n_dates, n_metals, len(windows)), np.nan)
+    for index, window in enumerate(windows):
+        if window > n_dates:
+            continue
+        gain_sum = cum_gain[window:] - cum_gain[:-window]
+        loss_sum = cum_loss[window:] - cum_loss[:-window]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            rsi[window - 1:, :, index] = 100 - 100 / (1 + gain_sum / loss_sum)
+    return {'params': windows, 'rsi': rsi}
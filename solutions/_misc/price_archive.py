@@ -0,0 +1,150 @@
+import json
+import os
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+from array_store import DateLike, PriceStore
+
+ARCHIVE_VERSION = 1
+HEADER_FILE = 'header.json'
+DAYS_FILE = 'days.i4'
+DEFAULT_FIELDS = ('price', 'macd', 'macd_signal', 'rsi')
+
+# On-disk layout, one directory per archive:
+#   header.json     {'version', 'metals', 'fields', 'dtype', 'n_dates', 'start', 'end'}
+#   days.i4         little-endian int32 day ordinals (days since 1970-01-01), strictly increasing
+#   <field>.<dtype> raw row-major (n_dates x n_metals) matrix, one file per field
+# Rows are whole dates, so an append writes bytes at the end of each file. The header is replaced atomically
+# after the data is flushed and its n_dates is authoritative: bytes past it (an append that did not finish)
+# are ignored by readers and cut off by the next append. One writer at a time; any number of readers.
+
+def _header_path(path: str) -> str:
+    return os.path.join(path, HEADER_FILE)
+
+def _field_path(path: str, field: str, dtype: np.dtype) -> str:
+    return os.path.join(path, f'{field}.{dtype.str.lstrip("<>=|")}')
+
+# Function to read an archive's header
+def read_header(path: str) -> dict:
+    with open(_header_path(path)) as f:
+        header = json.load(f)
+    if header.get('version') != ARCHIVE_VERSION:
+        raise ValueError(f"{path}: archive version {header.get('version')}, expected {ARCHIVE_VERSION}")
+    return header
+
+def _write_header(path: str, header: dict) -> None:
+    # Write then rename, so readers see either the old header or the new one, never a partial file
+    tmp_path = _header_path(path) + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(header, f, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, _header_path(path))
+
+# Function to create an empty archive for a fixed list of metals and fields
+def create_archive(path: str, metals: Sequence[str], fields: Sequence[str] = DEFAULT_FIELDS, dtype='float64') -> dict:
+    dtype = np.dtype(dtype).newbyteorder('<')
+    if os.path.exists(_header_path(path)):
+        raise FileExistsError(f"{path} already holds an archive")
+    os.makedirs(path, exist_ok=True)
+    for file_path in [os.path.join(path, DAYS_FILE)] + [_field_path(path, field, dtype) for field in fields]:
+        open(file_path, 'wb').close()
+    header = {'version': ARCHIVE_VERSION, 'metals': list(metals), 'fields': list(fields), 'dtype': dtype.str,
+              'n_dates': 0, 'start': None, 'end': None}
+    _write_header(path, header)
+    return header
+
+# Function to append the dates of `store` that are newer than the archive's last date. The store must hold
+# the archive's metals (any order, extra metals ignored) and fields; returns the number of dates appended.
+def append_archive(path: str, store: PriceStore) -> int:
+    header = read_header(path)
+    dtype = np.dtype(header['dtype'])
+    missing = [metal for metal in header['metals'] if metal not in store.metals]
+    missing += [field for field in header['fields'] if field not in store.fields]
+    if missing:
+        raise ValueError(f"store lacks {missing} required by the archive at {path}")
+
+    if header['n_dates']:
+        store = store.slice(start=np.datetime64(header['end'], 'D') + np.timedelta64(1, 'D'))
+    if not len(store):
+        return 0
+    columns = [store.column(metal) for metal in header['metals']]
+
+    n_dates = header['n_dates']
+    files = [(os.path.join(path, DAYS_FILE), store.days.astype('<i4'), 4)]
+    for field in header['fields']:
+        # Row-major bytes: the new dates go after the existing ones
+        matrix = np.ascontiguousarray(store.fields[field][:, columns], dtype=dtype)
+        files.append((_field_path(path, field, dtype), matrix, dtype.itemsize * len(columns)))
+    for file_path, values, row_bytes in files:
+        with open(file_path, 'r+b') as f:
+            # Drop any tail a failed append left past the header's n_dates
+            f.truncate(n_dates * row_bytes)
+            f.seek(0, os.SEEK_END)
+            f.write(values.tobytes())
+            f.flush()
+            os.fsync(f.fileno())
+
+    header.update(n_dates=n_dates + len(store), end=str(store.dates[-1]))
+    header['start'] = header['start'] or str(store.dates[0])
+    _write_header(path, header)
+    return len(store)
+
+# Function to write a store to a new archive (or append its newer dates to an existing one)
+def write_archive(path: str, store: PriceStore, fields: Optional[Sequence[str]] = None, dtype=None) -> int:
+    if not os.path.exists(_header_path(path)):
+        create_archive(path, store.metals, fields or list(store.fields), dtype or store.dtype)
+    return append_archive(path, store)
+
+# Define PriceArchive class: a read-only, memory-mapped view of an archive. Opening reads the JSON header and
+# maps the files: the store is built on the mappings without copying or scanning them (the days are in order
+# by construction, see append_archive). Slices are views into the mapping, and pages are read on first touch
+# and shared through the OS page cache with every other process mapping the same files.
+class PriceArchive:
+    def __init__(self, path: str):
+        self.path = path
+        self.header: Dict = {}
+        self.store: Optional[PriceStore] = None
+        self.refresh()
+
+    # Function to re-read the header and remap if another process appended since; returns True if it grew
+    def refresh(self) -> bool:
+        header = read_header(self.path)
+        if self.store is not None and header['n_dates'] == self.header['n_dates']:
+            return False
+        self.header = header
+        dtype = np.dtype(header['dtype'])
+        n_dates, n_metals = header['n_dates'], len(header['metals'])
+        days = self._map(os.path.join(self.path, DAYS_FILE), np.dtype('<i4'), (n_dates,))
+        fields = {field: self._map(_field_path(self.path, field, dtype), dtype, (n_dates, n_metals))
+                  for field in header['fields']}
+        # Appends only ever add dates after the last one, so the mapped days are not scanned
+        self.store = PriceStore(days, header['metals'], fields, validated=True)
+        return True
+
+    @staticmethod
+    def _map(file_path: str, dtype: np.dtype, shape) -> np.ndarray:
+        # np.memmap cannot map zero bytes
+        if shape[0] == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode='r', shape=shape)
+
+    @property
+    def metals(self):
+        return self.store.metals
+
+    def __len__(self) -> int:
+        return len(self.store)
+
+    def __repr__(self) -> str:
+        return (f"PriceArchive({self.path!r}, {self.header['n_dates']} dates x {len(self.header['metals'])} metals, "
+                f"{self.header['start']}..{self.header['end']}, fields={self.header['fields']})")
+
+    # Function to return start <= date <= end as a PriceStore of views into the mapped files
+    def slice(self, start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> PriceStore:
+        return self.store.slice(start, end)
+
+# Function to open an archive and return its full history as a memory-mapped PriceStore
+def open_archive(path: str) -> PriceStore:
+    return PriceArchive(path).store
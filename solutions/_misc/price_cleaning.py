@@ -0,0 +1,231 @@
+from dataclasses import dataclass
+from typing import Dict, Mapping, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from pandas.tseries.holiday import (AbstractHolidayCalendar, DateOffset, EasterMonday, GoodFriday, Holiday, MO,
+                                    USLaborDay, USMartinLutherKingJr, USMemorialDay, USPresidentsDay,
+                                    USThanksgivingDay, nearest_workday, next_monday, next_monday_or_tuesday,
+                                    sunday_to_monday)
+
+from array_store import PriceStore
+from rollups import period_starts
+
+# Define LMEHolidayCalendar class: London Metal Exchange closures, i.e. the England and Wales bank holidays.
+# Early May and Spring bank holidays moved in 2012, 2020 and 2022; the one-off holidays are listed by date
+# (the LME settled on the 2022-09-19 bank holiday, so it is not one).
+class LMEHolidayCalendar(AbstractHolidayCalendar):
+    rules = [
+        Holiday("New Year's Day", month=1, day=1, observance=next_monday),
+        GoodFriday,
+        EasterMonday,
+        Holiday('Early May Bank Holiday', month=5, day=1, offset=DateOffset(weekday=MO(1)), end_date='2019-12-31'),
+        Holiday('Early May Bank Holiday', year=2020, month=5, day=8),
+        Holiday('Early May Bank Holiday', month=5, day=1, offset=DateOffset(weekday=MO(1)), start_date='2021-01-01'),
+        Holiday('Spring Bank Holiday', month=5, day=31, offset=DateOffset(weekday=MO(-1)), end_date='2011-12-31'),
+        Holiday('Spring Bank Holiday', year=2012, month=6, day=4),
+        Holiday('Spring Bank Holiday', month=5, day=31, offset=DateOffset(weekday=MO(-1)),
+                start_date='2013-01-01', end_date='2021-12-31'),
+        Holiday('Spring Bank Holiday', year=2022, month=6, day=2),
+        Holiday('Spring Bank Holiday', month=5, day=31, offset=DateOffset(weekday=MO(-1)), start_date='2023-01-01'),
+        Holiday('Summer Bank Holiday', month=8, day=31, offset=DateOffset(weekday=MO(-1))),
+        Holiday('Christmas Day', month=12, day=25, observance=next_monday),
+        Holiday('Boxing Day', month=12, day=26, observance=next_monday_or_tuesday),
+        Holiday('Royal Wedding', year=2011, month=4, day=29),
+        Holiday('Diamond Jubilee', year=2012, month=6, day=5),
+        Holiday('Platinum Jubilee', year=2022, month=6, day=3),
+        Holiday('Coronation', year=2023, month=5, day=8),
+    ]
+
+# Define NYMEXHolidayCalendar class: days without a NYMEX settlement (CL futures), the US exchange holidays
+class NYMEXHolidayCalendar(AbstractHolidayCalendar):
+    rules = [
+        Holiday("New Year's Day", month=1, day=1, observance=sunday_to_monday),
+        USMartinLutherKingJr,
+        USPresidentsDay,
+        GoodFriday,
+        USMemorialDay,
+        Holiday('Juneteenth', month=6, day=19, observance=nearest_workday, start_date='2022-01-01'),
+        Holiday('Independence Day', month=7, day=4, observance=nearest_workday),
+        USLaborDay,
+        USThanksgivingDay,
+        Holiday('Christmas Day', month=12, day=25, observance=nearest_workday),
+    ]
+
+CALENDARS: Dict[str, AbstractHolidayCalendar] = {'LME': LMEHolidayCalendar(), 'NYMEX': NYMEXHolidayCalendar()}
+# Exchange of each MarketData.csv column; columns not listed trade on every day of the alignment calendar
+INSTRUMENT_EXCHANGES: Dict[str, str] = {'COPPER': 'LME', 'ALUMINUM': 'LME', 'ZINC': 'LME', 'LEAD': 'LME',
+                                        'TIN': 'LME', 'CL': 'NYMEX'}
+
+# Gap flags, one uint8 per (date, metal); a cell can carry several
+FLAG_MISSING = 1    # no value in the source on this date (no row, or NaN)
+FLAG_CLOSED = 2     # the instrument's exchange was closed; a value the source carried over is discarded
+FLAG_FILLED = 4     # the value was carried forward from an earlier date
+FLAG_UNFILLED = 8   # still NaN: before the first value, or past the forward-fill limit
+GAP_FLAGS = FLAG_MISSING | FLAG_CLOSED
+
+# The resampling reductions, named after the rollup fields
+RESAMPLE_HOWS = ('open', 'high', 'low', 'close', 'mean', 'bars')
+
+CalendarLike = Union[str, pd.DatetimeIndex]
+
+# Function to return the trading days of an exchange between two dates, inclusive. 'business' is every weekday;
+# 'union' / 'common' are the days any / every exchange in `exchanges` trades.
+def trading_days(calendar: CalendarLike, start, end, exchanges: Sequence[str] = ('LME', 'NYMEX')) -> pd.DatetimeIndex:
+    if isinstance(calendar, pd.DatetimeIndex):
+        return calendar[(calendar >= pd.Timestamp(start)) & (calendar <= pd.Timestamp(end))]
+    weekdays = pd.bdate_range(start, end)
+    if calendar == 'business':
+        return weekdays
+    if calendar in ('union', 'common'):
+        open_days = [weekdays.difference(_holidays(exchange, start, end)) for exchange in exchanges]
+        combine = pd.DatetimeIndex.union if calendar == 'union' else pd.DatetimeIndex.intersection
+        days = open_days[0]
+        for other in open_days[1:]:
+            days = combine(days, other)
+        return days
+    return weekdays.difference(_holidays(calendar, start, end))
+
+def _holidays(exchange: str, start, end) -> pd.DatetimeIndex:
+    if exchange not in CALENDARS:
+        raise ValueError(f"unknown exchange {exchange!r}, expected one of {sorted(CALENDARS)}")
+    return CALENDARS[exchange].holidays(pd.Timestamp(start), pd.Timestamp(end))
+
+# Function to carry the last non-NaN value forward down every column at once, at most `limit` rows past it
+# (an int, or one per column; None fills without limit). Returns the filled copy and the mask of filled cells.
+def forward_fill_limit(values: np.ndarray, limit: Union[None, int, np.ndarray] = None):
+    rows = np.arange(len(values)).reshape((-1,) + (1,) * (values.ndim - 1))
+    valid = ~np.isnan(values)
+    # Row of the latest value at or above each cell; -1 before a column's first value
+    source = np.where(valid, rows, -1)
+    np.maximum.accumulate(source, axis=0, out=source)
+    filled = ~valid & (source >= 0)
+    if limit is not None:
+        filled &= rows - source <= np.asarray(limit)
+    result = np.take_along_axis(values, np.maximum(source, 0), axis=0)
+    result[~valid & ~filled] = np.nan
+    return result, filled
+
+# Define CleanedPrices class: a price matrix aligned to one calendar and forward-filled, with a gap flag per cell
+@dataclass
+class CleanedPrices:
+    prices: pd.DataFrame    # dates x metals, float64, DatetimeIndex named 'Dates'
+    flags: pd.DataFrame     # same shape, uint8 FLAG_* bits
+
+    # Function to list runs of consecutive gap days per metal: metal, start, end, bars, and whether every
+    # day of the run was filled
+    def gaps(self) -> pd.DataFrame:
+        flags = self.flags.to_numpy()
+        gap = (flags & GAP_FLAGS) != 0
+        # Run boundaries from the change points of a zero-padded mask, all metals at once
+        padded = np.zeros((len(gap) + 2, gap.shape[1]), dtype=np.int8)
+        padded[1:-1] = gap
+        edges = np.diff(padded, axis=0)
+        # Transposed, so the runs come out metal by metal and each start pairs with the end after it
+        metal, start = np.nonzero(edges.T == 1)
+        _, end = np.nonzero(edges.T == -1)
+        unfilled = np.zeros((len(gap) + 1, gap.shape[1]), dtype=np.int64)
+        np.cumsum((flags & FLAG_UNFILLED) != 0, axis=0, out=unfilled[1:])
+        dates = self.prices.index
+        return pd.DataFrame({'metal': self.prices.columns[metal].to_numpy(), 'start': dates[start],
+                             'end': dates[end - 1], 'bars': end - start,
+                             'filled': unfilled[end, metal] == unfilled[start, metal]})
+
+    # Function to return the prices from the first date every metal has a value; raises if a gap longer than the
+    # forward-fill limit remains after it, so the indicator kernels only ever see dense columns
+    def dense(self) -> pd.DataFrame:
+        values = self.prices.to_numpy()
+        complete = ~np.isnan(values).any(axis=1)
+        if not complete.any():
+            raise ValueError("no date has a value for every metal")
+        first = int(np.argmax(complete))
+        if not complete[first:].all():
+            holes = self.prices.columns[np.isnan(values[first:]).any(axis=0)]
+            raise ValueError(f"gaps longer than the forward-fill limit remain in {list(holes)}")
+        return self.prices.iloc[first:]
+
+    # Function to return the dense prices as a PriceStore, ready for with_indicators
+    def to_store(self, dtype=np.float64) -> PriceStore:
+        prices = self.dense()
+        days = prices.index.values.astype('datetime64[D]').astype(np.int32)
+        return PriceStore(days, list(prices.columns), {'price': prices.to_numpy(dtype=dtype)})
+
+# Function to align every instrument to one calendar, discard values on days an instrument's exchange was closed
+# (the export repeats the previous settlement there), forward-fill and flag the gaps, in one pass over the
+# full matrix. `prices` is parse_market_data's frame (a 'Dates' column) or one indexed by date; `limit` is the
+# most consecutive days filled, an int or {metal: int} (None for no limit).
+#   cleaned = clean_prices(parse_market_data(), calendar='LME', limit=5)
+#   store = cleaned.to_store().with_indicators()
+def clean_prices(prices: pd.DataFrame, calendar: CalendarLike = 'LME', limit: Union[None, int, Mapping[str, int]] = 5,
+                 exchanges: Optional[Mapping[str, str]] = None, mask_closed: bool = True) -> CleanedPrices:
+    exchanges = INSTRUMENT_EXCHANGES if exchanges is None else exchanges
+    if 'Dates' in prices.columns:
+        prices = prices.set_index('Dates')
+    prices = prices[~prices.index.duplicated(keep='last')].sort_index()
+    days = trading_days(calendar, prices.index[0], prices.index[-1], sorted(set(exchanges.values())))
+    metals = prices.columns
+
+    values = prices.reindex(days).to_numpy(dtype=np.float64, copy=True)
+    flags = np.where(np.isnan(values), FLAG_MISSING, 0).astype(np.uint8)
+
+    # One closed-day row mask per exchange, broadcast to that exchange's columns
+    column_exchange = [exchanges.get(metal) for metal in metals]
+    closed = np.zeros(values.shape, dtype=bool)
+    for exchange in set(column_exchange) - {None}:
+        columns = [index for index, name in enumerate(column_exchange) if name == exchange]
+        closed[:, columns] = days.isin(_holidays(exchange, days[0], days[-1]))[:, None]
+    flags[closed] |= FLAG_CLOSED
+    if mask_closed:
+        values[closed] = np.nan
+
+    if isinstance(limit, Mapping):
+        limit = np.array([limit.get(metal, np.iinfo(np.int64).max) for metal in metals])
+    values, filled = forward_fill_limit(values, limit)
+    flags[filled] |= FLAG_FILLED
+    flags[np.isnan(values)] |= FLAG_UNFILLED
+
+    index = pd.DatetimeIndex(days, name='Dates')
+    return CleanedPrices(pd.DataFrame(values, index=index, columns=metals),
+                         pd.DataFrame(flags, index=index, columns=metals))
+
+# Function to resample a (dates x metals) price frame to weekly, monthly or yearly bars, with no groupby: the
+# rows are scattered into a (periods x longest period x metals) array padded with NaN, and every reduction runs
+# over its middle axis for all periods and metals at once. Returns a (how, metal) block indexed by
+# period_start, like get_rollups; NaN prices are skipped, and a period with none gives NaN (bars 0).
+def resample_prices(prices: pd.DataFrame, period: str = 'M', how: Sequence[str] = ('close',)) -> pd.DataFrame:
+    unknown = [name for name in how if name not in RESAMPLE_HOWS]
+    if unknown:
+        raise ValueError(f"unknown reductions {unknown}, expected some of {RESAMPLE_HOWS}")
+    keys = period_starts(prices.index.values, period)
+    if len(prices) > 1 and not (np.diff(keys.astype(np.int64)) >= 0).all():
+        raise ValueError("prices must be sorted by date")
+    if not len(prices):
+        columns = pd.MultiIndex.from_product([list(how), prices.columns])
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='period_start'), dtype=np.float64)
+
+    new_period = np.r_[True, keys[1:] != keys[:-1]]
+    starts = np.flatnonzero(new_period)
+    segment = np.cumsum(new_period) - 1
+    position = np.arange(len(keys)) - starts[segment]
+    padded = np.full((len(starts), position.max() + 1, prices.shape[1]), np.nan)
+    padded[segment, position] = prices.to_numpy(dtype=np.float64)
+    valid = ~np.isnan(padded)
+    bars = valid.sum(axis=1)
+
+    reductions = {}
+    for name in how:
+        if name == 'bars':
+            reductions[name] = bars.astype(np.float64)
+        elif name == 'mean':
+            with np.errstate(invalid='ignore'):
+                reductions[name] = np.where(valid, padded, 0).sum(axis=1) / bars
+        elif name in ('high', 'low'):
+            # fmax/fmin skip NaN unless the whole period is NaN
+            reductions[name] = (np.fmax if name == 'high' else np.fmin).reduce(padded, axis=1)
+        else:
+            # First (open) or last (close) valid row of each period; an all-NaN period picks a NaN
+            first = valid.argmax(axis=1)
+            picked = first if name == 'open' else valid.shape[1] - 1 - valid[:, ::-1].argmax(axis=1)
+            reductions[name] = np.take_along_axis(padded, picked[:, None], axis=1)[:, 0]
+    index = pd.DatetimeIndex(keys[starts], name='period_start')
+    return pd.concat({name: pd.DataFrame(reductions[name], index=index, columns=prices.columns) for name in how}, axis=1)
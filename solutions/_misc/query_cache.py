@@ -0,0 +1,283 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import date, datetime
+from typing import Callable, Dict, FrozenSet, Hashable, List, Optional, Tuple
+
+from sqlalchemy import event, select
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList, Grouping
+
+from models import Metal
+
+# Table whose writes invalidate cached reads
+CACHED_TABLE = 'metal_prices'
+# Columns identifying the metal of a row: the text column of the original single-table schema,
+# the foreign key of the normalized one, and the name in the metals dimension (resolved to an id)
+_METAL_COLUMNS = {('metal_prices', 'metal'), ('metal_prices', 'metal_id'), ('metals', 'name')}
+_DATE_COLUMN = ('metal_prices', 'date')
+
+# Function to turn a date-like bind value ('2022-01-01', datetime, pd.Timestamp, date) into a date
+def _as_date(value) -> Optional[date]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+def _hashable(value):
+    return tuple(value) if isinstance(value, list) else value
+
+# Define Scope class: the metals and date range a cached query can see, metals being (table, value) pairs.
+# metals=None means every metal; a missing bound means open-ended. A write invalidates an entry when both overlap.
+@dataclass(frozen=True)
+class Scope:
+    metals: Optional[FrozenSet[Hashable]] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
+
+    def overlaps(self, metal: Optional[Hashable], start: Optional[date], end: Optional[date]) -> bool:
+        if self.metals is not None and metal is not None and metal not in self.metals:
+            return False
+        if self.start is not None and end is not None and end < self.start:
+            return False
+        if self.end is not None and start is not None and start > self.end:
+            return False
+        return True
+
+    # Names compared against metals.name, which writes only know by metal id
+    def metal_names(self) -> List[str]:
+        return [value for table, value in self.metals or () if table == 'metals']
+
+    # Swap metal names for ids; a name with no id yet widens the scope to every metal
+    def resolve(self, metal_ids: Dict[str, int]) -> 'Scope':
+        if self.metals is None:
+            return self
+        if any(name not in metal_ids for name in self.metal_names()):
+            return Scope(None, self.start, self.end)
+        metals = frozenset(('metal_prices', metal_ids[value]) if table == 'metals' else (table, value)
+                           for table, value in self.metals)
+        return Scope(metals, self.start, self.end)
+
+# Function to derive a query's Scope from its WHERE clause. Only AND-ed comparisons of the metal and date
+# columns against literal values narrow the scope; anything else (OR, subqueries, functions) leaves it wide.
+def query_scope(statement) -> Scope:
+    metals, start, end = None, None, None
+
+    def visit(clause):
+        nonlocal metals, start, end
+        if isinstance(clause, Grouping):
+            visit(clause.element)
+        elif isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+            for child in clause.clauses:
+                visit(child)
+        elif isinstance(clause, BinaryExpression) and isinstance(clause.right, BindParameter):
+            table = getattr(getattr(clause.left, 'table', None), 'name', None)
+            column = (table, getattr(clause.left, 'name', None))
+            value = clause.right.effective_value
+            if column in _METAL_COLUMNS:
+                if clause.operator is operators.eq:
+                    values = frozenset([(column[0], value)])
+                elif clause.operator is operators.in_op:
+                    values = frozenset((column[0], item) for item in value)
+                else:
+                    return
+                metals = values if metals is None else metals & values
+            elif column == _DATE_COLUMN:
+                bound = _as_date(value)
+                if clause.operator in (operators.eq, operators.ge, operators.gt):
+                    start = bound if start is None else max(start, bound)
+                if clause.operator in (operators.eq, operators.le, operators.lt):
+                    end = bound if end is None else min(end, bound)
+
+    if getattr(statement, 'whereclause', None) is not None:
+        visit(statement.whereclause)
+    return Scope(metals=metals, start=start, end=end)
+
+# Function to estimate the memory held by a result: the row tuples plus the attribute values of any ORM objects
+def estimate_size(rows: List) -> int:
+    size = sys.getsizeof(rows)
+    for row in rows:
+        size += sys.getsizeof(row)
+        for value in row:
+            size += sys.getsizeof(value)
+            state = getattr(value, '__dict__', None)
+            if state is not None:
+                size += sum(sys.getsizeof(item) for key, item in state.items() if key != '_sa_instance_state')
+    return size
+
+# Define CacheStats class: counters exposed by QueryCache.stats
+@dataclass
+class CacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+@dataclass
+class _Entry:
+    rows: List
+    size: int
+    expires: float
+    scope: Scope
+
+# Define QueryCache class: read results keyed by normalized SQL + bind parameters, evicted LRU-first once
+# max_bytes is exceeded, dropped after ttl seconds, and invalidated when a watched engine commits rows for
+# an overlapping metal and date range.
+class QueryCache:
+    def __init__(self, max_bytes: int = 64 * 1024 * 1024, ttl: float = 300.0, clock: Callable[[], float] = time.monotonic):
+        if max_bytes <= 0 or ttl <= 0:
+            raise ValueError(f"max_bytes and ttl must be positive, got {max_bytes} and {ttl}")
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: 'OrderedDict[Tuple, _Entry]' = OrderedDict()
+        self._bytes = 0
+        self._generation = 0
+        self._metal_ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._stats = CacheStats()
+
+    @property
+    def stats(self) -> CacheStats:
+        with self._lock:
+            return CacheStats(**{**self._stats.__dict__, 'entries': len(self._entries), 'bytes': self._bytes})
+
+    # Normalized SQL plus the bind values. SQLAlchemy's structural cache key is the statement with its literals
+    # lifted into bind parameters, the same normalization its compiled cache uses, and costs microseconds
+    # instead of a compile; statements it cannot key fall back to the compiled text with whitespace collapsed.
+    @staticmethod
+    def key(statement, dialect=None) -> Tuple:
+        cache_key = statement._generate_cache_key()
+        if cache_key is not None:
+            params = tuple(_hashable(bind.effective_value) for bind in cache_key.bindparams)
+            return cache_key.key, params
+        compiled = statement.compile(dialect=dialect)
+        params = tuple(sorted((name, _hashable(value)) for name, value in compiled.params.items()))
+        return ' '.join(str(compiled).split()), params
+
+    def get(self, key: Tuple) -> Optional[List]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires <= self.clock():
+                self._drop(key)
+                self._stats.expirations += 1
+                entry = None
+            if entry is None:
+                self._stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats.hits += 1
+            return entry.rows
+
+    # Store a result. A result read before an invalidation that happened while the query ran is not stored.
+    def put(self, key: Tuple, rows: List, scope: Scope, generation: Optional[int] = None) -> bool:
+        size = estimate_size(rows)
+        with self._lock:
+            if size > self.max_bytes or (generation is not None and generation != self._generation):
+                return False
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = _Entry(rows, size, self.clock() + self.ttl, scope)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._drop(next(iter(self._entries)))
+                self._stats.evictions += 1
+            return True
+
+    def _drop(self, key: Tuple) -> None:
+        self._bytes -= self._entries.pop(key).size
+
+    # Drop every entry that can see rows of `metal` between start and end (None: any metal / open-ended)
+    def invalidate(self, metal: Optional[Hashable] = None, start: Optional[date] = None, end: Optional[date] = None) -> int:
+        with self._lock:
+            self._generation += 1
+            stale = [key for key, entry in self._entries.items() if entry.scope.overlaps(metal, start, end)]
+            for key in stale:
+                self._drop(key)
+            self._stats.invalidations += len(stale)
+            return len(stale)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self._bytes = 0
+
+    # Cached version of Question 4's read_data: run the statement in a new session only on a miss
+    async def fetch(self, session_factory, statement) -> List:
+        key = self.key(statement)
+        rows = self.get(key)
+        if rows is not None:
+            return rows
+        generation = self._generation
+        async with session_factory() as session:
+            rows = (await session.execute(statement)).fetchall()
+            scope = query_scope(statement)
+            missing = [name for name in scope.metal_names() if name not in self._metal_ids]
+            if missing:
+                self._metal_ids.update((await session.execute(select(Metal.name, Metal.id).where(Metal.name.in_(missing)))).all())
+            scope = scope.resolve(self._metal_ids)
+        self.put(key, rows, scope, generation)
+        return rows
+
+    # Function to invalidate on every commit of `engine` that wrote metal_prices. Inserts and upserts
+    # invalidate only the (metal, date range) they touched; other writes to the table invalidate everything.
+    # Pending ranges are kept per connection and applied on commit, so rolled-back writes invalidate nothing.
+    def watch(self, engine) -> None:
+        sync_engine = getattr(engine, 'sync_engine', engine)
+        watchers = sync_engine.__dict__.setdefault('_query_cache_watchers', [])
+        if any(watcher is self for watcher in watchers):
+            return
+        watchers.append(self)
+
+        @event.listens_for(sync_engine, 'after_cursor_execute')
+        def record_write(conn, cursor, statement, parameters, context, executemany):
+            ranges = _written_ranges(statement, context)
+            if ranges is not None:
+                conn.info.setdefault(('query_cache_pending', id(self)), []).extend(ranges)
+
+        @event.listens_for(sync_engine, 'commit')
+        def apply_writes(conn):
+            for metal, start, end in conn.info.pop(('query_cache_pending', id(self)), []):
+                self.invalidate(metal, start, end)
+
+        @event.listens_for(sync_engine, 'rollback')
+        def discard_writes(conn):
+            conn.info.pop(('query_cache_pending', id(self)), None)
+
+# Function to work out which (metal, start, end) ranges a statement wrote to metal_prices, or None for
+# statements that do not write it. A write whose rows cannot be read back yields one range covering everything.
+def _written_ranges(statement: str, context) -> Optional[List[Tuple[Optional[Hashable], Optional[date], Optional[date]]]]:
+    compiled = getattr(context, 'compiled', None)
+    table = getattr(getattr(getattr(compiled, 'statement', None), 'table', None), 'name', None)
+    if context is not None and context.isinsert and table == CACHED_TABLE:
+        bounds: Dict[Hashable, List[date]] = {}
+        for params in context.compiled_parameters:
+            metal = params.get('metal_id', params.get('metal'))
+            token = None if metal is None else ('metal_prices', metal)
+            bar_date = _as_date(params.get('date'))
+            if token not in bounds:
+                bounds[token] = [bar_date, bar_date]
+            elif bar_date is not None:
+                low, high = bounds[token]
+                bounds[token] = [bar_date if low is None else min(low, bar_date),
+                                 bar_date if high is None else max(high, bar_date)]
+        return [(token, low, high) for token, (low, high) in bounds.items()]
+
+    words = statement.lstrip().split(None, 1)
+    if words and words[0].upper() in ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'DROP', 'ALTER') and CACHED_TABLE in statement:
+        return [(None, None, None)]
+    return None
@@ -0,0 +1,169 @@
+from datetime import date
+from typing import Dict, Iterable, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import String, func, select, type_coerce
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Connection
+
+from bulk_insert import iter_param_chunks, DEFAULT_CHUNK_SIZE
+from models import MetalPrice, PriceRollup
+from series_reader import lookup_metal_ids
+
+# Rollup periods: calendar weeks starting Monday, calendar months and calendar years
+PERIODS = ('W', 'M', 'Y')
+ROLLUP_FIELDS = ['first_date', 'last_date', 'bars', 'open', 'high', 'low', 'close', 'mean', 'volatility']
+# Numeric fields get_rollups can return
+VALUE_FIELDS = ['bars', 'open', 'high', 'low', 'close', 'mean', 'volatility']
+
+# Function to map datetime64[D] dates to the first day of their period
+def period_starts(dates: np.ndarray, period: str) -> np.ndarray:
+    dates = np.asarray(dates, dtype='datetime64[D]')
+    if period == 'W':
+        # 1970-01-01 was a Thursday: shift by 3 so Monday is day 0 of the week
+        days = dates.astype(np.int64)
+        return (days - (days + 3) % 7).astype('datetime64[D]')
+    if period == 'M':
+        return dates.astype('datetime64[M]').astype('datetime64[D]')
+    if period == 'Y':
+        return dates.astype('datetime64[Y]').astype('datetime64[D]')
+    raise ValueError(f"unknown period {period!r}, expected one of {PERIODS}")
+
+# Function to return the last day of the period containing `day`
+def _period_end(day: np.datetime64, period: str) -> np.datetime64:
+    if period == 'W':
+        return period_starts(np.array([day]), 'W')[0] + np.timedelta64(6, 'D')
+    unit = 'M' if period == 'M' else 'Y'
+    return (day.astype(f'datetime64[{unit}]') + np.timedelta64(1, unit)).astype('datetime64[D]') - np.timedelta64(1, 'D')
+
+# Function to build the INSERT ... ON CONFLICT (metal_id, period, period_start) DO UPDATE statement
+def rollup_upsert_statement():
+    statement = sqlite_insert(PriceRollup.__table__)
+    return statement.on_conflict_do_update(index_elements=['metal_id', 'period', 'period_start'],
+                                           set_={field: statement.excluded[field] for field in ROLLUP_FIELDS})
+
+# Function to aggregate date-ordered daily prices into one row per (metal_id, period_start).
+# high/low are the max/min of the daily prices (only one price is stored per day), and volatility is the
+# sample standard deviation of the daily log returns inside the period (NaN for single-bar periods).
+def aggregate_period(daily: pd.DataFrame, period: str) -> pd.DataFrame:
+    daily = daily.assign(period_start=period_starts(daily['date'].to_numpy(), period))
+    keys = ['metal_id', 'period_start']
+    grouped = daily.groupby(keys, sort=True)
+    result = grouped.agg(first_date=('date', 'min'), last_date=('date', 'max'), bars=('price', 'size'),
+                         open=('price', 'first'), high=('price', 'max'), low=('price', 'min'),
+                         close=('price', 'last'), mean=('price', 'mean'))
+    returns = grouped['log_price'].diff()
+    result['volatility'] = returns.groupby([daily['metal_id'], daily['period_start']], sort=True).std(ddof=1)
+    result = result.reset_index()
+    result.insert(1, 'period', period)
+    return result
+
+# Function to read daily prices (NULL prices dropped) for some metals and an inclusive date range
+def _daily_prices(conn: Connection, metal_ids: Optional[Sequence[int]], start: Optional[np.datetime64],
+                  end: Optional[np.datetime64]) -> pd.DataFrame:
+    table = MetalPrice.__table__
+    # The date comes back as its stored ISO text, which NumPy parses in bulk
+    statement = (select(table.c.metal_id, type_coerce(table.c.date, String), table.c.price)
+                 .where(table.c.price.is_not(None))
+                 .order_by(table.c.metal_id, table.c.date))
+    if metal_ids is not None:
+        statement = statement.where(table.c.metal_id.in_(list(metal_ids)))
+    if start is not None:
+        statement = statement.where(table.c.date >= start.astype(date))
+    if end is not None:
+        statement = statement.where(table.c.date <= end.astype(date))
+    rows = conn.execute(statement).all()
+    metal_id, dates, prices = zip(*rows) if rows else ((), (), ())
+    prices = np.array(prices, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_price = np.log(prices)
+    return pd.DataFrame({'metal_id': np.array(metal_id, dtype=np.int64), 'date': np.array(dates, dtype='datetime64[D]'),
+                         'price': prices, 'log_price': log_price})
+
+# Function to recompute the rollups of every period that overlaps [start, end] from the stored daily rows and
+# upsert them. Called after daily rows are written, it touches one week, one month and one year per metal for
+# a daily load; without start/end it rebuilds the full history. Returns the number of rollup rows written.
+# With an AsyncConnection use `await conn.run_sync(refresh_rollups, metal_ids, start, end)`.
+def refresh_rollups(conn: Connection, metal_ids: Optional[Iterable[int]] = None, start: Optional[date] = None,
+                    end: Optional[date] = None, periods: Sequence[str] = PERIODS,
+                    chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    metal_ids = None if metal_ids is None else [int(metal_id) for metal_id in metal_ids]
+    if metal_ids is not None and not metal_ids:
+        return 0
+    # Widen the read to whole periods: from the earliest start to the latest end of any period touched
+    read_start = read_end = None
+    if start is not None:
+        start = np.datetime64(start, 'D')
+        read_start = min(period_starts(np.array([start]), period)[0] for period in periods)
+    if end is not None:
+        end = np.datetime64(end, 'D')
+        read_end = max(_period_end(end, period) for period in periods)
+    daily = _daily_prices(conn, metal_ids, read_start, read_end)
+    if daily.empty:
+        return 0
+
+    statement = rollup_upsert_statement()
+    written = 0
+    for period in periods:
+        rollups = aggregate_period(daily, period)
+        # Only the periods overlapping the written range; the others were read only to complete them
+        if start is not None:
+            rollups = rollups[rollups['last_date'] >= start]
+        if end is not None:
+            rollups = rollups[rollups['first_date'] <= end]
+        rollups = rollups.assign(period_start=rollups['period_start'].dt.date, first_date=rollups['first_date'].dt.date,
+                                 last_date=rollups['last_date'].dt.date)
+        # SQLite has no NaN, store missing values (single-bar volatility) as NULL
+        rollups = rollups.astype(object).where(rollups.notna(), None)
+        for params in iter_param_chunks(rollups, chunk_size):
+            conn.execute(statement, params)
+        written += len(rollups)
+    return written
+
+# Function to rebuild every rollup from the daily table, e.g. after a migration or a write made with
+# rollups=False. Returns the number of rollup rows written.
+def rebuild_rollups(conn: Connection, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    conn.execute(PriceRollup.__table__.delete())
+    return refresh_rollups(conn, chunk_size=chunk_size)
+
+# Function to read rollups as a DataFrame indexed by period start (named 'period_start') with (field, metal)
+# MultiIndex columns, like get_series. start/end select the periods containing those dates.
+# With an AsyncConnection use `await conn.run_sync(get_rollups, metals, 'M', start, end, fields)`.
+def get_rollups(conn: Connection, metals: Sequence[str], period: str = 'M', start: Optional[date] = None,
+                end: Optional[date] = None, fields: Sequence[str] = ('mean',)) -> pd.DataFrame:
+    fields = list(fields)
+    unknown = [field for field in fields if field not in VALUE_FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields {unknown}, expected some of {VALUE_FIELDS}")
+    if period not in PERIODS:
+        raise ValueError(f"unknown period {period!r}, expected one of {PERIODS}")
+    metals = list(dict.fromkeys(metals))
+    metal_ids = lookup_metal_ids(conn, metals)
+    found = [metal for metal in metals if metal in metal_ids]
+
+    table = PriceRollup.__table__
+    statement = (select(table.c.metal_id, type_coerce(table.c.period_start, String), *[table.c[field] for field in fields])
+                 .where(table.c.metal_id.in_([metal_ids[metal] for metal in found]), table.c.period == period)
+                 .order_by(table.c.period_start))
+    if start is not None:
+        statement = statement.where(table.c.period_start >= period_starts(np.array([start]), period)[0].astype(date))
+    if end is not None:
+        statement = statement.where(table.c.period_start <= end)
+    rows = pd.DataFrame(conn.execute(statement).all(), columns=['metal_id', 'period_start', *fields])
+
+    columns = pd.MultiIndex.from_product([fields, found])
+    if rows.empty:
+        return pd.DataFrame(columns=columns, index=pd.DatetimeIndex([], name='period_start'), dtype=np.float64)
+    names: Dict[int, str] = {metal_ids[metal]: metal for metal in found}
+    rows['metal'] = rows['metal_id'].map(names)
+    rows['period_start'] = pd.DatetimeIndex(rows['period_start'].to_numpy(dtype='datetime64[D]'))
+    frame = rows.pivot(index='period_start', columns='metal', values=fields).astype(np.float64)
+    frame = frame.reindex(columns=columns)
+    frame.index.name = 'period_start'
+    return frame
+
+# Function to count stored rollup rows per period, e.g. {'W': 1044, 'M': 240, 'Y': 20}
+def rollup_counts(conn: Connection) -> Dict[str, int]:
+    table = PriceRollup.__table__
+    return dict(conn.execute(select(table.c.period, func.count()).group_by(table.c.period)).all())
@@ -0,0 +1,208 @@
+from typing import List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+# Numba is optional: with it the kernels below are compiled, without it the NumPy implementations run instead
+try:
+    import numba
+except ImportError:
+    numba = None
+
+RSI_METHODS = ('sma', 'wilder')
+ENGINES = ('numba', 'numpy')
+HAVE_NUMBA = numba is not None
+# Per-block budget of the NumPy Wilder scan, in cells (rows x columns)
+BLOCK_CELLS = 1 << 22
+
+ArrayLike = Union[np.ndarray, pd.Series, pd.DataFrame]
+
+# Both variants read the price changes d[i] = p[i] - p[i-1] of one column, split into gains and losses.
+#   sma     calculate_rsi to rounding: the mean gain and mean loss over the last `window` rows, first defined at row
+#           window - 1. As there, d[0] and changes touching a NaN price count as no move.
+#   wilder  Wilder's smoothing: seeded at row `window` with the mean of the first `window` changes, then
+#           avg = avg + (x - avg) / window. A missing change leaves the averages as they were and gives NaN.
+# RSI = 100 - 100 / (1 + avg_gain / avg_loss): 100 when there were no losses, NaN when nothing moved.
+
+def _rsi_value(gain: float, loss: float) -> float:
+    if loss == 0.0:
+        return 100.0 if gain > 0.0 else np.nan
+    return 100.0 - 100.0 / (1.0 + gain / loss)
+
+# Kernel: one pass down each column of a (dates x columns) array, keeping running window sums
+def _rsi_sma_kernel(prices: np.ndarray, window: int, out: np.ndarray) -> None:
+    n_rows, n_columns = prices.shape
+    for column in range(n_columns):
+        gain_sum = 0.0
+        loss_sum = 0.0
+        for row in range(n_rows):
+            # NaN compares false either way, so a missing change adds nothing
+            change = prices[row, column] - prices[row - 1, column] if row else 0.0
+            if change > 0.0:
+                gain_sum += change
+            elif change < 0.0:
+                loss_sum -= change
+            if row >= window:
+                leaving = prices[row - window, column] - prices[row - window - 1, column] if row > window else 0.0
+                if leaving > 0.0:
+                    gain_sum -= leaving
+                elif leaving < 0.0:
+                    loss_sum += leaving
+            out[row, column] = _rsi_value(gain_sum, loss_sum) if row >= window - 1 else np.nan
+
+# Kernel: one pass down each column with Wilder's recursion
+def _rsi_wilder_kernel(prices: np.ndarray, window: int, out: np.ndarray) -> None:
+    n_rows, n_columns = prices.shape
+    for column in range(n_columns):
+        avg_gain = 0.0
+        avg_loss = 0.0
+        seen = 0
+        out[0, column] = np.nan
+        for row in range(1, n_rows):
+            change = prices[row, column] - prices[row - 1, column]
+            out[row, column] = np.nan
+            if np.isnan(change):
+                continue
+            gain = change if change > 0.0 else 0.0
+            loss = -change if change < 0.0 else 0.0
+            if seen < window:
+                # Seed: the mean of the first `window` changes
+                avg_gain += gain / window
+                avg_loss += loss / window
+                seen += 1
+                if seen < window:
+                    continue
+            else:
+                avg_gain += (gain - avg_gain) / window
+                avg_loss += (loss - avg_loss) / window
+            out[row, column] = _rsi_value(avg_gain, avg_loss)
+
+if HAVE_NUMBA:
+    _rsi_value = numba.njit(cache=True)(_rsi_value)
+    _rsi_sma_kernel = numba.njit(cache=True)(_rsi_sma_kernel)
+    _rsi_wilder_kernel = numba.njit(cache=True)(_rsi_wilder_kernel)
+
+def _changes(prices: np.ndarray):
+    change = np.empty_like(prices)
+    change[0] = np.nan
+    np.subtract(prices[1:], prices[:-1], out=change[1:])
+    valid = ~np.isnan(change)
+    # fmax drops the NaN of a missing change, leaving no move
+    gain = np.fmax(change, 0.0)
+    loss = np.fmax(np.negative(change, out=change), 0.0)
+    return valid, gain, loss
+
+def _rsi_from_averages(gain: np.ndarray, loss: np.ndarray) -> np.ndarray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100.0 - 100.0 / (1.0 + gain / loss)
+    # No losses: 100, or NaN when nothing moved
+    rsi[loss == 0] = np.where(gain[loss == 0] > 0, 100.0, np.nan)
+    return rsi
+
+# NumPy SMA: window sums as differences of cumulative sums, for every column at once
+def _rsi_sma_numpy(prices: np.ndarray, window: int) -> np.ndarray:
+    _, gain, loss = _changes(prices)
+    sums = []
+    for values in (gain, loss):
+        total = np.cumsum(values, axis=0)
+        total[window:] -= total[:-window].copy()
+        # A difference of long cumulative sums can land a rounding error below zero
+        sums.append(np.maximum(total, 0.0))
+    rsi = _rsi_from_averages(*sums)
+    rsi[:window - 1] = np.nan
+    return rsi
+
+# NumPy Wilder: the recursion y[t] = decay[t] * y[t-1] + inflow[t] solved block by block. Within a block
+# y[t] = D[t] * (y0 + sum(inflow[s] / D[s])) with D the running product of the decays; every term is
+# non-negative, so the sums are well conditioned, and blocks are short enough that D stays far from underflow.
+def _wilder_scan(decay_steps: np.ndarray, inflows: List[np.ndarray], window: int) -> List[np.ndarray]:
+    log_decay = np.log1p(-1.0 / window)
+    n_rows, n_columns = decay_steps.shape
+    block = int(min(max(1, -600.0 / log_decay), max(64, BLOCK_CELLS // max(1, n_columns))))
+    results = [np.empty_like(inflow) for inflow in inflows]
+    previous = [np.zeros(n_columns) for _ in inflows]
+    for lo in range(0, n_rows, block):
+        hi = min(lo + block, n_rows)
+        # The decays are shared, so the scale is computed once for the gains and the losses
+        scale = np.exp(log_decay * np.cumsum(decay_steps[lo:hi], axis=0))
+        for index, inflow in enumerate(inflows):
+            result = results[index][lo:hi]
+            np.cumsum(inflow[lo:hi] / scale, axis=0, out=result)
+            result += previous[index]
+            result *= scale
+            previous[index] = result[-1]
+    return results
+
+def _rsi_wilder_numpy(prices: np.ndarray, window: int) -> np.ndarray:
+    valid, gain, loss = _changes(prices)
+    if window == 1:
+        # Nothing to smooth: the averages are the current gain and loss (and the scan's log decay would be -inf)
+        rsi = _rsi_from_averages(gain, loss)
+        rsi[~valid] = np.nan
+        return rsi
+    # Row of each column's window-th valid change, where the averages are seeded
+    seen = np.cumsum(valid, axis=0)
+    seeded = seen >= window
+    seed_row = np.where(seeded.any(axis=0), seeded.argmax(axis=0), len(prices))
+    has_seed = seed_row < len(prices)
+    seed_cells = (seed_row[has_seed], np.arange(prices.shape[1])[has_seed])
+    after_seed = seeded & valid
+    after_seed[seed_cells] = False
+
+    # Decay on valid changes after the seed; the seed row injects the mean of the first `window` changes
+    inflows = []
+    for values in (gain, loss):
+        seed = np.where(seeded, 0.0, values).sum(axis=0)[has_seed] + values[seed_cells]
+        inflow = np.where(after_seed, values, 0.0)
+        inflow[seed_cells] = seed
+        inflow /= window
+        inflows.append(inflow)
+    rsi = _rsi_from_averages(*_wilder_scan(after_seed, inflows, window))
+    rsi[~(seeded & valid)] = np.nan
+    return rsi
+
+_NUMPY_KERNELS = {'sma': _rsi_sma_numpy, 'wilder': _rsi_wilder_numpy}
+_COMPILED_KERNELS = {'sma': _rsi_sma_kernel, 'wilder': _rsi_wilder_kernel}
+
+# Function to compute RSI for every column of a (dates x columns) price array, Series or DataFrame (or a 1-D
+# array), returning the same shape and type. method is 'sma' (calculate_rsi's rolling means) or 'wilder';
+# engine is 'numba' or 'numpy', by default numba when it is installed.
+#   rsi(store.fields['price'], 14, method='wilder')
+def rsi(prices: ArrayLike, window: int = 14, method: str = 'sma', engine: Optional[str] = None) -> ArrayLike:
+    if method not in RSI_METHODS:
+        raise ValueError(f"unknown RSI method {method!r}, expected one of {RSI_METHODS}")
+    engine = engine or ('numba' if HAVE_NUMBA else 'numpy')
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine!r}, expected one of {ENGINES}")
+    if engine == 'numba' and not HAVE_NUMBA:
+        raise ImportError("engine='numba' needs numba installed")
+    if window < 1:
+        raise ValueError(f"window must be positive, got {window}")
+
+    values = prices.to_numpy() if isinstance(prices, (pd.Series, pd.DataFrame)) else np.asarray(prices)
+    matrix = values[:, None] if values.ndim == 1 else values
+    if not len(matrix):
+        result = np.empty(matrix.shape)
+    elif engine == 'numba':
+        # Column-major, so each column the kernel walks is contiguous
+        matrix = np.asfortranarray(matrix, dtype=np.float64)
+        result = np.empty(matrix.shape, order='F')
+        _COMPILED_KERNELS[method](matrix, window, result)
+    else:
+        result = _NUMPY_KERNELS[method](matrix.astype(np.float64, copy=False), window)
+    result = result.reshape(values.shape)
+
+    if isinstance(prices, pd.Series):
+        return pd.Series(result, index=prices.index, name=prices.name)
+    if isinstance(prices, pd.DataFrame):
+        return pd.DataFrame(result, index=prices.index, columns=prices.columns)
+    return result
+
+# Function to run a kernel as plain Python, for checking the compiled kernels' logic without numba
+def rsi_reference(prices: np.ndarray, window: int = 14, method: str = 'sma') -> np.ndarray:
+    kernel = getattr(_COMPILED_KERNELS[method], 'py_func', _COMPILED_KERNELS[method])
+    matrix = np.asarray(prices, dtype=np.float64)
+    matrix = matrix[:, None] if matrix.ndim == 1 else matrix
+    result = np.empty(matrix.shape)
+    kernel(matrix, window, result)
+    return result.reshape(np.shape(prices))
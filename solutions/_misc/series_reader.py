@@ -0,0 +1,87 @@
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import String, select, type_coerce
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from bulk_insert import FIELDS
+from models import Metal, MetalPrice
+
+DEFAULT_YIELD_PER = 50000
+
+# Function to look up metal ids by name without adding anything; unknown names are skipped
+def lookup_metal_ids(conn: Connection, names: Iterable[str]) -> Dict[str, int]:
+    return dict(conn.execute(select(Metal.name, Metal.id).where(Metal.name.in_(list(names)))).all())
+
+# Function to read the requested columns into a date-aligned columnar block, no ORM objects involved.
+# Returns {'date': datetime64[D] (n_dates,), 'metals': names (n_metals,), field: float64 (n_dates, n_metals), ...};
+# cells with no stored row, or a NULL value, are NaN. Rows are streamed yield_per at a time, so memory
+# peaks at the output arrays plus one partition instead of one Python object per row.
+def read_series_arrays(conn: Connection, metals: Sequence[str], start: Optional[date] = None, end: Optional[date] = None,
+                       fields: Sequence[str] = ('price',), yield_per: int = DEFAULT_YIELD_PER) -> Dict[str, np.ndarray]:
+    fields = list(fields)
+    unknown = [field for field in fields if field not in FIELDS]
+    if unknown:
+        raise ValueError(f"unknown fields {unknown}, expected some of {FIELDS}")
+    metals = list(dict.fromkeys(metals))
+    metal_ids = lookup_metal_ids(conn, metals)
+    found = [metal for metal in metals if metal in metal_ids]
+
+    # Only the requested columns; the date comes back as its stored ISO text, which NumPy parses in bulk
+    table = MetalPrice.__table__
+    statement = (select(table.c.metal_id, type_coerce(table.c.date, String), *[table.c[field] for field in fields])
+                 .where(table.c.metal_id.in_([metal_ids[metal] for metal in found]))
+                 .order_by(table.c.metal_id, table.c.date))
+    if start is not None:
+        statement = statement.where(table.c.date >= start)
+    if end is not None:
+        statement = statement.where(table.c.date <= end)
+
+    # Each partition is converted to typed arrays straight away (NULL -> NaN), so no row objects pile up
+    dtypes = [np.int64, 'datetime64[D]'] + [np.float64] * len(fields)
+    columns: List[List[np.ndarray]] = [[] for _ in dtypes]
+    result = conn.execution_options(yield_per=yield_per).execute(statement)
+    for partition in result.partitions():
+        for chunks, dtype, column in zip(columns, dtypes, zip(*partition)):
+            chunks.append(np.array(column, dtype=dtype))
+    if not columns[0]:
+        return {'date': np.array([], dtype='datetime64[D]'), 'metals': np.array(found, dtype=object),
+                **{field: np.empty((0, len(found))) for field in fields}}
+
+    ids = np.concatenate(columns[0])
+    unique_dates, row = np.unique(np.concatenate(columns[1]), return_inverse=True)
+
+    # Pivot: one row per distinct date, one column per metal in the order asked for
+    found_ids = np.array([metal_ids[metal] for metal in found], dtype=np.int64)
+    position = np.zeros(found_ids.max() + 1, dtype=np.intp)
+    position[found_ids] = np.arange(len(found))
+    col = position[ids]
+    block = {'date': unique_dates, 'metals': np.array(found, dtype=object)}
+    for field, chunks in zip(fields, columns[2:]):
+        matrix = np.full((len(unique_dates), len(found)), np.nan)
+        matrix[row, col] = np.concatenate(chunks)
+        block[field] = matrix
+    return block
+
+# Function to read metals x fields as a pivoted DataFrame (DatetimeIndex, (field, metal) MultiIndex columns,
+# the layout of calculate_indicator_block), or as the dict of NumPy arrays with as_frame=False.
+# With an AsyncConnection use `await conn.run_sync(get_series, metals, start, end, fields)`.
+def get_series(conn: Connection, metals: Sequence[str], start: Optional[date] = None, end: Optional[date] = None,
+               fields: Sequence[str] = ('price',), as_frame: bool = True,
+               yield_per: int = DEFAULT_YIELD_PER) -> Union[pd.DataFrame, Dict[str, np.ndarray]]:
+    block = read_series_arrays(conn, metals, start, end, fields, yield_per)
+    if not as_frame:
+        return block
+    index = pd.DatetimeIndex(block['date'], name='Dates')
+    return pd.concat({field: pd.DataFrame(block[field], index=index, columns=list(block['metals'])) for field in fields},
+                     axis=1)
+
+# Function to run get_series on an async engine's connection
+async def async_get_series(engine: AsyncEngine, metals: Sequence[str], start: Optional[date] = None, end: Optional[date] = None,
+                           fields: Sequence[str] = ('price',), as_frame: bool = True,
+                           yield_per: int = DEFAULT_YIELD_PER) -> Union[pd.DataFrame, Dict[str, np.ndarray]]:
+    async with engine.connect() as conn:
+        return await conn.run_sync(get_series, metals, start, end, fields, as_frame, yield_per)
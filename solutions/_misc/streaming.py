@@ -0,0 +1,125 @@
+import queue
+import threading
+from typing import Dict, Iterator, List, Optional, Set
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from bulk_insert import bulk_insert, ensure_metals, refresh_written_rollups, DEFAULT_CHUNK_SIZE
+from incremental import MetalIndicator, save_indicator_states
+from market_data import DATE_FORMAT, HEADER_ROWS, read_market_data_header
+
+_STOP = object()
+
+# Function to read a price CSV in chunks; handles the raw Bloomberg export and the 'Dates,METAL,...' layout
+def iter_price_chunks(csv_file: str, chunksize: int = 10000) -> Iterator[pd.DataFrame]:
+    with open(csv_file) as f:
+        is_export = f.readline().startswith('Start Date')
+
+    if is_export:
+        header = read_market_data_header(csv_file)
+        reader = pd.read_csv(csv_file, skiprows=HEADER_ROWS, header=None, names=['Dates'] + header.columns,
+                             chunksize=chunksize)
+        date_format = DATE_FORMAT
+    else:
+        reader = pd.read_csv(csv_file, chunksize=chunksize)
+        date_format = None
+
+    for chunk in reader:
+        chunk['Dates'] = pd.to_datetime(chunk['Dates'], format=date_format)
+        yield chunk
+
+# Function to compute MACD/RSI for one chunk, continuing each metal's state from the previous chunk.
+# Each metal's chunk is computed vectorized (update_block), so streaming keeps load-all's per-row speed.
+def compute_indicator_chunk(indicators: Dict[str, MetalIndicator], chunk: pd.DataFrame) -> pd.DataFrame:
+    metals = chunk.columns[1:]
+    # Full timestamps, so intraday bars on the same day stay ordered in the indicator state
+    dates = pd.DatetimeIndex(chunk['Dates'])
+    columns = {'Dates': chunk['Dates'].to_numpy()}
+    results = {}
+    for metal in metals:
+        indicator = indicators.setdefault(metal, MetalIndicator(metal))
+        prices = chunk[metal].to_numpy(dtype=np.float64)
+        columns[metal] = prices
+        results[metal] = indicator.update_block(dates, prices)
+    for metal in metals:
+        columns[f'{metal}_macd'] = results[metal][:, 0]
+        columns[f'{metal}_macd_signal'] = results[metal][:, 1]
+        columns[f'{metal}_rsi'] = results[metal][:, 2]
+    return pd.DataFrame(columns)
+
+# Function to stream a CSV into the indicator table with bounded memory.
+# A writer thread drains a bounded queue of finished chunks, so at most queue_size + 2 chunks are alive
+# at any time (one being computed, one being written) regardless of the length of the file.
+# The rollups are refreshed once per rollup_rows written rows rather than per chunk: a refresh re-reads and
+# re-aggregates whole periods, which at small chunk sizes costs more than the insert itself. Between refreshes
+# they lag the daily rows; the last refresh runs at the end, also after an error, over every committed chunk.
+def stream_csv_to_db(csv_file: str, engine: Engine, chunksize: int = 10000, queue_size: int = 2,
+                     insert_chunk_size: int = DEFAULT_CHUNK_SIZE, indicators: Optional[Dict[str, MetalIndicator]] = None,
+                     save_state: bool = False, rollup_rows: int = 25000) -> int:
+    indicators = {} if indicators is None else indicators
+    batches: queue.Queue = queue.Queue(maxsize=queue_size)
+    rows_written: List[int] = []
+    errors: List[BaseException] = []
+
+    def writer() -> None:
+        metal_ids: Dict[str, int] = {}
+        # Metal ids and the first / last date of the rows written since the last rollup refresh
+        pending_ids: Set[int] = set()
+        pending_dates: list = []
+        pending_rows = 0
+
+        def refresh() -> None:
+            nonlocal pending_rows
+            if pending_ids:
+                with engine.begin() as conn:
+                    refresh_written_rollups(conn, pending_ids, pending_dates)
+            pending_ids.clear()
+            pending_dates.clear()
+            pending_rows = 0
+
+        while True:
+            item = batches.get()
+            try:
+                if item is _STOP:
+                    # Also after an error, so every committed chunk has its rollups
+                    refresh()
+                    return
+                if not errors:
+                    batch, metals = item
+                    missing = [metal for metal in metals if metal not in metal_ids]
+                    if missing:
+                        with engine.begin() as conn:
+                            metal_ids.update(ensure_metals(conn, missing))
+                    rows = bulk_insert(engine, batch, metals, chunk_size=insert_chunk_size, rollups=False)
+                    rows_written.append(rows)
+                    pending_ids.update(metal_ids[metal] for metal in metals)
+                    pending_dates.extend(pd.Timestamp(batch['Dates'].iloc[i]).date() for i in (0, -1))
+                    pending_rows += rows
+                    if pending_rows >= rollup_rows:
+                        refresh()
+            except BaseException as exc:
+                # Keep draining so the producer never blocks on a full queue
+                errors.append(exc)
+                if item is _STOP:
+                    return
+
+    writer_thread = threading.Thread(target=writer, name='stream-db-writer', daemon=True)
+    writer_thread.start()
+    try:
+        for chunk in iter_price_chunks(csv_file, chunksize):
+            if errors:
+                break
+            batches.put((compute_indicator_chunk(indicators, chunk), chunk.columns[1:]))
+    finally:
+        batches.put(_STOP)
+        writer_thread.join()
+
+    if errors:
+        raise errors[0]
+    if save_state:
+        with Session(engine) as session:
+            save_indicator_states(session, indicators.values())
+    return sum(rows_written)